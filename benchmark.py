@@ -0,0 +1,447 @@
+"""
+性能基准测试
+
+在本进程内启动 main.app（不监听端口），并在本地启动一个模拟的工作日API服务，
+上游延迟与失败率可配置，不依赖外部网络与手动启动的服务，结果可重复、可离线运行。
+
+测试场景：
+- repair_calendar: 本地日历覆盖的日期区间，不访问上游
+- repair_cold: 日历未覆盖且缓存为空，每个请求都需调用上游API
+- repair_warm: 重复 repair_cold 的日期区间，全部命中工作日缓存
+- batch: /calculate_repair_time/batch 批量计算（日历区间与需调用上游的区间各半）
+- documents_cold / documents_reused / documents_inline: 出库单首次渲染、重复请求复用已生成文件、内存渲染直接返回
+  （模板目录中没有出库单模板时跳过）
+
+各场景重复测量（--repeat）并取吞吐量居中的一次，输出吞吐量与延迟分位数（p50/p90/p99），结果写入 JSON 文件；指定 --compare 时与之前的结果对比，
+吞吐量下降或 p99 延迟上升超过容差的场景视为退化，退出码为1。
+
+用法::
+
+    python benchmark.py --requests 500 --concurrency 20 --api-latency 50 --output benchmark_results.json
+    python benchmark.py --compare benchmark_results.json --output new_results.json
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Awaitable, Callable, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+
+from workday_calendar import count_weekdays, load_calendar
+
+# 日历未覆盖的年份，用于需要调用上游API的场景
+UNCOVERED_BASE_DATE = date(2091, 1, 1)
+UNCOVERED_SPREAD_DAYS = 3000
+# 本地日历覆盖的日期区间（随项目发布的日历覆盖 2024~2026 年）
+COVERED_BASE_DATE = date(2025, 1, 1)
+COVERED_SPREAD_DAYS = 600
+
+SCENARIOS = (
+    "repair_calendar", "repair_cold", "repair_warm", "batch",
+    "documents_cold", "documents_reused", "documents_inline",
+)
+
+
+class FakeWorkdayAPI:
+    """模拟的工作日API服务，与真实API相同按闭区间 [startDate, endDate] 计数，返回其中周一至周五的天数
+
+    latency: 每次请求的延迟（秒），jitter: 延迟的随机浮动范围（秒），failure_rate: 返回500错误的概率
+    """
+
+    def __init__(self, latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.failures = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/api/workdays"
+
+    def start(self) -> "FakeWorkdayAPI":
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                api._handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-workday-api", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self) -> "FakeWorkdayAPI":
+        return self.start()
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+    def _handle(self, handler: BaseHTTPRequestHandler) -> None:
+        with self._lock:
+            self.requests += 1
+            delay = max(self.latency + self._random.uniform(-self.jitter, self.jitter), 0.0)
+            fail = self._random.random() < self.failure_rate
+            if fail:
+                self.failures += 1
+        time.sleep(delay)
+
+        if fail:
+            status, body = 500, {"code": 500, "msg": "injected failure"}
+        else:
+            params = parse_qs(urlparse(handler.path).query)
+            try:
+                start = date.fromisoformat(params["startDate"][0])
+                end = date.fromisoformat(params["endDate"][0])
+                status, body = 200, {"code": 200, "msg": "success", "data": count_weekdays(start, end)}
+            except (KeyError, ValueError):
+                status, body = 400, {"code": 400, "msg": "invalid date"}
+
+        payload = json.dumps(body).encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json")
+        handler.send_header("Content-Length", str(len(payload)))
+        handler.end_headers()
+        handler.wfile.write(payload)
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """最近秩法分位数"""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(p / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+
+def summarize(latencies: List[float], elapsed: float, errors: int, **extra) -> Dict[str, object]:
+    values = sorted(latencies)
+    return {
+        "requests": len(values),
+        "errors": errors,
+        "elapsed_seconds": round(elapsed, 4),
+        "throughput_rps": round(len(values) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": {
+            "mean": round(sum(values) / len(values) * 1000, 3) if values else 0.0,
+            "p50": round(percentile(values, 50) * 1000, 3),
+            "p90": round(percentile(values, 90) * 1000, 3),
+            "p99": round(percentile(values, 99) * 1000, 3),
+            "max": round(values[-1] * 1000, 3) if values else 0.0,
+        },
+        **extra,
+    }
+
+
+async def run_load(send: Callable[[int], Awaitable[bool]], total: int, concurrency: int) -> Dict[str, object]:
+    """以固定并发数发送 total 个请求，send(i) 返回请求是否成功"""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            index = next_index
+            next_index += 1
+            started = time.perf_counter()
+            try:
+                ok = await send(index)
+            except Exception:
+                ok = False
+            latencies.append(time.perf_counter() - started)
+            if not ok:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(min(concurrency, total), 1))))
+    return summarize(latencies, time.perf_counter() - started, errors, concurrency=concurrency)
+
+
+def repair_request(covered: bool, index: int) -> dict:
+    """第 index 个维修时长计算请求，covered 为 True 时日期在本地日历覆盖范围内；index 不同的请求日期区间不同"""
+    base, spread = (COVERED_BASE_DATE, COVERED_SPREAD_DAYS) if covered else (UNCOVERED_BASE_DATE, UNCOVERED_SPREAD_DAYS)
+    start = base + timedelta(days=index % spread)
+    end = start + timedelta(days=5 + index // spread % 20)
+    return {
+        "rep_ins_type": 1,
+        "rep_start_date": f"{start.isoformat()} 09:00:00",
+        "quot_start_date": f"{end.isoformat()} 17:00:00",
+    }
+
+
+def expected_detection_days(body: dict, calendar) -> int:
+    """请求的检测时长：日历覆盖的区间按日历计数，其余区间与模拟API一致按仅排除周末计数"""
+    start = date.fromisoformat(body["rep_start_date"][:10])
+    end = date.fromisoformat(body["quot_start_date"][:10])
+    if calendar.covers(start, end):
+        return calendar.count(start, end)
+    return count_weekdays(start, end)
+
+
+def delivery_note_request(index: int, run_id: str) -> dict:
+    return {
+        "customer_delivery_addres": f"基准测试地址 {run_id}-{index}",
+        "instmt_model": ["DSO-X 3034A", "N9020A"],
+        "instmt_serial_number": [f"SN{index:06d}", f"SN{index:06d}B"],
+        "instmt_accessories_info": ["探头x4", "电源线"],
+        "sales_rpstv": "基准测试",
+    }
+
+
+async def run_benchmark(args: argparse.Namespace, api: FakeWorkdayAPI) -> Dict[str, Dict[str, object]]:
+    import httpx
+    import documents
+    import main
+    import repair_time
+
+    selected = set(args.scenarios)
+    results: Dict[str, Dict[str, object]] = {}
+    calendar = load_calendar()
+    run_id = datetime.now().strftime("%Y%m%d%H%M%S")
+
+    async with main.lifespan(main.app):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark", timeout=None) as client:
+
+            async def post_repair(body: dict) -> bool:
+                # 结果与预期的工作日数量不符（例如日历与上游的计数规则不一致）同样计为错误
+                response = await client.post("/calculate_repair_time", json=body)
+                if response.status_code != 200:
+                    return False
+                result = response.json()
+                return (repair_time.LOCAL_FALLBACK_MARK not in result["message"]
+                        and result["detection_days"] == expected_detection_days(body, calendar))
+
+            async def post_batch(index: int) -> bool:
+                # 日历区间与需调用上游的区间各半，与单条计算场景的日期区间不重复
+                offset = 100000 + index * args.batch_size
+                payload = "".join(
+                    json.dumps(repair_request(bool(i % 2), offset + i)) + "\n" for i in range(args.batch_size)
+                )
+                response = await client.post("/calculate_repair_time/batch", content=payload,
+                                              headers={"Content-Type": "application/x-ndjson"})
+                return response.status_code == 200 and len(response.text.splitlines()) == args.batch_size
+
+            async def post_document(index: int, prefix: str, inline: bool = False) -> bool:
+                url = "/generate_delivery_note?response=docx" if inline else "/generate_delivery_note"
+                response = await client.post(url, json=delivery_note_request(index, f"{prefix}{run_id}"))
+                return response.status_code == 200
+
+            async def measure(send_for: Callable[[int], Callable[[int], Awaitable[bool]]], total: int,
+                              concurrency: int, prepare: Optional[Callable[[], None]] = None) -> Dict[str, object]:
+                """重复测量 --repeat 次，返回吞吐量居中的一次结果
+
+                每次测量前执行少量不计入结果的请求（本地日历区间，不访问上游）并回收上一轮产生的对象，减少干扰；
+                send_for(第几次) 返回该次测量使用的请求函数。
+                """
+                runs = []
+                for repetition in range(args.repeat):
+                    await run_load(lambda i: post_repair(repair_request(True, i)), args.warmup, args.concurrency)
+                    gc.collect()
+                    if prepare is not None:
+                        prepare()
+                    before = api.requests
+                    result = await run_load(send_for(repetition), total, concurrency)
+                    result["upstream_requests"] = api.requests - before
+                    runs.append(result)
+                runs.sort(key=lambda run: run["throughput_rps"])
+                return {**runs[len(runs) // 2], "repeat": len(runs),
+                        "throughput_runs": [run["throughput_rps"] for run in runs]}
+
+            if "repair_calendar" in selected:
+                results["repair_calendar"] = await measure(
+                    lambda _: lambda i: post_repair(repair_request(True, i)), args.requests, args.concurrency)
+
+            if "repair_cold" in selected or "repair_warm" in selected:
+                # 每次测量前清空缓存；最后一次测量之后缓存中保留全部日期区间，供 repair_warm 使用
+                cold = await measure(lambda _: lambda i: post_repair(repair_request(False, i)),
+                                     args.requests, args.concurrency, prepare=repair_time._workday_cache.clear)
+                if "repair_cold" in selected:
+                    results["repair_cold"] = cold
+            if "repair_warm" in selected:
+                results["repair_warm"] = await measure(
+                    lambda _: lambda i: post_repair(repair_request(False, i)), args.requests, args.concurrency)
+
+            if "batch" in selected:
+                batch = await measure(lambda _: post_batch, args.batches, 1, prepare=repair_time._workday_cache.clear)
+                batch["batch_size"] = args.batch_size
+                batch["records_per_second"] = round(
+                    args.batch_size * batch["requests"] / batch["elapsed_seconds"], 2
+                ) if batch["elapsed_seconds"] else 0.0
+                results["batch"] = batch
+
+            document_scenarios = selected & {"documents_cold", "documents_reused", "documents_inline"}
+            template_path = os.path.join(documents.TEMPLATE_DIR, documents.DELIVERY_NOTE_TEMPLATE)
+            if document_scenarios and not os.path.exists(template_path):
+                for name in sorted(document_scenarios):
+                    results[name] = {"skipped": f"模板不存在: {template_path}"}
+            elif document_scenarios:
+                # 预热：启动渲染工作进程并加载模板，不计入结果
+                await post_document(-1, "warmup-")
+
+                if "documents_cold" in selected or "documents_reused" in selected:
+                    # 每次测量使用不同的内容，保证都需要渲染
+                    cold = await measure(lambda repetition: lambda i: post_document(i, f"cold{repetition}-"),
+                                         args.documents, args.document_concurrency)
+                    if "documents_cold" in selected:
+                        results["documents_cold"] = cold
+                if "documents_reused" in selected:
+                    results["documents_reused"] = await measure(
+                        lambda _: lambda i: post_document(i, "cold0-"), args.documents, args.document_concurrency)
+                if "documents_inline" in selected:
+                    results["documents_inline"] = await measure(
+                        lambda repetition: lambda i: post_document(i, f"inline{repetition}-", inline=True),
+                        args.documents, args.document_concurrency,
+                    )
+
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: Dict[str, Dict[str, object]], baseline: Dict[str, Dict[str, object]],
+            tolerance: float) -> List[str]:
+    """与基线结果对比，返回退化的场景说明"""
+    regressions = []
+    print(f"\n{'场景':<20}{'吞吐量变化':>12}{'p50变化':>12}{'p99变化':>12}")
+    for name, result in current.items():
+        base = baseline.get(name)
+        if not base or "skipped" in result or "skipped" in base:
+            continue
+
+        def change(new: float, old: float) -> float:
+            return (new - old) / old if old else 0.0
+
+        throughput = change(result["throughput_rps"], base["throughput_rps"])
+        p50 = change(result["latency_ms"]["p50"], base["latency_ms"]["p50"])
+        p99 = change(result["latency_ms"]["p99"], base["latency_ms"]["p99"])
+        print(f"{name:<20}{throughput:>+12.1%}{p50:>+12.1%}{p99:>+12.1%}")
+        if throughput < -tolerance:
+            regressions.append(f"{name}: 吞吐量下降 {-throughput:.1%}")
+        if p99 > tolerance:
+            regressions.append(f"{name}: p99 延迟上升 {p99:.1%}")
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, object]]) -> None:
+    print(f"{'场景':<20}{'请求数':>8}{'错误':>6}{'吞吐量(次/秒)':>16}{'p50(ms)':>10}{'p90(ms)':>10}{'p99(ms)':>10}")
+    for name, result in results.items():
+        if "skipped" in result:
+            print(f"{name:<20}跳过：{result['skipped']}")
+            continue
+        latency = result["latency_ms"]
+        print(f"{name:<20}{result['requests']:>8}{result['errors']:>6}{result['throughput_rps']:>16}"
+              f"{latency['p50']:>10}{latency['p90']:>10}{latency['p99']:>10}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="性能基准测试（本地模拟工作日API，进程内运行 main.app）")
+    parser.add_argument("--requests", type=int, default=300, help="维修时长计算场景的请求数")
+    parser.add_argument("--concurrency", type=int, default=20, help="维修时长计算场景的并发数")
+    parser.add_argument("--batch-size", type=int, default=500, help="批量计算每批记录数")
+    parser.add_argument("--batches", type=int, default=5, help="批量计算的批数")
+    parser.add_argument("--documents", type=int, default=30, help="文档生成场景的请求数")
+    parser.add_argument("--document-concurrency", type=int, default=4, help="文档生成场景的并发数")
+    parser.add_argument("--api-latency", type=float, default=50, help="模拟上游API的延迟（毫秒）")
+    parser.add_argument("--api-jitter", type=float, default=10, help="模拟上游API延迟的随机浮动（毫秒）")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="模拟上游API返回错误的概率（0~1）")
+    parser.add_argument("--warmup", type=int, default=50, help="每次测量前不计入结果的预热请求数")
+    parser.add_argument("--repeat", type=int, default=3, help="每个场景的测量次数，结果取吞吐量居中的一次")
+    parser.add_argument("--seed", type=int, default=0, help="延迟与失败注入的随机种子")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="逗号分隔的场景列表")
+    parser.add_argument("--output", default="benchmark_results.json", help="结果JSON文件")
+    parser.add_argument("--compare", help="作为基线对比的结果JSON文件")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="判定退化的相对变化容差")
+
+    args = parser.parse_args(argv)
+    args.scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"未知场景: {', '.join(sorted(unknown))}")
+    if args.repeat < 1:
+        parser.error("--repeat 必须大于0")
+    if not 0 <= args.failure_rate <= 1:
+        parser.error("--failure-rate 应在0~1之间")
+
+    work_dir = tempfile.mkdtemp(prefix="benchmark-")
+    try:
+        with FakeWorkdayAPI(args.api_latency / 1000, args.api_jitter / 1000, args.failure_rate, args.seed) as api:
+            # 须在导入 main 之前设置：上游地址指向模拟服务，生成文件与日志不写入项目目录
+            os.environ["WORKDAY_API_URL"] = api.url
+            os.environ["GENERATED_FILES_DIR"] = os.path.join(work_dir, "generated_files")
+            os.environ.setdefault("LOG_FILE", "")
+            os.environ.setdefault("LOG_CONSOLE", "0")
+            for name in ("WORKDAY_CACHE_DIR", "SLA_STORE_DIR", "REQUEST_PROFILE_DIR"):
+                os.environ.pop(name, None)
+
+            results = asyncio.run(run_benchmark(args, api))
+            upstream = {"requests": api.requests, "injected_failures": api.failures}
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "git_revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "config": {key: value for key, value in vars(args).items() if key not in ("output", "compare")},
+            "upstream": upstream,
+        },
+        "scenarios": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+    print_results(results)
+    print(f"\n结果已写入 {args.output}")
+
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["scenarios"]
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("\n性能退化：\n" + "\n".join(regressions))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+外部API熔断器
+
+连续失败达到阈值后熔断，熔断期间调用方直接走本地备用方案；
+后台任务按间隔探测上游，探测成功后恢复正常调用。
+"""
+
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitBreaker:
+    """熔断器
+
+    failure_threshold: 连续失败多少次后熔断
+    probe_interval: 熔断期间后台探测上游的间隔（秒）
+    probe: 探测上游是否恢复的协程函数，抛出异常表示仍不可用
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, probe_interval: float = 30.0,
+                 probe: Optional[Callable[[], Awaitable[None]]] = None):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.probe_interval = probe_interval
+        self.probe = probe
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self.times_opened = 0
+        self._probe_task: Optional[asyncio.Task] = None
+
+    def allow_request(self) -> bool:
+        """是否允许调用上游；熔断期间直接拒绝"""
+        if self.state == self.OPEN:
+            if self._probe_task is None and time.monotonic() - self.opened_at >= self.probe_interval:
+                # 没有后台探测任务时，每个探测间隔放行一次调用作为探测
+                self.opened_at = time.monotonic()
+                return True
+            self.rejected += 1
+            return False
+        return True
+
+    def record_success(self) -> None:
+        if self.state == self.OPEN:
+            logger.info(f"{self.name} 已恢复，关闭熔断")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = None
+
+    def record_failure(self) -> None:
+        self.consecutive_failures += 1
+        if self.state == self.CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        logger.warning(f"{self.name} 连续失败 {self.consecutive_failures} 次，开启熔断")
+        self.state = self.OPEN
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        if self.probe is not None and (self._probe_task is None or self._probe_task.done()):
+            try:
+                self._probe_task = asyncio.get_running_loop().create_task(self._probe_loop())
+            except RuntimeError:
+                # 不在事件循环中，改为在 allow_request 中定期放行探测
+                self._probe_task = None
+
+    async def _probe_loop(self) -> None:
+        """熔断期间按间隔探测上游，成功后关闭熔断"""
+        while self.state == self.OPEN:
+            await asyncio.sleep(self.probe_interval)
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.debug(f"{self.name} 探测失败: {e}")
+            else:
+                self.record_success()
+
+    async def close(self) -> None:
+        """停止后台探测任务"""
+        if self._probe_task is not None and not self._probe_task.done():
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+        self._probe_task = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "times_opened": self.times_opened,
+            "rejected": self.rejected,
+            "open_for": round(time.monotonic() - self.opened_at, 3) if self.opened_at is not None else None,
+        }
@@ -0,0 +1,8 @@
+"""
+pytest 配置
+
+test_api.py 与 test_workday_api.py 是需要先启动服务（并访问外网工作日API）的集成测试脚本，
+直接用 python 运行；python -m pytest 只收集无需服务与网络的单元测试。
+"""
+
+collect_ignore = ["test_api.py", "test_workday_api.py"]
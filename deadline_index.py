@@ -0,0 +1,184 @@
+"""
+未结工单截止日索引
+
+按截止日排序保存未结工单当前阶段的截止日，支持按日期窗口查询即将到期或已超期的工单。
+更新与删除通过工单编号定位，窗口查询为二分查找，复杂度 O(log n + k)。
+可选挂载 SQLite 持久化存储：登记与移除同时写入数据库，启动时从数据库重建索引，
+其他进程修改数据库后查询前重新加载，服务重启或多 worker 部署时索引内容保持一致。
+"""
+
+import os
+import sqlite3
+import threading
+from bisect import bisect_left, insort
+from datetime import date, timedelta
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+
+class Deadline(NamedTuple):
+    """工单某一阶段的截止日
+
+    due_date: 截止日，当天完成（提交报价/质检）仍不超期
+    stage: 阶段（detection/repair/return_repair）
+    start_date: 计时起点
+    limit: 该阶段的工作日上限
+    estimated: 截止日是否按仅排除周末的本地规则估算
+    """
+    due_date: date
+    order_id: str
+    stage: str
+    start_date: date
+    limit: int
+    estimated: bool = False
+
+
+class SQLiteDeadlineStore:
+    """基于 SQLite 的截止日持久化存储
+
+    与工作日缓存、维修时长统计的持久化存储相同，使用 WAL 模式与忙等待超时，多个 worker 进程可同时读写。
+    登记与移除的数量远少于计算请求，直接在调用线程中提交，返回时其他进程即可读到。
+    """
+
+    FILE_NAME = "deadlines.sqlite3"
+
+    def __init__(self, directory: str, busy_timeout: float = 5.0):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.FILE_NAME)
+        self._conn = sqlite3.connect(self.path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS deadlines ("
+                "order_id TEXT NOT NULL, stage TEXT NOT NULL, due_date TEXT NOT NULL, "
+                "start_date TEXT NOT NULL, limit_days INTEGER NOT NULL, estimated INTEGER NOT NULL, "
+                "PRIMARY KEY (order_id, stage)) WITHOUT ROWID"
+            )
+        self._data_version = self._current_data_version()
+
+    def replace(self, order_id: str, deadlines: List[Deadline]) -> bool:
+        """替换工单的全部截止日，返回工单此前是否已登记"""
+        with self._conn:
+            removed = self._conn.execute("DELETE FROM deadlines WHERE order_id = ?", (order_id,)).rowcount
+            self._conn.executemany(
+                "INSERT INTO deadlines (order_id, stage, due_date, start_date, limit_days, estimated) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                [(order_id, d.stage, d.due_date.isoformat(), d.start_date.isoformat(), d.limit, int(d.estimated))
+                 for d in deadlines],
+            )
+        return removed > 0
+
+    def load(self) -> List[Deadline]:
+        """读取全部截止日"""
+        self._data_version = self._current_data_version()
+        rows = self._conn.execute(
+            "SELECT due_date, order_id, stage, start_date, limit_days, estimated FROM deadlines"
+        ).fetchall()
+        return [
+            Deadline(date.fromisoformat(due_date), order_id, stage, date.fromisoformat(start_date),
+                     limit, bool(estimated))
+            for due_date, order_id, stage, start_date, limit, estimated in rows
+        ]
+
+    def changed(self) -> bool:
+        """上次 load 之后是否有其他连接（其他进程）提交了修改"""
+        return self._current_data_version() != self._data_version
+
+    def close(self) -> None:
+        self._conn.close()
+
+    def _current_data_version(self) -> int:
+        # data_version 只在其他连接提交修改后变化，本连接自己的写入不影响
+        return self._conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+class DeadlineIndex:
+    """按截止日排序的未结工单索引
+
+    挂载 store 时创建索引即从数据库加载全部截止日；查询前发现其他进程修改过数据库时重新加载。
+    """
+
+    def __init__(self, store: Optional[SQLiteDeadlineStore] = None):
+        self._entries: List[Tuple[date, str, str]] = []
+        self._deadlines: Dict[Tuple[str, str], Deadline] = {}
+        self._orders: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self._store = store
+        if store is not None:
+            self._reload()
+
+    def update(self, order_id: str, deadlines: List[Deadline]) -> None:
+        """替换工单的全部截止日；deadlines 为空表示工单各阶段均已完成，从索引中移除"""
+        with self._lock:
+            self._sync()
+            if self._store is not None:
+                self._store.replace(order_id, deadlines)
+            self._remove(order_id)
+            for deadline in deadlines:
+                self._insert(deadline)
+
+    def remove(self, order_id: str) -> bool:
+        """移除工单，返回工单是否在索引中"""
+        with self._lock:
+            self._sync()
+            removed = self._remove(order_id)
+            if self._store is not None:
+                removed = self._store.replace(order_id, [])
+            return removed
+
+    def _insert(self, deadline: Deadline) -> None:
+        insort(self._entries, (deadline.due_date, deadline.order_id, deadline.stage))
+        self._deadlines[(deadline.order_id, deadline.stage)] = deadline
+        self._orders.setdefault(deadline.order_id, []).append(deadline.stage)
+
+    def _sync(self) -> None:
+        """其他进程修改过数据库时重新加载（需持有锁）"""
+        if self._store is not None and self._store.changed():
+            self._reload()
+
+    def _reload(self) -> None:
+        deadlines = self._store.load()
+        self._entries = sorted((d.due_date, d.order_id, d.stage) for d in deadlines)
+        self._deadlines = {(d.order_id, d.stage): d for d in deadlines}
+        self._orders = {}
+        for deadline in deadlines:
+            self._orders.setdefault(deadline.order_id, []).append(deadline.stage)
+
+    def _remove(self, order_id: str) -> bool:
+        stages = self._orders.pop(order_id, None)
+        if stages is None:
+            return False
+        for stage in stages:
+            deadline = self._deadlines.pop((order_id, stage))
+            key = (deadline.due_date, order_id, stage)
+            del self._entries[bisect_left(self._entries, key)]
+        return True
+
+    def get(self, order_id: str) -> List[Deadline]:
+        """返回工单当前的截止日"""
+        with self._lock:
+            self._sync()
+            return [self._deadlines[(order_id, stage)] for stage in self._orders.get(order_id, [])]
+
+    def between(self, start: Optional[date] = None, end: Optional[date] = None,
+                limit: Optional[int] = None) -> List[Deadline]:
+        """返回截止日在 [start, end] 闭区间内的截止日（按截止日排序），start/end 为空时不限"""
+        with self._lock:
+            self._sync()
+            lo = bisect_left(self._entries, (start,)) if start is not None else 0
+            hi = bisect_left(self._entries, (end + timedelta(days=1),)) if end is not None else len(self._entries)
+            if limit is not None:
+                hi = min(hi, lo + limit)
+            return [self._deadlines[(order_id, stage)] for _, order_id, stage in self._entries[lo:hi]]
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._sync()
+            return len(self._orders)
+
+    def close(self) -> None:
+        """关闭持久化存储，之后的修改只保存在内存中"""
+        with self._lock:
+            store, self._store = self._store, None
+        if store is not None:
+            store.close()
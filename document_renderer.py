@@ -0,0 +1,187 @@
+"""
+文档渲染进程池
+
+docx 渲染与保存是 CPU 密集的 lxml/Jinja 操作，放在事件循环中执行会阻塞其他请求。
+这里将渲染交给独立的工作进程（每个进程持有自己的模板注册表），接口通过 await 等待结果；
+同时进行与排队的渲染数量有上限，超出时在限定时间内等待空位，仍无空位则拒绝。
+模板注册表（docxtpl 及其依赖）在工作进程初始化时才导入，服务进程导入本模块不加载这些依赖。
+"""
+
+import asyncio
+import io
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Callable, Dict, Optional, Tuple, TypeVar
+
+import request_timing
+
+if TYPE_CHECKING:
+    from template_registry import TemplateRegistry
+
+# 工作进程中的模板注册表，由进程池初始化函数创建
+_registry: Optional["TemplateRegistry"] = None
+
+T = TypeVar("T")
+
+
+class DocumentRendererBusy(Exception):
+    """渲染队列已满"""
+
+
+def _init_worker(template_dir: str) -> None:
+    global _registry
+    from template_registry import TemplateRegistry
+    _registry = TemplateRegistry(template_dir)
+
+
+def _render(template_name: str, context: dict, output) -> Dict[str, float]:
+    """渲染模板并保存到 output，返回模板加载、渲染与保存各阶段的耗时（秒）"""
+    started = time.perf_counter()
+    doc = _registry.get(template_name)
+    loaded = time.perf_counter()
+    doc.render(context)
+    rendered = time.perf_counter()
+    doc.save(output)
+    return {"template_load": loaded - started, "render": rendered - loaded, "save": time.perf_counter() - rendered}
+
+
+def render_to_file(template_name: str, context: dict, output_path: str) -> Tuple[int, Dict[str, float]]:
+    """在工作进程中渲染模板并保存，返回 (文件大小, 各阶段耗时)"""
+    timings = _render(template_name, context, output_path)
+    return os.path.getsize(output_path), timings
+
+
+def render_to_bytes(template_name: str, context: dict) -> Tuple[bytes, Dict[str, float]]:
+    """在工作进程中渲染模板，返回 (.docx 文件内容, 各阶段耗时)"""
+    buffer = io.BytesIO()
+    timings = _render(template_name, context, buffer)
+    return buffer.getvalue(), timings
+
+
+def _call_soon_threadsafe(loop: asyncio.AbstractEventLoop, callback: Callable[..., None], *args) -> None:
+    """在事件循环中执行回调；事件循环已关闭（服务已停止）时忽略"""
+    try:
+        loop.call_soon_threadsafe(callback, *args)
+    except RuntimeError:
+        pass
+
+
+class DocumentRenderer:
+    """文档渲染器
+
+    workers: 工作进程数，为0时在线程池中渲染（仍不阻塞事件循环，但与请求处理共享GIL）
+    queue_size: 工作进程全部繁忙时允许排队的渲染数
+    queue_timeout: 队列已满时等待空位的最长时间（秒）
+    on_render: 每次渲染成功后以 (模板文件名, 耗时秒数) 调用，耗时包括等待空闲工作进程的时间
+    """
+
+    def __init__(self, template_dir: str, workers: int = 2, queue_size: int = 16, queue_timeout: float = 5.0,
+                 on_render: Optional[Callable[[str, float], None]] = None):
+        self.template_dir = template_dir
+        self.workers = workers
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.on_render = on_render
+        self._executor: Optional[Executor] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self.pending = 0
+        self.rendered = 0
+        self.rejected = 0
+        self.failed = 0
+        self.render_seconds = 0.0
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.workers > 0:
+                # 服务进程中已有后台线程（缓存写入等），使用 spawn 方式创建工作进程，避免 fork 继承锁状态
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.template_dir,),
+                )
+            else:
+                _init_worker(self.template_dir)
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="document-render")
+        return self._executor
+
+    async def render(self, template_name: str, context: dict, output_path: str) -> int:
+        """渲染模板并保存到 output_path，返回文件大小；队列已满时抛出 DocumentRendererBusy"""
+        return await self._run(render_to_file, template_name, context, output_path)
+
+    async def render_bytes(self, template_name: str, context: dict) -> bytes:
+        """渲染模板并返回 .docx 文件内容，不写入磁盘；队列已满时抛出 DocumentRendererBusy"""
+        return await self._run(render_to_bytes, template_name, context)
+
+    async def _run(self, func: Callable[..., Tuple[T, Dict[str, float]]], *args) -> T:
+        """在工作进程中执行渲染函数，各阶段耗时计入当前请求，排队与进程间传输的时间计为 render_wait"""
+        queued = time.monotonic()
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(max(self.workers, 1) + self.queue_size)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise DocumentRendererBusy("文档渲染队列已满，请稍后重试")
+
+        self.pending += 1
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        slots = self._slots
+        executor: Optional[Executor] = None
+        try:
+            try:
+                executor = self._get_executor()
+                future = executor.submit(func, *args)
+            except BaseException:
+                self._finish(slots, started)
+                raise
+            # 渲染真正结束时才释放空位：等待方被取消（如批量请求的客户端断开）后，
+            # 已在工作进程中执行的渲染仍占用队列，避免同时进行的渲染超出上限
+            future.add_done_callback(lambda _: _call_soon_threadsafe(loop, self._finish, slots, started))
+            result, timings = await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # 工作进程异常退出，关闭并丢弃进程池，下一次渲染时重新创建
+            self.failed += 1
+            if executor is not None and self._executor is executor:
+                self._executor = None
+                executor.shutdown(wait=False, cancel_futures=True)
+            raise
+        except Exception:
+            self.failed += 1
+            raise
+
+        self.rendered += 1
+        finished = time.monotonic()
+        for name, seconds in timings.items():
+            request_timing.record(name, seconds)
+        request_timing.record("render_wait", max(finished - queued - sum(timings.values()), 0.0))
+        if self.on_render is not None:
+            self.on_render(args[0], finished - started)
+        return result
+
+    def _finish(self, slots: asyncio.Semaphore, started: float) -> None:
+        self.render_seconds += time.monotonic() - started
+        self.pending -= 1
+        slots.release()
+
+    async def close(self) -> None:
+        """等待进行中的渲染完成并关闭进程池"""
+        if self._executor is not None:
+            executor, self._executor = self._executor, None
+            await asyncio.get_running_loop().run_in_executor(None, executor.shutdown)
+        self._slots = None
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "pending": self.pending,
+            "rendered": self.rendered,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "render_seconds": round(self.render_seconds, 3),
+        }
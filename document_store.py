@@ -0,0 +1,220 @@
+"""
+生成文件存储
+
+生成的文档按文件名的哈希分散到子目录中，避免单个目录文件过多；
+SQLite 索引记录每个下载文件名对应的路径、大小与过期时间，下载时通过索引定位文件，无需扫描目录。
+后台清理任务删除过期文件，并在总大小超出上限时按过期时间从早到晚删除。
+"""
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class StoredFile(NamedTuple):
+    name: str
+    path: str
+    size: int
+    created_at: float
+    expires_at: Optional[float]
+    digest: str  # 文件内容的 sha256 摘要，用作强 ETag
+
+
+def file_digest(path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class GeneratedFileStore:
+    """生成文件的分片目录与索引
+
+    ttl: 文件保留时长（秒），为 None 时不过期；再次使用同一文件（如重复请求复用）时重新计时
+    max_bytes: 文件总大小上限，为 None 时不限
+    """
+
+    INDEX_FILE = "index.sqlite3"
+    _COLUMNS = ", ".join(StoredFile._fields)
+    TMP_SUFFIX = ".tmp"
+    # 渲染中断遗留的临时文件保留时长（秒）
+    TMP_MAX_AGE = 3600
+
+    def __init__(self, directory: str, ttl: Optional[float] = None, max_bytes: Optional[int] = None,
+                 busy_timeout: float = 5.0):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.index_path = os.path.join(directory, self.INDEX_FILE)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.index_path, timeout=busy_timeout, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        with self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "name TEXT PRIMARY KEY, path TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, expires_at REAL, digest TEXT NOT NULL DEFAULT '')"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS files_expires_at ON files (expires_at)")
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(files)")]
+            if "digest" not in columns:
+                self._conn.execute("ALTER TABLE files ADD COLUMN digest TEXT NOT NULL DEFAULT ''")
+        self.swept_files = 0
+        self.swept_bytes = 0
+
+    def path_for(self, name: str) -> str:
+        """返回文件名对应的分片路径（并创建分片目录）"""
+        shard = hashlib.sha1(name.encode("utf-8")).hexdigest()[:2]
+        shard_dir = os.path.join(self.directory, shard)
+        os.makedirs(shard_dir, exist_ok=True)
+        return os.path.join(shard_dir, name)
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl is not None else None
+
+    def register(self, name: str, path: str) -> StoredFile:
+        """登记已写入的文件"""
+        entry = StoredFile(name, path, os.path.getsize(path), time.time(), self._expires_at(), file_digest(path))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO files (name, path, size, created_at, expires_at, digest) "
+                "VALUES (?, ?, ?, ?, ?, ?)", entry
+            )
+        return entry
+
+    def resolve(self, name: str) -> Optional[StoredFile]:
+        """按下载文件名查找文件，不存在或已过期时返回 None"""
+        with self._lock:
+            row = self._conn.execute(f"SELECT {self._COLUMNS} FROM files WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return None
+        entry = StoredFile(*row)
+        if entry.expires_at is not None and entry.expires_at <= time.time():
+            return None
+        if not entry.digest:
+            # 旧版本索引中没有摘要的条目，首次访问时补齐
+            try:
+                entry = entry._replace(digest=file_digest(entry.path))
+            except FileNotFoundError:
+                return entry
+            with self._lock, self._conn:
+                self._conn.execute("UPDATE files SET digest = ? WHERE name = ?", (entry.digest, name))
+        return entry
+
+    def touch(self, name: str) -> Optional[StoredFile]:
+        """文件被再次使用时重新计算过期时间，文件已被删除时移除索引并返回 None"""
+        entry = self.resolve(name)
+        if entry is None:
+            return None
+        if not os.path.exists(entry.path):
+            self._forget([name])
+            return None
+        entry = entry._replace(expires_at=self._expires_at())
+        with self._lock, self._conn:
+            self._conn.execute("UPDATE files SET expires_at = ? WHERE name = ?", (entry.expires_at, name))
+        return entry
+
+    def _forget(self, names) -> None:
+        with self._lock, self._conn:
+            self._conn.executemany("DELETE FROM files WHERE name = ?", [(name,) for name in names])
+
+    def _delete(self, entries) -> Tuple[int, int]:
+        """删除索引条目与文件，返回 (删除的文件数, 释放的字节数)
+
+        只删除自选出以来未被修改的条目：其他 worker 在此期间复用（重新计时）或重新登记的文件保留；
+        先提交索引删除，再删除实际移出索引的文件。
+        """
+        removed = []
+        with self._lock, self._conn:
+            for entry in entries:
+                cursor = self._conn.execute(
+                    "DELETE FROM files WHERE name = ? AND expires_at IS ? AND created_at = ?",
+                    (entry.name, entry.expires_at, entry.created_at),
+                )
+                if cursor.rowcount:
+                    removed.append(entry)
+        freed = 0
+        for entry in removed:
+            try:
+                os.remove(entry.path)
+                freed += entry.size
+            except FileNotFoundError:
+                pass
+        self.swept_files += len(removed)
+        self.swept_bytes += freed
+        return len(removed), freed
+
+    def sweep(self) -> Dict[str, int]:
+        """删除过期文件与遗留的临时文件，总大小超出上限时按过期时间从早到晚删除"""
+        now = time.time()
+        with self._lock:
+            expired = [StoredFile(*row) for row in self._conn.execute(
+                f"SELECT {self._COLUMNS} FROM files WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))]
+        removed, freed = self._delete(expired)
+
+        if self.max_bytes is not None:
+            with self._lock:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM files").fetchone()[0]
+                over = []
+                if total > self.max_bytes:
+                    for row in self._conn.execute(f"SELECT {self._COLUMNS} FROM files ORDER BY expires_at, created_at"):
+                        over.append(StoredFile(*row))
+                        total -= row[2]
+                        if total <= self.max_bytes:
+                            break
+            over_removed, over_freed = self._delete(over)
+            removed += over_removed
+            freed += over_freed
+
+        for entry in os.scandir(self.directory):
+            if entry.is_dir():
+                for child in os.scandir(entry.path):
+                    if child.name.endswith(self.TMP_SUFFIX) and child.stat().st_mtime < now - self.TMP_MAX_AGE:
+                        try:
+                            os.remove(child.path)
+                        except FileNotFoundError:
+                            pass
+        return {"removed": removed, "freed_bytes": freed}
+
+    def migrate_flat_files(self) -> int:
+        """将旧版本直接存放在根目录下的生成文件移入分片目录并登记，返回迁移的文件数
+
+        多个 worker 可能同时启动并迁移：文件已被其他 worker 移走时跳过。
+        """
+        migrated = 0
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or not entry.name.endswith(".docx"):
+                continue
+            path = self.path_for(entry.name)
+            try:
+                os.replace(entry.path, path)
+            except FileNotFoundError:
+                continue
+            self.register(entry.name, path)
+            migrated += 1
+        return migrated
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        return {
+            "files": count,
+            "bytes": total,
+            "ttl": self.ttl,
+            "max_bytes": self.max_bytes,
+            "swept_files": self.swept_files,
+            "swept_bytes": self.swept_bytes,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
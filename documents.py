@@ -0,0 +1,526 @@
+"""
+文档生成功能
+
+出库单与维修确认单的生成、批量生成与下载接口。docxtpl（及其依赖的 lxml、python-docx、Jinja2）
+只在工作进程（或不使用工作进程时第一次渲染）中加载，生成文件目录在第一次生成文件时创建，
+导入本模块不加载这些依赖，也不创建目录。
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import zipfile
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+from uuid import uuid4
+
+from fastapi import APIRouter, Form, HTTPException, Request
+from fastapi.responses import FileResponse, PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError, validator
+
+from document_renderer import DocumentRenderer, DocumentRendererBusy
+from document_store import GeneratedFileStore, StoredFile
+from metrics import REGISTRY
+from request_timing import span
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 根路径中列出的接口说明
+ENDPOINTS = {
+    "/generate_delivery_note": "生成出库单",
+    "/generate_delivery_note/bulk": "批量生成出库单（ZIP流式返回）",
+    "/generate_maintenance_quote": "生成维修确认单",
+    "/download/{file_name}": "下载生成的文件",
+    "/admin/documents": "文档渲染队列统计",
+}
+
+DOCUMENT_RENDER_DURATION = REGISTRY.histogram(
+    "document_render_duration_seconds", "文档渲染耗时（秒，包括等待空闲工作进程）", ("template",))
+
+# 生成文件按文件名哈希分片存放，通过索引定位；超过保留时长（秒）的文件由后台任务定期清理，
+# 总大小（字节）超出上限时优先删除最早过期的文件。保留时长或上限设为0表示不限
+GENERATED_FILES_DIR = os.getenv("GENERATED_FILES_DIR", "generated_files")
+GENERATED_FILES_TTL = float(os.getenv("GENERATED_FILES_TTL", str(7 * 24 * 3600)))
+GENERATED_FILES_MAX_BYTES = int(os.getenv("GENERATED_FILES_MAX_BYTES", str(1024 ** 3)))
+GENERATED_FILES_SWEEP_INTERVAL = float(os.getenv("GENERATED_FILES_SWEEP_INTERVAL", "600"))
+
+# 生成文件存储在第一次使用时打开，只提供下载或从未生成过文件的进程不创建目录与索引。
+# 存储的索引读写与文件摘要计算都在线程中进行，不阻塞事件循环
+_generated_files: Optional[GeneratedFileStore] = None
+_generated_files_lock = threading.Lock()
+
+def get_generated_files() -> GeneratedFileStore:
+    """获取生成文件存储，第一次调用时创建目录与索引，并将旧版平铺存放的文件迁移到分片目录"""
+    global _generated_files
+    with _generated_files_lock:
+        if _generated_files is None:
+            store = GeneratedFileStore(
+                GENERATED_FILES_DIR,
+                ttl=GENERATED_FILES_TTL or None,
+                max_bytes=GENERATED_FILES_MAX_BYTES or None,
+            )
+            migrated = store.migrate_flat_files()
+            if migrated:
+                logger.info(f"已将 {migrated} 个生成文件迁移到分片目录")
+            _generated_files = store
+    return _generated_files
+
+def existing_generated_files() -> Optional[GeneratedFileStore]:
+    """获取生成文件存储，目录尚不存在（从未生成过文件）时返回 None 而不创建"""
+    if _generated_files is None and not os.path.isdir(GENERATED_FILES_DIR):
+        return None
+    return get_generated_files()
+
+# 定期清理生成文件的后台任务，随应用启动
+_sweeper: Optional["asyncio.Task[None]"] = None
+
+async def _sweep_generated_files():
+    """定期清理过期与超出容量的生成文件"""
+    while True:
+        try:
+            store = existing_generated_files()
+            if store is not None:
+                result = await asyncio.to_thread(store.sweep)
+                if result["removed"]:
+                    logger.info(f"已清理 {result['removed']} 个生成文件，释放 {result['freed_bytes']} 字节")
+        except Exception as e:
+            logger.warning(f"清理生成文件失败: {e!r}")
+        await asyncio.sleep(GENERATED_FILES_SWEEP_INTERVAL)
+
+# 模板文件内容摘要缓存：路径 -> ((mtime_ns, 大小), sha256)
+_template_digests: Dict[str, Tuple[Tuple[int, int], str]] = {}
+
+def template_version(path: str) -> str:
+    """返回模板文件内容的 sha256 摘要，文件未变化时直接使用缓存；模板不存在时抛出 FileNotFoundError"""
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    cached = _template_digests.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+    with open(path, "rb") as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    _template_digests[path] = (signature, digest)
+    return digest
+
+class DeliveryNoteRequest(BaseModel):
+    customer_delivery_address: str = Field(..., alias="customer_delivery_addres")
+    instmt_model: List[str] = Field(default_factory=list)
+    instmt_serial_number: List[str] = Field(default_factory=list)
+    instmt_accessories_info: List[str] = Field(default_factory=list)
+    sales_rpstv: str = ""
+    current_date: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
+
+    @validator('instmt_model', 'instmt_serial_number', 'instmt_accessories_info', pre=True)
+    def split_string_to_list(cls, v):
+        """将逗号分隔的字符串转换为列表，兼容表单数据格式"""
+        if isinstance(v, str):
+            return [item.strip() for item in v.split(',')]
+        return v
+
+    class Config:
+        allow_population_by_field_name = True
+
+class MaintenanceQuoteRequest(BaseModel):
+    cust_name: str  # 客户名称
+    cust_add: str = ""  # 客户地址
+    cust_phone: str = ""  # 联系电话
+    cust_contact: str = ""  # 联系人
+    device_type: str = ""  # 仪器类型
+    device_sn: str = ""  # 仪器序列号
+    device_err: str = ""  # 故障现象
+    dtc_rslt: str = ""  # 检测结果
+    total_fee: str = ""  # 维修费用
+    device_model: str = ""  # 仪器型号
+    accessories: str = ""  # 随机附件
+    repair_plan: str = ""  # 维修方案
+    maint_eng_id: str = ""  # 维修工程师
+    current_date: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
+
+    @validator('total_fee', pre=True)
+    def format_fee(cls, v):
+        """兼容数字格式的费用"""
+        if isinstance(v, float):
+            return f"{v:.2f}"
+        if isinstance(v, int):
+            return str(v)
+        return v
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(__file__), "temp")
+DOCX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+DELIVERY_NOTE_TEMPLATE = "西安安泰测试科技有限公司发货单.docx"
+MAINTENANCE_QUOTE_TEMPLATE = "西安安泰测试科技有限公司维修确认单.docx"
+
+# 模板文件不存在时返回给客户端的提示（不包含服务端路径）
+TEMPLATE_NOT_FOUND_MESSAGES = {
+    DELIVERY_NOTE_TEMPLATE: "发货单模板未找到",
+    MAINTENANCE_QUOTE_TEMPLATE: "维修确认单模板未找到",
+}
+
+class TemplateNotFound(Exception):
+    """模板文件不存在"""
+
+# 文档渲染在独立的工作进程中进行，不阻塞事件循环；工作进程数为0时改用线程渲染。
+# 工作进程全部繁忙时最多排队 DOCUMENT_RENDER_QUEUE_SIZE 个渲染，队列已满时等待空位的时间（秒）超时后返回503
+DOCUMENT_RENDER_WORKERS = int(os.getenv("DOCUMENT_RENDER_WORKERS", "2"))
+DOCUMENT_RENDER_QUEUE_SIZE = int(os.getenv("DOCUMENT_RENDER_QUEUE_SIZE", "16"))
+DOCUMENT_RENDER_QUEUE_TIMEOUT = float(os.getenv("DOCUMENT_RENDER_QUEUE_TIMEOUT", "5"))
+_document_renderer = DocumentRenderer(
+    TEMPLATE_DIR,
+    workers=DOCUMENT_RENDER_WORKERS,
+    queue_size=DOCUMENT_RENDER_QUEUE_SIZE,
+    queue_timeout=DOCUMENT_RENDER_QUEUE_TIMEOUT,
+    on_render=lambda template_name, seconds: DOCUMENT_RENDER_DURATION.observe(seconds, template_name),
+)
+
+def build_delivery_note_context(validated_request: DeliveryNoteRequest) -> dict:
+    """生成出库单模板的渲染上下文"""
+    context = validated_request.dict(by_alias=True)
+
+    # 合并多字段为元组列表
+    context["instmt_list"] = list(zip(
+        context["instmt_model"],
+        context["instmt_serial_number"],
+        context["instmt_accessories_info"]
+    ))
+    return context
+
+# 正在生成中的文档，相同内容的并发请求共享同一次渲染
+_inflight_documents: Dict[str, "asyncio.Future[None]"] = {}
+_document_stats = {"reused": 0, "coalesced": 0}
+
+def document_key(template_name: str, context: dict) -> str:
+    """文档内容摘要：模板文件内容与渲染上下文相同的文档内容相同；模板不存在时抛出 TemplateNotFound"""
+    try:
+        template_digest = template_version(os.path.join(TEMPLATE_DIR, template_name))
+    except FileNotFoundError:
+        raise TemplateNotFound(TEMPLATE_NOT_FOUND_MESSAGES.get(template_name, "模板未找到"))
+    payload = json.dumps({"template": template_digest, "context": context},
+                         ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def _store_rendered(store: GeneratedFileStore, tmp_path: str, docx_path: str, docx_filename: str) -> None:
+    """将渲染好的临时文件原子替换到正式路径并登记（计算摘要、写入索引），在线程中调用"""
+    os.replace(tmp_path, docx_path)
+    store.register(docx_filename, docx_path)
+
+async def _render_to_path(template_name: str, context: dict, docx_filename: str) -> None:
+    """渲染到临时文件后原子替换并登记，下载时不会读到写了一半的文件"""
+    store = await asyncio.to_thread(get_generated_files)
+    docx_path = store.path_for(docx_filename)
+    tmp_path = f"{docx_path}.{uuid4().hex[:8]}{GeneratedFileStore.TMP_SUFFIX}"
+    try:
+        await _document_renderer.render(template_name, context, tmp_path)
+        with span("store"):
+            await asyncio.to_thread(_store_rendered, store, tmp_path, docx_path, docx_filename)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+async def render_document(template_name: str, context: dict, title: str) -> str:
+    """用模板渲染文档并保存到 generated_files，返回文件名
+
+    文件名由模板版本与上下文的摘要确定，相同请求直接返回已生成的文件（并重新计算保留时长），不重复渲染。
+    """
+    with span("digest"):
+        key = document_key(template_name, context)
+        docx_filename = f"{title}_{key[:16]}.docx"
+    task = _inflight_documents.get(key)
+    if task is None:
+        with span("digest"):
+            stored = await asyncio.to_thread(lambda: get_generated_files().touch(docx_filename))
+        if stored is not None:
+            _document_stats["reused"] += 1
+            return docx_filename
+        # 查找期间可能已有相同文档开始生成
+        task = _inflight_documents.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_render_to_path(template_name, context, docx_filename))
+        _inflight_documents[key] = task
+        task.add_done_callback(lambda _: _inflight_documents.pop(key, None))
+    else:
+        _document_stats["coalesced"] += 1
+    await asyncio.shield(task)
+    return docx_filename
+
+def wants_document_body(request: Request) -> bool:
+    """客户端是否要求直接返回文档内容（?response=docx 或 Accept 为 .docx 类型），而非下载链接"""
+    return (request.query_params.get("response") == "docx"
+            or DOCX_MEDIA_TYPE in request.headers.get("accept", ""))
+
+def _attachment_headers(file_name: str) -> Dict[str, str]:
+    """支持中文文件名的下载响应头"""
+    return {"Content-Disposition": f"attachment; filename*=utf-8''{quote(file_name)}"}
+
+def _touch_existing_file(docx_filename: str) -> Optional[StoredFile]:
+    """查找已生成的相同文档并重新计时，不创建生成文件目录；在线程中调用"""
+    store = existing_generated_files()
+    return store.touch(docx_filename) if store is not None else None
+
+async def document_response(template_name: str, context: dict, title: str) -> Response:
+    """在内存中渲染文档并直接作为响应返回，不写入磁盘；已生成过相同文档时直接返回该文件"""
+    with span("digest"):
+        docx_filename = f"{title}_{document_key(template_name, context)[:16]}.docx"
+        stored = await asyncio.to_thread(_touch_existing_file, docx_filename)
+    if stored is not None:
+        _document_stats["reused"] += 1
+        return FileResponse(stored.path, media_type=DOCX_MEDIA_TYPE, headers=_attachment_headers(docx_filename))
+    content = await _document_renderer.render_bytes(template_name, context)
+    return Response(content, media_type=DOCX_MEDIA_TYPE, headers=_attachment_headers(docx_filename))
+
+@router.post("/generate_delivery_note")
+async def generate_delivery_note(
+    request: Request,
+    customer_delivery_addres: Optional[str] = Form(None),
+    instmt_model: Optional[str] = Form(None),
+    instmt_serial_number: Optional[str] = Form(None),
+    instmt_accessories_info: Optional[str] = Form(None),
+    sales_rpstv: Optional[str] = Form(None),
+):
+    try:
+        # 处理表单数据和JSON数据
+        if request.headers.get("content-type") == "application/json":
+            raw_data = await request.body()
+            with span("parse"):
+                current_data = json.loads(raw_data.decode("utf-8"))
+        else:
+            form_data = await request.form()
+            current_data = {
+                "customer_delivery_addres": form_data.get("customer_delivery_addres"),
+                "instmt_model": form_data.getlist("instmt_model"),
+                "instmt_serial_number": form_data.getlist("instmt_serial_number"),
+                "instmt_accessories_info": form_data.getlist("instmt_accessories_info"),
+                "sales_rpstv": form_data.get("sales_rpstv"),
+            }
+
+        with span("parse"):
+            validated_request = DeliveryNoteRequest(**current_data)
+
+        # 生成文件逻辑
+        context = build_delivery_note_context(validated_request)
+        if wants_document_body(request):
+            return await document_response(DELIVERY_NOTE_TEMPLATE, context, "出库单")
+        docx_filename = await render_document(DELIVERY_NOTE_TEMPLATE, context, "出库单")
+
+        base_url = str(request.base_url)
+        download_url = f"{base_url}download/{docx_filename}"
+        return PlainTextResponse(download_url, media_type="text/plain")
+
+    except json.JSONDecodeError:
+        raise HTTPException(400, "无效的JSON格式")
+    except ValidationError as e:
+        raise HTTPException(422, f"数据验证失败: {e.errors()}")
+    except TemplateNotFound as e:
+        raise HTTPException(404, str(e))
+    except DocumentRendererBusy as e:
+        raise HTTPException(503, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"生成失败: {str(e)}")
+
+# 批量生成出库单时同时渲染的数量，其余在渲染器队列之外等待，避免占满队列影响单个请求
+BULK_DOCUMENT_CONCURRENCY = int(os.getenv("BULK_DOCUMENT_CONCURRENCY", str(max(DOCUMENT_RENDER_WORKERS, 1))))
+
+class _ZipChunkSink:
+    """供 ZipFile 写入的不可寻址输出，写入的数据由调用方取走后立即发送"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+@router.post("/generate_delivery_note/bulk")
+async def generate_delivery_notes_bulk(request: Request):
+    """批量生成出库单，以ZIP压缩包流式返回
+
+    请求体为 DeliveryNoteRequest 的JSON数组。各出库单并行渲染，每完成一份即写入压缩包并发送，
+    压缩包不在内存或磁盘中整体保存；渲染失败的出库单以同名 .txt 条目记录错误信息。
+    """
+    try:
+        payloads = json.loads((await request.body()).decode("utf-8"))
+        if not isinstance(payloads, list) or not payloads:
+            raise HTTPException(400, "请求体应为非空的JSON数组")
+        contexts = [build_delivery_note_context(DeliveryNoteRequest(**payload)) for payload in payloads]
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise HTTPException(400, "无效的JSON格式")
+    except ValidationError as e:
+        raise HTTPException(422, f"数据验证失败: {e.errors()}")
+    except TypeError:
+        raise HTTPException(422, "数组元素应为JSON对象")
+    if not os.path.exists(os.path.join(TEMPLATE_DIR, DELIVERY_NOTE_TEMPLATE)):
+        raise HTTPException(404, TEMPLATE_NOT_FOUND_MESSAGES[DELIVERY_NOTE_TEMPLATE])
+
+    async def render(index: int) -> Tuple[int, Optional[bytes], Optional[str]]:
+        try:
+            return index, await _document_renderer.render_bytes(DELIVERY_NOTE_TEMPLATE, contexts[index]), None
+        except Exception as e:
+            logger.warning(f"批量出库单第 {index + 1} 份生成失败: {e}")
+            return index, None, str(e)
+
+    async def generate():
+        sink = _ZipChunkSink()
+        # 条目按请求顺序编号，至少两位（出库单_01、出库单_02……），数量更多时按总数补齐位数
+        width = max(2, len(str(len(contexts))))
+        pending = set()
+        next_index = 0
+        try:
+            with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_DEFLATED, compresslevel=1) as archive:
+                while next_index < len(contexts) or pending:
+                    while next_index < len(contexts) and len(pending) < BULK_DOCUMENT_CONCURRENCY:
+                        pending.add(asyncio.ensure_future(render(next_index)))
+                        next_index += 1
+                    done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for task in done:
+                        index, content, error = task.result()
+                        name = f"出库单_{index + 1:0{width}d}"
+                        if content is not None:
+                            archive.writestr(f"{name}.docx", content)
+                        else:
+                            archive.writestr(f"{name}.txt", f"生成失败: {error}")
+                        yield sink.drain()
+            yield sink.drain()
+        finally:
+            # 客户端中途断开时取消尚未完成的渲染：排队中的渲染不再执行，
+            # 已在工作进程中执行的渲染完成后才释放渲染队列的空位
+            for task in pending:
+                task.cancel()
+
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+    return StreamingResponse(generate(), media_type="application/zip",
+                             headers=_attachment_headers(f"出库单_{timestamp}.zip"))
+
+@router.post("/generate_maintenance_quote")
+async def generate_maintenance_quote(request: Request):
+    """生成维修确认单，支持JSON与表单数据"""
+    try:
+        if request.headers.get("content-type") == "application/json":
+            raw_data = await request.body()
+            with span("parse"):
+                current_data = json.loads(raw_data.decode("utf-8"))
+        else:
+            form_data = await request.form()
+            current_data = dict(form_data)
+
+        with span("parse"):
+            validated_request = MaintenanceQuoteRequest(**current_data)
+        if wants_document_body(request):
+            return await document_response(MAINTENANCE_QUOTE_TEMPLATE, validated_request.dict(), "维修确认单")
+        docx_filename = await render_document(MAINTENANCE_QUOTE_TEMPLATE, validated_request.dict(), "维修确认单")
+
+        base_url = str(request.base_url)
+        download_url = f"{base_url}download/{docx_filename}"
+        return PlainTextResponse(download_url, media_type="text/plain")
+
+    except json.JSONDecodeError:
+        raise HTTPException(400, "无效的JSON格式")
+    except ValidationError as e:
+        raise HTTPException(422, f"数据验证失败: {e.errors()}")
+    except TemplateNotFound as e:
+        raise HTTPException(404, str(e))
+    except DocumentRendererBusy as e:
+        raise HTTPException(503, str(e))
+    except Exception as e:
+        raise HTTPException(500, f"生成失败: {str(e)}")
+
+def _resolve_generated_file(file_name: str) -> StoredFile:
+    """通过索引定位生成文件，不存在或已过期时返回404
+
+    需要查询索引（旧版索引条目还要计算文件摘要），下载接口因此定义为普通函数，在线程池中执行。
+    """
+    store = existing_generated_files()
+    stored = store.resolve(file_name) if store is not None else None
+    if stored is None or not os.path.exists(stored.path):
+        raise HTTPException(404, "文件不存在")
+    return stored
+
+# 生成文件按内容命名、写入后不再修改，客户端可长期缓存；文档含客户信息，只允许客户端自身缓存
+GENERATED_FILES_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+def _is_not_modified(request: Request, etag: str, last_modified: float) -> bool:
+    """按 If-None-Match（优先）或 If-Modified-Since 判断客户端缓存是否仍然有效"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or any(tag.removeprefix("W/") == etag for tag in tags)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is not None:
+        try:
+            return int(last_modified) <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+def generated_file_response(request: Request, stored: StoredFile, headers: Optional[Dict[str, str]] = None) -> Response:
+    """返回生成文件，附带强 ETag（文件内容摘要）与 Last-Modified
+
+    客户端缓存有效时返回304；Range/If-Range 请求由 FileResponse 按同一组校验值返回206（或416）。
+    """
+    validators = {
+        "ETag": f'"{stored.digest}"',
+        "Last-Modified": formatdate(int(stored.created_at), usegmt=True),
+        "Cache-Control": GENERATED_FILES_CACHE_CONTROL,
+    }
+    if _is_not_modified(request, validators["ETag"], stored.created_at):
+        return Response(status_code=304, headers=validators)
+    return FileResponse(stored.path, media_type=DOCX_MEDIA_TYPE, headers={**validators, **(headers or {})})
+
+@router.api_route("/download/{file_name}", methods=["GET", "HEAD"])
+def download_file(file_name: str, request: Request):
+    """下载生成的文件，支持条件请求与断点续传"""
+    # 支持中文文件名下载
+    stored = _resolve_generated_file(file_name)
+    return generated_file_response(request, stored, _attachment_headers(file_name))
+
+@router.api_route("/static/{file_name}", methods=["GET", "HEAD"])
+def static_file(file_name: str, request: Request):
+    """按文件名直接访问生成的文件（兼容原静态文件路径）"""
+    stored = _resolve_generated_file(file_name)
+    return generated_file_response(request, stored)
+
+@router.get("/admin/documents")
+async def document_render_stats():
+    """查看文档渲染队列、进程池、重复文档复用与生成文件存储统计"""
+    store = await asyncio.to_thread(existing_generated_files)
+    return {
+        **_document_renderer.stats(),
+        **_document_stats,
+        "generated_files": await asyncio.to_thread(store.stats) if store is not None else None,
+    }
+
+# 各组件已有的统计计数，在输出 /metrics 时读取
+REGISTRY.callback("document_render_pending", "进行中与排队的文档渲染数", "gauge", lambda: _document_renderer.pending)
+REGISTRY.callback("document_render_rejected_total", "渲染队列已满被拒绝的次数", "counter",
+                  lambda: _document_renderer.rejected)
+REGISTRY.callback("document_render_failed_total", "文档渲染失败次数", "counter", lambda: _document_renderer.failed)
+REGISTRY.callback("documents_reused_total", "复用已生成文件的次数", "counter", lambda: _document_stats["reused"])
+REGISTRY.callback("documents_coalesced_total", "与进行中的相同文档合并的渲染次数", "counter",
+                  lambda: _document_stats["coalesced"])
+
+async def startup() -> None:
+    """启动时打开已有的生成文件目录（迁移旧版平铺存放的文件）并启动定期清理任务"""
+    global _sweeper
+    await asyncio.to_thread(existing_generated_files)
+    _sweeper = asyncio.create_task(_sweep_generated_files())
+
+async def shutdown() -> None:
+    """关闭时停止清理任务，等待进行中的渲染完成并关闭工作进程"""
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        _sweeper = None
+    await _document_renderer.close()
@@ -0,0 +1,90 @@
+"""
+日志配置
+
+日志记录在调用线程中只放入内存队列，由后台监听线程写入控制台与日志文件，
+请求处理不会等待磁盘或终端 I/O。日志级别与输出目标通过环境变量配置：
+
+- LOG_LEVEL: 日志级别（默认 INFO）
+- LOG_FILE: 日志文件路径（默认 app.log），为空时不写文件
+- LOG_FILE_MAX_BYTES: 单个日志文件的大小上限（默认 0，不由本进程轮转），大于 0 时超出后轮转
+- LOG_FILE_BACKUP_COUNT: 保留的轮转文件数（默认 5），仅 LOG_FILE_MAX_BYTES 大于 0 时有效
+- LOG_CONSOLE: 是否输出到控制台（默认 1）
+- LOG_LIBRARY_LEVEL: httpx 等第三方库的日志级别（默认 WARNING），避免每次上游请求都记录一条日志
+
+多个 worker 进程（uvicorn --workers）会同时追加写入同一个日志文件，各进程自行按大小轮转会互相冲突
+（重复改名、覆盖备份文件），因此默认使用 WatchedFileHandler，由 logrotate 等外部工具轮转，
+各进程发现文件被改名后自动重新打开。LOG_FILE_MAX_BYTES 只适用于单进程运行。
+"""
+
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+from typing import List, Optional
+
+LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
+LIBRARY_LOGGERS = ("httpx", "httpcore", "asyncio", "multipart")
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).strip().lower() not in ("0", "false", "no", "off", "")
+
+
+def _file_handler(log_file: str) -> logging.Handler:
+    """设置了 LOG_FILE_MAX_BYTES 时由本进程按大小轮转（仅限单进程），否则交给外部工具轮转"""
+    max_bytes = int(os.getenv("LOG_FILE_MAX_BYTES", "0"))
+    if max_bytes > 0:
+        return logging.handlers.RotatingFileHandler(
+            log_file,
+            maxBytes=max_bytes,
+            backupCount=int(os.getenv("LOG_FILE_BACKUP_COUNT", "5")),
+            encoding="utf-8",
+        )
+    return logging.handlers.WatchedFileHandler(log_file, encoding="utf-8")
+
+
+def setup_logging() -> logging.handlers.QueueListener:
+    """按环境变量配置根日志记录器并启动后台监听线程，重复调用时返回已启动的监听器"""
+    global _listener
+    if _listener is not None:
+        return _listener
+
+    formatter = logging.Formatter(LOG_FORMAT)
+    handlers: List[logging.Handler] = []
+    if _env_flag("LOG_CONSOLE", "1"):
+        handlers.append(logging.StreamHandler())
+    log_file = os.getenv("LOG_FILE", "app.log")
+    if log_file:
+        handlers.append(_file_handler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    log_queue: "queue.SimpleQueue[logging.LogRecord]" = queue.SimpleQueue()
+    root.addHandler(logging.handlers.QueueHandler(log_queue))
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    library_level = os.getenv("LOG_LIBRARY_LEVEL", "WARNING").upper()
+    for name in LIBRARY_LOGGERS:
+        logging.getLogger(name).setLevel(library_level)
+
+    _listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+    # 进程退出时写出队列中剩余的日志
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging() -> None:
+    """停止监听线程，写出队列中剩余的日志并关闭输出"""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.close()
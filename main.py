@@ -1,302 +1,131 @@
-from fastapi import FastAPI, HTTPException, Request, Form
-from fastapi.staticfiles import StaticFiles
+from fastapi import APIRouter, FastAPI, HTTPException, Request
 from fastapi.responses import FileResponse, RedirectResponse, PlainTextResponse
-from pydantic import BaseModel, Field, ValidationError, validator
-from docxtpl import DocxTemplate
-from uuid import uuid4
-from datetime import datetime, timedelta
-from typing import List, Optional
-from urllib.parse import quote
-import requests
+from contextlib import asynccontextmanager
+from typing import Optional
+import io
+import pstats
+import re
 import os
-import json
 import logging
 
-# 配置日志记录
-logging.basicConfig(
-    level=logging.DEBUG,
-    format="%(asctime)s - %(levelname)s - %(message)s",
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("app.log"),
-    ],
-)
-logger = logging.getLogger(__name__)
-
-app = FastAPI(title="仪器维修时长计算系统", description="计算仪器维修各阶段时长并判断是否超期")
-
-# 创建文件目录并挂载静态文件
-os.makedirs("generated_files", exist_ok=True)
-app.mount("/static", StaticFiles(directory="generated_files"), name="static")
-
-class RepairTimeCalculationRequest(BaseModel):
-    rep_ins_type: int  # 仪器类型，3为返修，其他为普通维修
-    rep_start_date: str  # 派工时间戳 (ISO格式)
-    quot_start_date: Optional[str] = None  # 提交报价时间戳 (ISO格式)
-    detec_start_date: Optional[str] = None  # 合同审核通过时间戳 (ISO格式)
-    qc_start_time: Optional[str] = None  # 提交质检时间戳 (ISO格式)
-
-class RepairTimeResult(BaseModel):
-    rep_ins_type: int
-    detection_days: Optional[int] = None  # 检测时长（工作日）
-    repair_days: Optional[int] = None  # 维修时长（工作日）
-    return_repair_days: Optional[int] = None  # 返修时长（工作日）
-    is_detection_overdue: Optional[bool] = None  # 检测是否超期
-    is_repair_overdue: Optional[bool] = None  # 维修是否超期
-    is_return_repair_overdue: Optional[bool] = None  # 返修是否超期
-    message: str
-
-class DeliveryNoteRequest(BaseModel):
-    customer_delivery_address: str = Field(..., alias="customer_delivery_addres")
-    instmt_model: List[str] = Field(default_factory=list)
-    instmt_serial_number: List[str] = Field(default_factory=list)
-    instmt_accessories_info: List[str] = Field(default_factory=list)
-    sales_rpstv: str = ""
-    current_date: str = Field(default_factory=lambda: datetime.now().strftime("%Y-%m-%d"))
-
-    @validator('instmt_model', 'instmt_serial_number', 'instmt_accessories_info', pre=True)
-    def split_string_to_list(cls, v):
-        """将逗号分隔的字符串转换为列表，兼容表单数据格式"""
-        if isinstance(v, str):
-            return [item.strip() for item in v.split(',')]
-        return v
-
-    class Config:
-        allow_population_by_field_name = True
-
-# 工作日API配置
-WORKDAY_API_URL = "https://date.appworlds.cn/work/days"
-
-# 缓存工作日数据，避免重复API调用
-_workday_cache = {}
-
-def get_workdays_from_api(start_date: datetime, end_date: datetime) -> int:
-    """通过API获取两个日期之间的工作日数量"""
-    try:
-        # 格式化日期为API要求的格式
-        start_str = start_date.strftime('%Y-%m-%d')
-        end_str = end_date.strftime('%Y-%m-%d')
-        
-        # 检查缓存
-        cache_key = f"{start_str}_{end_str}"
-        if cache_key in _workday_cache:
-            return _workday_cache[cache_key]
-        
-        # 调用API
-        params = {
-            'startDate': start_str,
-            'endDate': end_str
-        }
-        
-        response = requests.get(WORKDAY_API_URL, params=params, timeout=10)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        if data.get('code') == 200:
-            workdays = data.get('data', 0)
-            # 缓存结果
-            _workday_cache[cache_key] = workdays
-            return workdays
-        else:
-            raise Exception(f"API返回错误: {data.get('msg', '未知错误')}")
-            
-    except Exception as e:
-        # API调用失败时，使用本地计算作为备用方案
-        print(f"API调用失败，使用本地计算: {str(e)}")
-        return calculate_workdays_local(start_date, end_date)
-
-def calculate_workdays_local(start_date: datetime, end_date: datetime) -> int:
-    """本地计算工作日数量（备用方案，仅排除周末）"""
-    if start_date >= end_date:
-        return 0
-    
-    workdays = 0
-    current_date = start_date
-    
-    while current_date < end_date:
-        # 仅排除周末，不考虑节假日
-        if current_date.weekday() < 5:  # 0-4为周一到周五
-            workdays += 1
-        current_date += timedelta(days=1)
-    
-    return workdays
-
-def calculate_workdays(start_date: datetime, end_date: datetime) -> int:
-    """计算两个日期之间的工作日数量（优先使用API）"""
-    if start_date >= end_date:
-        return 0
-    
-    # 检查日期范围是否超过一年（API限制）
-    if (end_date - start_date).days > 365:
-        # 如果超过一年，分段计算
-        total_workdays = 0
-        current_start = start_date
-        
-        while current_start < end_date:
-            # 计算一年的结束日期
-            year_end = datetime(current_start.year + 1, 1, 1)
-            current_end = min(year_end, end_date)
-            
-            # 计算这一段的工作日
-            segment_workdays = get_workdays_from_api(current_start, current_end)
-            total_workdays += segment_workdays
-            
-            current_start = current_end
-        
-        return total_workdays
-    else:
-        return get_workdays_from_api(start_date, end_date)
-
-def parse_datetime(date_str: str) -> datetime:
-    """解析ISO格式的日期时间字符串"""
-    try:
-        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
-    except ValueError:
-        try:
-            return datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-        except ValueError:
-            return datetime.strptime(date_str, '%Y-%m-%d')
+from log_config import setup_logging
+from metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, RequestMetricsMiddleware
+from request_timing import PROFILE_SUFFIX, ServerTimingMiddleware
 
-@app.post("/calculate_repair_time", response_model=RepairTimeResult)
-async def calculate_repair_time(request: RepairTimeCalculationRequest):
-    """计算维修时长并判断是否超期"""
-    try:
-        result = RepairTimeResult(
-            rep_ins_type=request.rep_ins_type,
-            message="计算完成"
-        )
-        
-        # 解析派工时间
-        rep_start = parse_datetime(request.rep_start_date)
-        
-        if request.rep_ins_type != 3:
-            # 一、保修为其他类型的仪器(rep_ins_type不等于3)
-            
-            # 1. 检测时长≤7个工作日
-            # 提交报价时间戳(quot_start_date) - 派工时间戳(rep_start_date)
-            if request.quot_start_date:
-                quot_start = parse_datetime(request.quot_start_date)
-                result.detection_days = calculate_workdays(rep_start, quot_start)
-                result.is_detection_overdue = result.detection_days > 7
-            
-            # 2. 维修时长≤10个工作日
-            # 提交质检时间戳(qc_start_time) - 合同审核通过时间戳(detec_start_date)
-            if request.qc_start_time and request.detec_start_date:
-                qc_start = parse_datetime(request.qc_start_time)
-                detec_start = parse_datetime(request.detec_start_date)
-                result.repair_days = calculate_workdays(detec_start, qc_start)
-                result.is_repair_overdue = result.repair_days > 10
-        
-        else:
-            # 二、保修为返修的仪器(rep_ins_type等于3)
-            
-            # 3. 返修时长≤10个工作日
-            # 提交质检时间戳(qc_start_time) - 派工时间戳(rep_start_date)
-            if request.qc_start_time:
-                qc_start = parse_datetime(request.qc_start_time)
-                result.return_repair_days = calculate_workdays(rep_start, qc_start)
-                result.is_return_repair_overdue = result.return_repair_days > 10
-        
-        return result
-        
-    except Exception as e:
-        raise HTTPException(status_code=400, detail=f"计算失败: {str(e)}")
+logger = logging.getLogger(__name__)
 
-@app.post("/generate_delivery_note")
-async def generate_delivery_note(
-    request: Request,
-    customer_delivery_addres: Optional[str] = Form(None),
-    instmt_model: Optional[str] = Form(None),
-    instmt_serial_number: Optional[str] = Form(None),
-    instmt_accessories_info: Optional[str] = Form(None),
-    sales_rpstv: Optional[str] = Form(None),
-):
+# 本进程启用的功能（ENABLE_REPAIR_TIME=0 / ENABLE_DOCUMENTS=0 关闭）：只计算维修时长的 worker 可关闭文档生成，
+# 不导入文档相关模块与依赖，启动更快、占用内存更少
+ENABLE_REPAIR_TIME = os.getenv("ENABLE_REPAIR_TIME", "1") != "0"
+ENABLE_DOCUMENTS = os.getenv("ENABLE_DOCUMENTS", "1") != "0"
+
+# 响应头 Server-Timing 给出各阶段耗时（SERVER_TIMING=0 关闭）；设置 REQUEST_PROFILE_DIR 后，
+# 带 X-Profile: 1 请求头或 ?profile=1 参数的请求在 cProfile 下执行，结果通过 /admin/profiles/{profile_id} 查看
+SERVER_TIMING = os.getenv("SERVER_TIMING", "1") != "0"
+REQUEST_PROFILE_DIR = os.getenv("REQUEST_PROFILE_DIR")
+REQUEST_PROFILE_KEEP = int(os.getenv("REQUEST_PROFILE_KEEP", "50"))
+
+# 进程内运行指标，通过 /metrics 以 Prometheus 文本格式输出；各功能模块的指标在导入时注册到同一注册表
+_metrics = REGISTRY
+HTTP_REQUESTS = _metrics.counter("http_requests_total", "HTTP请求数", ("method", "route", "status"))
+HTTP_REQUEST_DURATION = _metrics.histogram("http_request_duration_seconds", "HTTP请求耗时（秒）", ("method", "route"))
+
+def load_features() -> list:
+    """导入已启用的功能模块，各自提供 router、ENDPOINTS 与 startup/shutdown"""
+    features = []
+    if ENABLE_REPAIR_TIME:
+        import repair_time
+        features.append(repair_time)
+    if ENABLE_DOCUMENTS:
+        import documents
+        features.append(documents)
+    return features
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """应用生命周期：依次启动已启用的功能模块，关闭时按相反顺序释放资源"""
+    started = []
     try:
-        # 处理表单数据和JSON数据
-        if request.headers.get("content-type") == "application/json":
-            raw_data = await request.body()
-            current_data = json.loads(raw_data.decode("utf-8"))
-        else:
-            form_data = await request.form()
-            current_data = {
-                "customer_delivery_addres": form_data.get("customer_delivery_addres"),
-                "instmt_model": form_data.getlist("instmt_model"),
-                "instmt_serial_number": form_data.getlist("instmt_serial_number"),
-                "instmt_accessories_info": form_data.getlist("instmt_accessories_info"),
-                "sales_rpstv": form_data.get("sales_rpstv"),
-            }
-
-        validated_request = DeliveryNoteRequest(**current_data)
-
-        # 生成文件逻辑
-        file_id = str(uuid4())[:8]
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        docx_filename = f"出库单_{file_id}_{timestamp}.docx"
-        template_path = os.path.join(
-            os.path.dirname(__file__), "temp", "西安安泰测试科技有限公司发货单.docx"
-        )
-
-        if not os.path.exists(template_path):
-            raise FileNotFoundError("发货单模板未找到")
-
-        doc = DocxTemplate(template_path)
-        context = validated_request.dict(by_alias=True)
-        
-        # 合并多字段为元组列表
-        context["instmt_list"] = list(zip(
-            context["instmt_model"],
-            context["instmt_serial_number"],
-            context["instmt_accessories_info"]
-        ))
-
-        doc.render(context)
-        docx_path = os.path.join("generated_files", docx_filename)
-        doc.save(docx_path)
-
-        base_url = str(request.base_url)
-        download_url = f"{base_url}download/{docx_filename}"
-        return PlainTextResponse(download_url, media_type="text/plain")
-
-    except json.JSONDecodeError:
-        raise HTTPException(400, "无效的JSON格式")
-    except ValidationError as e:
-        raise HTTPException(422, f"数据验证失败: {e.errors()}")
-    except Exception as e:
-        raise HTTPException(500, f"生成失败: {str(e)}")
-
-@app.get("/")
-async def root(docx_url: Optional[str] = None):
+        for feature in app.state.features:
+            await feature.startup()
+            started.append(feature)
+        yield
+    finally:
+        for feature in reversed(started):
+            await feature.shutdown()
+
+router = APIRouter()
+
+@router.get("/")
+async def root(request: Request, docx_url: Optional[str] = None):
     """API根路径"""
     if docx_url and docx_url.startswith("/download/"):
         file_name = docx_url.split("/download/")[1]
         return RedirectResponse(url=f"/download/{file_name}")
     
+    endpoints = {}
+    for feature in request.app.state.features:
+        endpoints.update(feature.ENDPOINTS)
+    endpoints.update({
+        "/metrics": "Prometheus 格式的运行指标",
+        "/admin/profiles/{profile_id}": "查看请求的性能分析结果（需设置 REQUEST_PROFILE_DIR）",
+        "/docs": "API文档",
+    })
     return {
         "message": "仪器维修时长计算系统",
-        "endpoints": {
-            "/calculate_repair_time": "计算维修时长并判断是否超期",
-            "/generate_delivery_note": "生成出库单",
-            "/download/{file_name}": "下载生成的文件",
-            "/docs": "API文档"
-        }
+        "endpoints": endpoints,
     }
 
-@app.get("/download/{file_name}")
-async def download_file(file_name: str):
-    """下载生成的文件"""
-    # 支持中文文件名下载
-    file_path = os.path.join("generated_files", file_name)
-    if not os.path.exists(file_path):
-        raise HTTPException(404, "文件不存在")
-
-    encoded_filename = quote(file_name)
-    headers = {
-        "Content-Disposition": f"attachment; filename*=utf-8''{encoded_filename}",
-        "Content-Type": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-    }
-    return FileResponse(file_path, headers=headers)
+@router.get("/metrics")
+async def metrics():
+    """以 Prometheus 文本格式输出运行指标"""
+    return PlainTextResponse(_metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@router.get("/admin/profiles/{profile_id}")
+def request_profile(profile_id: str, format: str = "text", sort: str = "cumulative", limit: int = 60):
+    """查看请求的性能分析结果：默认返回按累计耗时排序的文本摘要，format=pstats 时下载原始结果文件"""
+    if REQUEST_PROFILE_DIR is None:
+        raise HTTPException(404, "未启用性能分析")
+    if not re.fullmatch(r"\d{14}_[0-9a-f]{8}", profile_id):
+        raise HTTPException(404, "分析结果不存在")
+    path = os.path.join(REQUEST_PROFILE_DIR, f"{profile_id}{PROFILE_SUFFIX}")
+    if not os.path.exists(path):
+        raise HTTPException(404, "分析结果不存在")
+    if format == "pstats":
+        return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}{PROFILE_SUFFIX}")
+    output = io.StringIO()
+    try:
+        pstats.Stats(path, stream=output).sort_stats(sort).print_stats(limit)
+    except KeyError:
+        raise HTTPException(400, f"不支持的排序方式: {sort}")
+    return PlainTextResponse(output.getvalue())
+
+def create_app() -> FastAPI:
+    """创建应用：配置日志，导入已启用的功能模块并注册路由与中间件"""
+    # 配置日志记录：经由队列交给后台线程输出，级别与输出目标见 log_config
+    setup_logging()
+
+    app = FastAPI(
+        title="仪器维修时长计算系统",
+        description="计算仪器维修各阶段时长并判断是否超期",
+        lifespan=lifespan,
+    )
+    app.state.features = load_features()
+    app.add_middleware(RequestMetricsMiddleware, requests=HTTP_REQUESTS, durations=HTTP_REQUEST_DURATION)
+    if SERVER_TIMING:
+        app.add_middleware(ServerTimingMiddleware, profile_dir=REQUEST_PROFILE_DIR, profile_keep=REQUEST_PROFILE_KEEP)
+    app.include_router(router)
+    for feature in app.state.features:
+        app.include_router(feature.router)
+    return app
+
+# 以 python main.py 启动时，文档渲染工作进程（spawn）会以 __mp_main__ 的名义重新执行本文件；
+# 工作进程只需要渲染函数，不配置日志、不导入功能模块，也不创建应用
+if __name__ != "__mp_main__":
+    app = create_app()
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=12123)
\ No newline at end of file
+    # 不使用 uvicorn 自带的日志配置，访问日志与服务日志同样经由队列输出
+    uvicorn.run(app, host="0.0.0.0", port=12123, log_config=None)
+
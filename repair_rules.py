@@ -0,0 +1,33 @@
+"""
+维修时长规则
+
+日期解析与各阶段超期标准，供接口、批量计算与离线统计共用，保证各处口径一致。
+"""
+
+from datetime import datetime
+
+# 返修仪器的类型编号
+RETURN_REPAIR_TYPE = 3
+
+# 各阶段超期标准（工作日）
+DETECTION_DAYS_LIMIT = 7  # 检测时长：提交报价时间 - 派工时间
+REPAIR_DAYS_LIMIT = 10  # 维修时长：提交质检时间 - 合同审核通过时间
+RETURN_REPAIR_DAYS_LIMIT = 10  # 返修时长：提交质检时间 - 派工时间
+
+# 统计阶段：(阶段名, 工作日时长字段, 超期标记字段)，字段名与 RepairTimeResult 一致
+SLA_STAGES = (
+    ("detection", "detection_days", "is_detection_overdue"),
+    ("repair", "repair_days", "is_repair_overdue"),
+    ("return_repair", "return_repair_days", "is_return_repair_overdue"),
+)
+
+
+def parse_datetime(date_str: str) -> datetime:
+    """解析ISO格式的日期时间字符串"""
+    try:
+        return datetime.fromisoformat(date_str.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            return datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
+        except ValueError:
+            return datetime.strptime(date_str, '%Y-%m-%d')
@@ -0,0 +1,894 @@
+"""
+维修时长计算功能
+
+工作日查询（本地日历、缓存、工作日API与本地估算）、维修时长计算（单条与批量）、截止日与超期统计接口。
+只依赖标准库与 httpx，不加载文档生成相关的依赖。
+"""
+
+import asyncio
+import codecs
+import json
+import logging
+import os
+import re
+import time
+from collections import deque
+from datetime import date, datetime, timedelta
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import httpx
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, ValidationError
+
+from circuit_breaker import CircuitBreaker
+from deadline_index import Deadline, DeadlineIndex, SQLiteDeadlineStore
+from metrics import REGISTRY
+from repair_rules import (
+    DETECTION_DAYS_LIMIT,
+    REPAIR_DAYS_LIMIT,
+    RETURN_REPAIR_DAYS_LIMIT,
+    RETURN_REPAIR_TYPE,
+    SLA_STAGES,
+    parse_datetime,
+)
+from request_timing import span
+from sla_store import SLAStore
+from workday_cache import SQLiteWorkdayStore, WorkdayCache
+from workday_calendar import (
+    BUNDLED_CALENDAR_FILE,
+    DEFAULT_SNAPSHOT_FILE,
+    DEFAULT_WORKDAY_API_URL,
+    MappedWorkdayCalendar,
+    count_weekdays,
+    load_calendar,
+)
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+# 根路径中列出的接口说明
+ENDPOINTS = {
+    "/calculate_repair_time": "计算维修时长并判断是否超期",
+    "/calculate_repair_time/batch": "批量计算维修时长（JSON数组或NDJSON，NDJSON流式返回）",
+    "/admin/workday_cache": "工作日缓存统计与失效",
+    "/sla/overdue": "按仪器类型、阶段与月份查询超期数量与超期率",
+    "/workdays/add": "计算经过N个工作日后的截止日",
+    "/deadlines": "登记未结工单并按截止日窗口查询",
+}
+
+WORKDAY_LOOKUPS = REGISTRY.counter(
+    "workday_lookups_total", "工作日数量查询次数（按数据来源：calendar/cache/api/local）", ("source",))
+WORKDAY_LOCAL_FALLBACKS = REGISTRY.counter(
+    "workday_local_fallback_total", "使用本地估算的次数（按原因：circuit_open/budget_exceeded/api_error）", ("reason",))
+WORKDAY_API_REQUESTS = REGISTRY.counter("workday_api_requests_total", "工作日API调用次数", ("outcome",))
+WORKDAY_API_DURATION = REGISTRY.histogram("workday_api_request_duration_seconds", "工作日API调用耗时（秒）", ("outcome",))
+
+# 工作日API连接池配置
+WORKDAY_API_TIMEOUT = 10
+WORKDAY_API_MAX_CONNECTIONS = int(os.getenv("WORKDAY_API_MAX_CONNECTIONS", "20"))
+WORKDAY_API_KEEPALIVE_EXPIRY = 30
+
+# 共享的异步HTTP客户端，在应用启动时创建、关闭时释放
+_http_client: Optional[httpx.AsyncClient] = None
+
+def create_http_client() -> httpx.AsyncClient:
+    """创建带连接池与keep-alive的异步HTTP客户端"""
+    return httpx.AsyncClient(
+        timeout=WORKDAY_API_TIMEOUT,
+        limits=httpx.Limits(
+            max_connections=WORKDAY_API_MAX_CONNECTIONS,
+            max_keepalive_connections=WORKDAY_API_MAX_CONNECTIONS,
+            keepalive_expiry=WORKDAY_API_KEEPALIVE_EXPIRY,
+        ),
+    )
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取共享HTTP客户端（未经应用启动流程调用时按需创建）"""
+    global _http_client
+    if _http_client is None or _http_client.is_closed:
+        _http_client = create_http_client()
+    return _http_client
+
+class RepairTimeCalculationRequest(BaseModel):
+    rep_ins_type: int  # 仪器类型，3为返修，其他为普通维修
+    rep_start_date: str  # 派工时间戳 (ISO格式)
+    quot_start_date: Optional[str] = None  # 提交报价时间戳 (ISO格式)
+    detec_start_date: Optional[str] = None  # 合同审核通过时间戳 (ISO格式)
+    qc_start_time: Optional[str] = None  # 提交质检时间戳 (ISO格式)
+    order_id: Optional[str] = None  # 工单编号，启用维修时长统计时用于记录结果，同一工单再次计算视为更正
+
+class RepairTimeResult(BaseModel):
+    rep_ins_type: int
+    detection_days: Optional[int] = None  # 检测时长（工作日）
+    repair_days: Optional[int] = None  # 维修时长（工作日）
+    return_repair_days: Optional[int] = None  # 返修时长（工作日）
+    is_detection_overdue: Optional[bool] = None  # 检测是否超期
+    is_repair_overdue: Optional[bool] = None  # 维修是否超期
+    is_return_repair_overdue: Optional[bool] = None  # 返修是否超期
+    message: str
+
+# 工作日API配置
+WORKDAY_API_URL = os.getenv("WORKDAY_API_URL", DEFAULT_WORKDAY_API_URL)
+
+# 缓存工作日数据，避免重复API调用；容量与有效期（秒）可通过环境变量配置
+WORKDAY_CACHE_MAX_SIZE = int(os.getenv("WORKDAY_CACHE_MAX_SIZE", "10000"))
+WORKDAY_CACHE_TTL = float(os.getenv("WORKDAY_CACHE_TTL", str(7 * 24 * 3600)))
+# 设置 WORKDAY_CACHE_DIR 后启用 SQLite 持久化，服务重启后缓存不丢失，多个worker进程可共享；
+# 持久化存储在服务启动时打开，关闭时提交剩余写入后关闭
+WORKDAY_CACHE_DIR = os.getenv("WORKDAY_CACHE_DIR")
+_workday_cache = WorkdayCache(max_size=WORKDAY_CACHE_MAX_SIZE, ttl=WORKDAY_CACHE_TTL)
+
+# 正在进行中的API查询，相同日期范围的并发请求共享同一次查询
+_inflight_lookups: Dict[str, "asyncio.Future[int]"] = {}
+_lookup_stats = {"upstream_calls": 0, "coalesced": 0}
+
+# 本地工作日历：随项目发布的日历、API引导生成的快照（python workday_calendar.py bootstrap <年份>），
+# 以及通过 WORKDAY_CALENDAR_FILE 导入的额外日历文件，后者覆盖前者的同一年份
+WORKDAY_CALENDAR_FILES = [
+    BUNDLED_CALENDAR_FILE,
+    os.getenv("WORKDAY_SNAPSHOT_FILE", DEFAULT_SNAPSHOT_FILE),
+    os.getenv("WORKDAY_CALENDAR_FILE"),
+]
+
+# 多worker部署时可设置 WORKDAY_CALENDAR_BINARY，指向 `python workday_calendar.py publish` 生成的二进制日历，
+# 各进程以只读方式内存映射同一份数据；文件被替换后在检查间隔（秒）内自动切换到新版本
+WORKDAY_CALENDAR_BINARY = os.getenv("WORKDAY_CALENDAR_BINARY")
+WORKDAY_CALENDAR_CHECK_INTERVAL = float(os.getenv("WORKDAY_CALENDAR_CHECK_INTERVAL", "5"))
+
+def _binary_calendar_signature() -> Optional[Tuple[int, int, int]]:
+    """二进制日历文件的 (inode, 修改时间, 大小)，未设置或文件不存在时返回 None"""
+    if not WORKDAY_CALENDAR_BINARY:
+        return None
+    try:
+        stat = os.stat(WORKDAY_CALENDAR_BINARY)
+    except FileNotFoundError:
+        return None
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+def load_workday_calendar():
+    """加载本地工作日历：优先映射二进制日历文件，否则从日历文件构建"""
+    if WORKDAY_CALENDAR_BINARY:
+        if os.path.exists(WORKDAY_CALENDAR_BINARY):
+            return MappedWorkdayCalendar(WORKDAY_CALENDAR_BINARY)
+        logger.warning(f"二进制日历 {WORKDAY_CALENDAR_BINARY} 不存在，改用日历文件构建，文件发布后自动切换")
+    return load_calendar(WORKDAY_CALENDAR_FILES)
+
+# 上一次加载时二进制日历文件的状态：未使用二进制日历（文件不存在或加载失败）时，
+# 当前日历一直沿用到文件发布或被替换为止，不在每个检查间隔重新构建
+_calendar_binary_signature = _binary_calendar_signature()
+_workday_calendar = load_workday_calendar()
+_calendar_checked_at = time.monotonic()
+
+def reload_workday_calendar():
+    """重新加载本地工作日历（例如引导生成新的快照之后）"""
+    global _workday_calendar, _calendar_binary_signature
+    _calendar_binary_signature = _binary_calendar_signature()
+    _workday_calendar = load_workday_calendar()
+    return _workday_calendar
+
+def get_workday_calendar():
+    """获取当前工作日历，使用二进制日历时定期检查文件是否已发布新版本"""
+    global _calendar_checked_at
+    if WORKDAY_CALENDAR_BINARY and time.monotonic() - _calendar_checked_at >= WORKDAY_CALENDAR_CHECK_INTERVAL:
+        _calendar_checked_at = time.monotonic()
+        if isinstance(_workday_calendar, MappedWorkdayCalendar):
+            changed = _workday_calendar.is_stale()
+        else:
+            changed = _binary_calendar_signature() != _calendar_binary_signature
+        if changed:
+            try:
+                reload_workday_calendar()
+            except (OSError, ValueError) as e:
+                logger.warning(f"二进制日历加载失败，继续使用当前日历: {e}")
+    return _workday_calendar
+
+# 工作日API熔断与延迟预算：单次工作日计算等待上游的总时长不超过预算（秒），
+# 连续失败达到阈值后熔断，直接使用本地计算，并在后台按间隔探测上游是否恢复
+WORKDAY_API_LATENCY_BUDGET = float(os.getenv("WORKDAY_API_LATENCY_BUDGET", "2"))
+WORKDAY_API_FAILURE_THRESHOLD = int(os.getenv("WORKDAY_API_FAILURE_THRESHOLD", "5"))
+WORKDAY_API_PROBE_INTERVAL = float(os.getenv("WORKDAY_API_PROBE_INTERVAL", "30"))
+
+# 使用本地备用方案估算时附加到结果消息中的标记，便于之后筛选重新计算
+LOCAL_FALLBACK_MARK = "[本地估算]"
+
+# 设置 SLA_STORE_DIR 后启用维修时长统计：带 order_id 的计算结果按仪器类型、阶段与派工月份累计，
+# 通过 /sla/overdue 查询超期数量与超期率
+SLA_STORE_DIR = os.getenv("SLA_STORE_DIR")
+_sla_store = SLAStore(SLA_STORE_DIR) if SLA_STORE_DIR else None
+
+class WorkdayAPIUnavailable(Exception):
+    """工作日API暂不可用（熔断或超出延迟预算）"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+async def _probe_workday_api():
+    """探测工作日API是否恢复"""
+    today = datetime.now().strftime('%Y-%m-%d')
+    params = {
+        'startDate': today,
+        'endDate': today
+    }
+    response = await asyncio.wait_for(get_http_client().get(WORKDAY_API_URL, params=params),
+                                      WORKDAY_API_LATENCY_BUDGET)
+    response.raise_for_status()
+    data = response.json()
+    if data.get('code') != 200:
+        raise Exception(f"API返回错误: {data.get('msg', '未知错误')}")
+
+_workday_api_breaker = CircuitBreaker(
+    "工作日API",
+    failure_threshold=WORKDAY_API_FAILURE_THRESHOLD,
+    probe_interval=WORKDAY_API_PROBE_INTERVAL,
+    probe=_probe_workday_api,
+)
+
+async def _fetch_workdays(start_str: str, end_str: str, cache_key: str, timeout: float) -> int:
+    """调用工作日API并缓存结果"""
+    params = {
+        'startDate': start_str,
+        'endDate': end_str
+    }
+    
+    started = time.perf_counter()
+    try:
+        # httpx 的超时针对单个阶段（连接、读取等），总耗时由 wait_for 限制在预算内
+        response = await asyncio.wait_for(get_http_client().get(WORKDAY_API_URL, params=params), timeout)
+        response.raise_for_status()
+        
+        data = response.json()
+        if data.get('code') != 200:
+            raise Exception(f"API返回错误: {data.get('msg', '未知错误')}")
+    except Exception:
+        WORKDAY_API_REQUESTS.inc("error")
+        WORKDAY_API_DURATION.observe(time.perf_counter() - started, "error")
+        _workday_api_breaker.record_failure()
+        raise
+    
+    WORKDAY_API_REQUESTS.inc("success")
+    WORKDAY_API_DURATION.observe(time.perf_counter() - started, "success")
+    _workday_api_breaker.record_success()
+    workdays = data.get('data', 0)
+    # 缓存结果
+    _workday_cache.set(cache_key, workdays)
+    return workdays
+
+def _finish_lookup(cache_key: str, task: "asyncio.Future[int]") -> None:
+    """查询结束后移出进行中列表；等待方可能都已超时离开，这里取走异常以免产生未处理异常的警告"""
+    _inflight_lookups.pop(cache_key, None)
+    if not task.cancelled():
+        task.exception()
+
+async def _resolve_workdays(start_date: datetime, end_date: datetime, deadline: float) -> Tuple[int, bool]:
+    """通过API获取两个日期之间的工作日数量，返回 (工作日数量, 是否为本地估算)"""
+    try:
+        # 格式化日期为API要求的格式
+        start_str = start_date.strftime('%Y-%m-%d')
+        end_str = end_date.strftime('%Y-%m-%d')
+        
+        # 检查缓存
+        cache_key = f"{start_str}_{end_str}"
+        with span("cache"):
+            cached = await _workday_cache.aget(cache_key)
+        if cached is not None:
+            WORKDAY_LOOKUPS.inc("cache")
+            return cached, False
+        
+        # 熔断期间或预算已耗尽时不再等待上游
+        if not _workday_api_breaker.allow_request():
+            raise WorkdayAPIUnavailable("工作日API已熔断", "circuit_open")
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise WorkdayAPIUnavailable("超出延迟预算", "budget_exceeded")
+        
+        # 相同日期范围已有查询在进行中时等待其结果，不再重复调用API
+        pending = _inflight_lookups.get(cache_key)
+        if pending is not None:
+            _lookup_stats["coalesced"] += 1
+        else:
+            _lookup_stats["upstream_calls"] += 1
+            pending = asyncio.ensure_future(_fetch_workdays(start_str, end_str, cache_key, remaining))
+            _inflight_lookups[cache_key] = pending
+            pending.add_done_callback(lambda task: _finish_lookup(cache_key, task))
+        
+        # shield: 单个调用方被取消或超时时不影响其他等待同一查询的调用方
+        try:
+            with span("upstream"):
+                workdays = await asyncio.wait_for(asyncio.shield(pending), remaining)
+        except asyncio.TimeoutError:
+            raise WorkdayAPIUnavailable("超出延迟预算", "budget_exceeded")
+        WORKDAY_LOOKUPS.inc("api")
+        return workdays, False
+            
+    except WorkdayAPIUnavailable as e:
+        logger.debug(f"API不可用，使用本地计算: {e.args[0]}")
+        WORKDAY_LOOKUPS.inc("local")
+        WORKDAY_LOCAL_FALLBACKS.inc(e.reason)
+        return calculate_workdays_local(start_date, end_date), True
+    except Exception as e:
+        # API调用失败时，使用本地计算作为备用方案
+        logger.warning(f"API调用失败，使用本地计算: {e!r}")
+        WORKDAY_LOOKUPS.inc("local")
+        WORKDAY_LOCAL_FALLBACKS.inc("api_error")
+        return calculate_workdays_local(start_date, end_date), True
+
+async def get_workdays_from_api(start_date: datetime, end_date: datetime) -> int:
+    """通过API获取两个日期之间的工作日数量"""
+    workdays, _ = await _resolve_workdays(start_date, end_date, time.monotonic() + WORKDAY_API_LATENCY_BUDGET)
+    return workdays
+
+def calculate_workdays_local(start_date: datetime, end_date: datetime) -> int:
+    """本地计算工作日数量（备用方案，仅排除周末，不考虑节假日），与日历和API同样按日期闭区间计数"""
+    return count_weekdays(start_date.date(), end_date.date())
+
+async def calculate_workdays_detailed(start_date: datetime, end_date: datetime) -> Tuple[int, bool]:
+    """计算两个日期之间的工作日数量（优先使用本地日历，其次使用API），返回 (工作日数量, 是否为本地估算)"""
+    if start_date >= end_date:
+        return 0, False
+    
+    # 本地日历覆盖的区间直接通过前缀和查表，无需调用API
+    with span("calendar"):
+        calendar = get_workday_calendar()
+        covered = calendar.covers(start_date, end_date)
+        if covered:
+            workdays = calendar.count(start_date, end_date)
+    if covered:
+        WORKDAY_LOOKUPS.inc("calendar")
+        return workdays, False
+    
+    # 所有分段共享同一个延迟预算
+    deadline = time.monotonic() + WORKDAY_API_LATENCY_BUDGET
+    
+    # 检查日期范围是否超过一年（API限制）
+    if (end_date - start_date).days > 365:
+        # 如果超过一年，按自然年分段计算，各段为互不重叠的闭区间
+        total_workdays = 0
+        estimated = False
+        current_start = start_date
+        
+        while current_start.year <= end_date.year:
+            # 这一段的最后一天：年末或结束日期
+            current_end = end_date if current_start.year == end_date.year else datetime(current_start.year, 12, 31)
+            
+            # 计算这一段的工作日
+            segment_workdays, segment_estimated = await _resolve_workdays(current_start, current_end, deadline)
+            total_workdays += segment_workdays
+            estimated = estimated or segment_estimated
+            
+            current_start = datetime(current_start.year + 1, 1, 1)
+        
+        return total_workdays, estimated
+    else:
+        return await _resolve_workdays(start_date, end_date, deadline)
+
+async def calculate_workdays(start_date: datetime, end_date: datetime) -> int:
+    """计算两个日期之间的工作日数量（优先使用本地日历，其次使用API）"""
+    workdays, _ = await calculate_workdays_detailed(start_date, end_date)
+    return workdays
+
+def parse_request_datetime(value: str) -> datetime:
+    """解析请求中的时间戳，耗时计入 Server-Timing 的 parse 阶段"""
+    with span("parse"):
+        return parse_datetime(value)
+
+async def compute_repair_time(request: RepairTimeCalculationRequest) -> RepairTimeResult:
+    """按维修规则计算各阶段工作日时长并判断是否超期"""
+    result = RepairTimeResult(
+        rep_ins_type=request.rep_ins_type,
+        message="计算完成"
+    )
+    
+    # 解析派工时间
+    rep_start = parse_request_datetime(request.rep_start_date)
+    # 是否有工作日数量由本地备用方案估算
+    estimated = False
+    
+    if request.rep_ins_type != RETURN_REPAIR_TYPE:
+        # 一、保修为其他类型的仪器(rep_ins_type不等于3)
+        # 检测时长与维修时长的工作日查询并发进行
+        lookups = {}
+        
+        # 1. 检测时长≤7个工作日
+        # 提交报价时间戳(quot_start_date) - 派工时间戳(rep_start_date)
+        if request.quot_start_date:
+            quot_start = parse_request_datetime(request.quot_start_date)
+            lookups["detection"] = calculate_workdays_detailed(rep_start, quot_start)
+        
+        # 2. 维修时长≤10个工作日
+        # 提交质检时间戳(qc_start_time) - 合同审核通过时间戳(detec_start_date)
+        if request.qc_start_time and request.detec_start_date:
+            qc_start = parse_request_datetime(request.qc_start_time)
+            detec_start = parse_request_datetime(request.detec_start_date)
+            lookups["repair"] = calculate_workdays_detailed(detec_start, qc_start)
+        
+        days = dict(zip(lookups, await asyncio.gather(*lookups.values())))
+        
+        if "detection" in days:
+            result.detection_days, detection_estimated = days["detection"]
+            result.is_detection_overdue = result.detection_days > DETECTION_DAYS_LIMIT
+            estimated = estimated or detection_estimated
+        
+        if "repair" in days:
+            result.repair_days, repair_estimated = days["repair"]
+            result.is_repair_overdue = result.repair_days > REPAIR_DAYS_LIMIT
+            estimated = estimated or repair_estimated
+    
+    else:
+        # 二、保修为返修的仪器(rep_ins_type等于3)
+        
+        # 3. 返修时长≤10个工作日
+        # 提交质检时间戳(qc_start_time) - 派工时间戳(rep_start_date)
+        if request.qc_start_time:
+            qc_start = parse_request_datetime(request.qc_start_time)
+            result.return_repair_days, estimated = await calculate_workdays_detailed(rep_start, qc_start)
+            result.is_return_repair_overdue = result.return_repair_days > RETURN_REPAIR_DAYS_LIMIT
+    
+    if estimated:
+        result.message = f"{result.message}{LOCAL_FALLBACK_MARK}：工作日API不可用，已按仅排除周末估算，可稍后重新计算"
+    
+    if _sla_store is not None and request.order_id:
+        _sla_store.record(request.order_id, {
+            **result.dict(),
+            "period": rep_start.strftime("%Y-%m"),
+            "estimated": estimated,
+        })
+    
+    return result
+
+@router.post("/calculate_repair_time", response_model=RepairTimeResult)
+async def calculate_repair_time(request: RepairTimeCalculationRequest):
+    """计算维修时长并判断是否超期"""
+    try:
+        return await compute_repair_time(request)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"计算失败: {str(e)}")
+
+# 批量计算时同时进行的记录数（保持输出顺序与输入一致）
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "32"))
+
+class BatchRecordError(Exception):
+    """批量请求中的单条记录无法解析"""
+
+class DuplexStreamingResponse(StreamingResponse):
+    """边读取请求体边返回结果的流式响应
+
+    StreamingResponse 在 ASGI 2.4 以下会并发监听客户端断开，与读取请求体争抢 receive 消息；
+    这里直接发送响应，客户端断开由读取请求体（ClientDisconnect）或发送失败感知。
+    """
+
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
+
+async def _iter_ndjson_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    """逐行解析NDJSON请求体，无法解析的行产出 BatchRecordError"""
+    buffer = b""
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield _parse_ndjson_line(line)
+    if buffer.strip():
+        yield _parse_ndjson_line(buffer)
+
+def _parse_ndjson_line(line: bytes) -> object:
+    try:
+        return json.loads(line.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError) as e:
+        return BatchRecordError(f"无效的JSON格式: {e}")
+
+class _JSONArrayScanner:
+    """按顶层元素切分并解析JSON数组
+
+    逐块输入，记录括号深度与字符串状态，在深度为0的逗号或 ] 处切出一个元素；
+    单个元素内部的格式错误只影响该元素。元素之间缺少逗号、元素为空或数组之外存在多余内容时
+    数组结构已无法确定，产出 BatchRecordError 后停止解析。
+    完整接收的元素先直接整体解码，只有解码失败（格式错误或尚未接收完整）的元素才逐字符扫描。
+    """
+
+    _OUTSIDE_STRING = re.compile(r'["\[\]{},\t\n\r ]')
+    _INSIDE_STRING = re.compile(r'["\\]')
+    _WHITESPACE = re.compile(r"[\t\n\r ]*")
+    _NO_VALUE = object()
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ""
+        self._element_start = 0
+        self._value = self._NO_VALUE  # 整体解码成功的当前元素
+        self._started = False
+        self._finished = False
+        self._failed = False
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._has_value = False   # 当前元素已出现非空白内容
+        self._value_done = False  # 当前元素的值已结束，之后只允许空白、逗号或 ]
+        self._count = 0
+
+    def feed(self, text: str) -> List[object]:
+        """输入一段文本，返回其中已完整的元素（格式错误的元素为 BatchRecordError）"""
+        if self._failed:
+            return []
+        output = []
+        buffer = self._buffer + text
+        i, n = len(self._buffer), len(buffer)
+        while i < n:
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                    i += 1
+                    continue
+                match = self._INSIDE_STRING.search(buffer, i)
+                if match is None:
+                    break
+                j = match.start()
+                if buffer[j] == "\\":
+                    self._escaped = True
+                    i = j + 1
+                    continue
+                self._in_string = False
+                if self._depth == 0:
+                    self._value_done = True
+                i = j + 1
+                continue
+
+            if self._started and not self._finished and not self._has_value:
+                i = self._WHITESPACE.match(buffer, i).end()
+                if i < n and buffer[i] not in ",]":
+                    try:
+                        value, end = self._decoder.raw_decode(buffer, i)
+                    except json.JSONDecodeError:
+                        end = n
+                    # 值之后须紧跟空白、逗号或 ]：数字可能被数据块截断（如 "1." 只解码出 1），
+                    # 值恰好在数据末尾结束时也可能尚未接收完整，这些情况都交给逐字符扫描
+                    if end < n and buffer[end] in " \t\n\r,]":
+                        self._value = value
+                        self._has_value = self._value_done = True
+                        i = end
+                        continue
+
+            match = self._OUTSIDE_STRING.search(buffer, i)
+            j = match.start() if match else n
+            if j > i and not self._accept_value(output):
+                break
+            if match is None:
+                break
+            char = buffer[j]
+            i = j + 1
+            if char in " \t\n\r":
+                if self._depth == 0 and self._has_value:
+                    self._value_done = True
+                continue
+            if not self._started:
+                if char != "[":
+                    self._fail(output, "请求体应为JSON数组或NDJSON")
+                    break
+                self._started = True
+                self._element_start = i
+                continue
+            if self._depth == 0 and char in ",]":
+                if self._finished:
+                    self._fail(output, "JSON数组结束后存在多余内容")
+                    break
+                if self._has_value:
+                    output.append(self._take_element(buffer[self._element_start:j]))
+                elif char == "," or self._count > 0:
+                    self._fail(output, f"JSON数组第{self._count + 1}个元素为空")
+                    break
+                self._has_value = self._value_done = False
+                self._element_start = i
+                self._finished = char == "]"
+                continue
+            if not self._accept_value(output):
+                break
+            if char == '"':
+                self._in_string = True
+            elif char in "[{":
+                self._depth += 1
+            elif char in "]}":
+                # 多余的右括号留给该元素的解析报错，不影响其他元素的切分
+                self._depth = max(self._depth - 1, 0)
+                if self._depth == 0:
+                    self._value_done = True
+
+        # 只保留当前未完成的元素
+        start = min(self._element_start, n)
+        self._buffer = buffer[start:]
+        self._element_start -= start
+        return output
+
+    def close(self) -> List[object]:
+        """输入结束：数组未闭合时返回错误"""
+        if self._failed or self._finished:
+            return []
+        self._failed = True
+        return [BatchRecordError("JSON数组不完整或格式错误")]
+
+    def _take_element(self, text: str) -> object:
+        self._count += 1
+        value, self._value = self._value, self._NO_VALUE
+        if value is not self._NO_VALUE:
+            return value
+        try:
+            return json.loads(text)
+        except json.JSONDecodeError as e:
+            return BatchRecordError(f"无效的JSON格式: {e}")
+
+    def _accept_value(self, output: List[object]) -> bool:
+        """遇到值的内容：检查数组已开始、未结束且上一个值之后有逗号"""
+        if not self._started:
+            self._fail(output, "请求体应为JSON数组或NDJSON")
+        elif self._finished:
+            self._fail(output, "JSON数组结束后存在多余内容")
+        elif self._value_done:
+            self._fail(output, f"JSON数组第{self._count + 1}个元素之后缺少逗号")
+        else:
+            self._has_value = True
+            return True
+        return False
+
+    def _fail(self, output: List[object], message: str) -> None:
+        self._failed = True
+        output.append(BatchRecordError(message))
+
+async def _iter_json_array_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[object]:
+    """增量解析JSON数组请求体，每接收完一个元素即产出，不把整个请求体读入内存
+
+    格式错误的元素产出该条的 BatchRecordError，其后的元素照常解析；数组结构错误（缺少逗号等）
+    产出 BatchRecordError 后不再产出后续元素。
+    """
+    scanner = _JSONArrayScanner()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    try:
+        async for chunk in chunks:
+            for record in scanner.feed(text_decoder.decode(chunk)):
+                yield record
+        text_decoder.decode(b"", final=True)
+    except UnicodeDecodeError as e:
+        yield BatchRecordError(f"请求体不是有效的UTF-8: {e}")
+        return
+    for record in scanner.close():
+        yield record
+
+async def _compute_batch_record(index: int, record: object) -> dict:
+    """计算批量请求中的一条记录，出错时返回该记录的错误信息而不影响其他记录"""
+    try:
+        if isinstance(record, BatchRecordError):
+            raise record
+        if not isinstance(record, dict):
+            raise BatchRecordError("记录应为JSON对象")
+        result = await compute_repair_time(RepairTimeCalculationRequest(**record))
+        return {"index": index, **result.dict()}
+    except BatchRecordError as e:
+        return {"index": index, "error": str(e)}
+    except ValidationError as e:
+        return {"index": index, "error": f"数据验证失败: {e.errors()}"}
+    except Exception as e:
+        return {"index": index, "error": f"计算失败: {str(e)}"}
+
+@router.post("/calculate_repair_time/batch")
+async def calculate_repair_time_batch(request: Request):
+    """批量计算维修时长
+
+    请求体为 RepairTimeCalculationRequest 的JSON数组，或每行一条记录的NDJSON（application/x-ndjson）。
+    结果以NDJSON流式返回，每行对应一条输入记录（按输入顺序，带 index 字段），
+    格式错误的记录返回 error 字段，不影响其他记录。
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonlines" in content_type:
+        records = _iter_ndjson_records(request.stream())
+    else:
+        records = _iter_json_array_records(request.stream())
+
+    async def generate():
+        window = deque()
+        index = 0
+        async for record in records:
+            window.append(asyncio.ensure_future(_compute_batch_record(index, record)))
+            index += 1
+            if len(window) >= BATCH_CONCURRENCY:
+                yield json.dumps(await window.popleft(), ensure_ascii=False) + "\n"
+        while window:
+            yield json.dumps(await window.popleft(), ensure_ascii=False) + "\n"
+
+    return DuplexStreamingResponse(generate(), media_type="application/x-ndjson")
+
+def add_workdays_local(start_day: date, workdays: int) -> date:
+    """本地计算截止日（备用方案，仅排除周末），与 calculate_workdays_local 的计数规则一致：
+    返回从 start_day 起的第 workdays 个工作日（start_day 为工作日时计为第1个），workdays 为0时返回 start_day"""
+    if workdays == 0:
+        return start_day
+    counted = 0
+    current_day = start_day
+    while True:
+        if current_day.weekday() < 5:
+            counted += 1
+            if counted == workdays:
+                return current_day
+        current_day += timedelta(days=1)
+
+def calculate_due_date(start_date: datetime, workdays: int) -> Tuple[date, bool]:
+    """计算从 start_date 起经过 workdays 个工作日的截止日，返回 (截止日, 是否按本地规则估算)
+
+    截止日当天完成时工作日时长恰好为 workdays，之后的工作日完成即超期。
+    """
+    try:
+        return get_workday_calendar().add_workdays(start_date, workdays), False
+    except KeyError:
+        return add_workdays_local(start_date.date(), workdays), True
+
+def compute_deadlines(request: RepairTimeCalculationRequest) -> List[Deadline]:
+    """按维修规则计算工单尚未完成的阶段的截止日"""
+    open_stages = []
+    if request.rep_ins_type != RETURN_REPAIR_TYPE:
+        if not request.quot_start_date:
+            open_stages.append(("detection", request.rep_start_date, DETECTION_DAYS_LIMIT))
+        if request.detec_start_date and not request.qc_start_time:
+            open_stages.append(("repair", request.detec_start_date, REPAIR_DAYS_LIMIT))
+    elif not request.qc_start_time:
+        open_stages.append(("return_repair", request.rep_start_date, RETURN_REPAIR_DAYS_LIMIT))
+
+    deadlines = []
+    for stage, start_str, limit in open_stages:
+        start_date = parse_datetime(start_str)
+        due_date, estimated = calculate_due_date(start_date, limit)
+        deadlines.append(Deadline(due_date, request.order_id, stage, start_date.date(), limit, estimated))
+    return deadlines
+
+def _deadline_to_dict(deadline: Deadline, today: date) -> dict:
+    return {**deadline._asdict(), "overdue": deadline.due_date < today}
+
+# 未结工单截止日索引，由业务系统在工单状态变化时通过 /deadlines 更新；
+# 设置 DEADLINE_STORE_DIR 后同时写入该目录下的 SQLite 数据库，启动时从中重建，多个 worker 共享
+DEADLINE_STORE_DIR = os.getenv("DEADLINE_STORE_DIR")
+_deadline_index = DeadlineIndex(SQLiteDeadlineStore(DEADLINE_STORE_DIR) if DEADLINE_STORE_DIR else None)
+
+@router.get("/workdays/add")
+async def add_workdays(start_date: str, days: int):
+    """计算从 start_date 起经过 days 个工作日的截止日"""
+    try:
+        if days < 0:
+            raise ValueError("days 不能为负数")
+        due_date, estimated = calculate_due_date(parse_datetime(start_date), days)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"计算失败: {str(e)}")
+    return {"start_date": start_date, "days": days, "due_date": due_date, "estimated": estimated}
+
+@router.post("/deadlines")
+def update_order_deadlines(request: RepairTimeCalculationRequest):
+    """登记或更新未结工单，计算其未完成阶段的截止日；各阶段均已完成时从索引中移除"""
+    if not request.order_id:
+        raise HTTPException(status_code=400, detail="缺少 order_id")
+    try:
+        deadlines = compute_deadlines(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"计算失败: {str(e)}")
+    _deadline_index.update(request.order_id, deadlines)
+    today = date.today()
+    return {
+        "order_id": request.order_id,
+        "deadlines": [_deadline_to_dict(deadline, today) for deadline in deadlines],
+    }
+
+@router.delete("/deadlines/{order_id}")
+def remove_order_deadlines(order_id: str):
+    """工单结案或取消时从截止日索引中移除"""
+    if not _deadline_index.remove(order_id):
+        raise HTTPException(404, "工单不在截止日索引中")
+    return {"order_id": order_id, "removed": True}
+
+@router.get("/deadlines")
+def list_deadlines(start: Optional[date] = None, end: Optional[date] = None,
+                   within_workdays: Optional[int] = None, limit: Optional[int] = None):
+    """按截止日窗口查询未结工单
+
+    start/end 为截止日范围（含两端），不指定 start 时包含已超期的工单；
+    指定 within_workdays 时 end 为今天起经过该数量工作日后的日期。结果按截止日排序。
+    """
+    today = date.today()
+    if within_workdays is not None:
+        if within_workdays < 0:
+            raise HTTPException(400, "within_workdays 不能为负数")
+        end, _ = calculate_due_date(datetime.combine(today, datetime.min.time()), within_workdays)
+    deadlines = _deadline_index.between(start, end, limit)
+    return {
+        "today": today,
+        "end": end,
+        "open_orders": len(_deadline_index),
+        "deadlines": [_deadline_to_dict(deadline, today) for deadline in deadlines],
+    }
+
+@router.get("/admin/workday_cache")
+async def workday_cache_stats():
+    """查看工作日缓存与API查询统计"""
+    return {
+        "cache": _workday_cache.stats(),
+        "lookups": dict(_lookup_stats),
+        "circuit_breaker": _workday_api_breaker.stats(),
+    }
+
+@router.delete("/admin/workday_cache")
+async def invalidate_workday_cache(year: Optional[int] = None):
+    """使工作日缓存失效；指定年份时仅删除与该年份有交集的条目（例如节假日安排调整后）"""
+    # 启用持久化存储时需等待排队的写入提交后再删除，放到线程池中执行
+    if year is None:
+        removed = len(_workday_cache)
+        await asyncio.to_thread(_workday_cache.clear)
+    else:
+        def overlaps_year(key: str) -> bool:
+            start_str, end_str = key.split("_")
+            return int(start_str[:4]) <= year <= int(end_str[:4])
+        removed = await asyncio.to_thread(_workday_cache.invalidate_where, overlaps_year)
+    return {"removed": removed, "cache": _workday_cache.stats()}
+
+# 各组件已有的统计计数，在输出 /metrics 时读取
+REGISTRY.callback("workday_cache_hits_total", "工作日缓存命中次数", "counter", lambda: _workday_cache.hits)
+REGISTRY.callback("workday_cache_misses_total", "工作日缓存未命中次数", "counter", lambda: _workday_cache.misses)
+REGISTRY.callback("workday_cache_evictions_total", "工作日缓存淘汰次数", "counter", lambda: _workday_cache.evictions)
+REGISTRY.callback("workday_cache_entries", "工作日缓存条目数", "gauge", lambda: len(_workday_cache))
+REGISTRY.callback("workday_api_coalesced_total", "与进行中的相同查询合并的API查询次数", "counter",
+                  lambda: _lookup_stats["coalesced"])
+REGISTRY.callback("workday_api_circuit_open", "工作日API熔断器是否处于断开状态", "gauge",
+                  lambda: int(_workday_api_breaker.state == CircuitBreaker.OPEN))
+
+@router.get("/sla/overdue")
+def sla_overdue_stats(period: Optional[str] = None, rep_ins_type: Optional[int] = None,
+                      stage: Optional[str] = None):
+    """查询超期统计
+
+    period 为 YYYY-MM（按月）或 YYYY（该年各月），可按仪器类型与阶段（detection/repair/return_repair）筛选。
+    统计来自已记录工单的累计值，不重新计算历史工单。
+    """
+    if _sla_store is None:
+        raise HTTPException(404, "未启用维修时长统计，请设置 SLA_STORE_DIR")
+    if period is not None:
+        try:
+            if len(period) not in (4, 7):
+                raise ValueError(period)
+            datetime.strptime(period, "%Y" if len(period) == 4 else "%Y-%m")
+        except ValueError:
+            raise HTTPException(400, "period 格式应为 YYYY-MM 或 YYYY")
+    stages = [name for name, _, _ in SLA_STAGES]
+    if stage is not None and stage not in stages:
+        raise HTTPException(400, f"stage 应为 {', '.join(stages)} 之一")
+
+    groups = _sla_store.query(period=period, rep_ins_type=rep_ins_type, stage=stage)
+    for group in groups:
+        group["overdue_rate"] = round(group["overdue"] / group["total"], 4)
+    total = sum(group["total"] for group in groups)
+    overdue = sum(group["overdue"] for group in groups)
+    return {
+        "total": total,
+        "overdue": overdue,
+        "overdue_rate": round(overdue / total, 4) if total else 0.0,
+        "groups": groups,
+    }
+
+async def startup() -> None:
+    """启动时创建共享HTTP客户端，打开工作日缓存的持久化存储并预热"""
+    global _http_client
+    _http_client = create_http_client()
+    if WORKDAY_CACHE_DIR and _workday_cache.backend is None:
+        _workday_cache.backend = SQLiteWorkdayStore(WORKDAY_CACHE_DIR)
+    warmed = await asyncio.to_thread(_workday_cache.warm)
+    if warmed:
+        logger.info(f"已从持久化存储预热 {warmed} 条工作日缓存")
+
+async def shutdown() -> None:
+    """关闭时停止熔断探测、释放连接，提交缓存与统计写入并关闭持久化存储"""
+    global _http_client
+    await _workday_api_breaker.close()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+    await asyncio.to_thread(_workday_cache.close)
+    await asyncio.to_thread(_deadline_index.close)
+    if _sla_store is not None:
+        await asyncio.to_thread(_sla_store.flush)
+        await asyncio.to_thread(_sla_store.close)
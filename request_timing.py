@@ -0,0 +1,155 @@
+"""
+请求耗时分解与按需性能分析
+
+请求处理中用 span(名称) 标记各阶段（日期解析、缓存查询、上游API、模板加载、渲染、保存等），
+同名阶段的耗时累加，响应时通过 Server-Timing 响应头返回，浏览器开发者工具与 curl -v 均可查看。
+未经中间件处理的调用（如离线脚本）中 span 不做任何记录。
+
+启用性能分析后，带 X-Profile: 1 请求头或 ?profile=1 参数的请求会在 cProfile 下执行，
+分析结果保存到目录中，响应头 X-Profile 给出查看地址。cProfile 统计的是整个线程，
+同时进行的其他请求也会计入，分析时应避免并发请求。
+"""
+
+import cProfile
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+from uuid import uuid4
+
+PROFILE_SUFFIX = ".prof"
+
+
+class RequestTimings:
+    """单个请求各阶段的累计耗时（秒）"""
+
+    __slots__ = ("spans",)
+
+    def __init__(self):
+        self.spans: Dict[str, float] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.spans[name] = self.spans.get(name, 0.0) + seconds
+
+    def header(self, total: float) -> str:
+        """Server-Timing 响应头的值，耗时单位为毫秒"""
+        parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.spans.items()]
+        parts.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parts)
+
+
+_current: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+
+def record(name: str, seconds: float) -> None:
+    """将已测得的耗时计入当前请求（例如工作进程中测得的渲染各阶段耗时）"""
+    timings = _current.get()
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+class span:
+    """记录一段代码的耗时，计入当前请求的同名阶段"""
+
+    __slots__ = ("name", "_timings", "_started")
+
+    def __init__(self, name: str):
+        self.name = name
+
+    def __enter__(self) -> "span":
+        self._timings = _current.get()
+        if self._timings is not None:
+            self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._timings is not None:
+            self._timings.add(self.name, time.perf_counter() - self._started)
+
+
+def _wants_profile(scope) -> bool:
+    for name, value in scope["headers"]:
+        if name == b"x-profile" and value not in (b"", b"0"):
+            return True
+    query = scope.get("query_string", b"")
+    return b"profile=1" in query.split(b"&")
+
+
+class ServerTimingMiddleware:
+    """为每个请求收集阶段耗时并添加 Server-Timing 响应头的 ASGI 中间件
+
+    profile_dir: 性能分析结果目录，为 None 时不支持性能分析；目录在第一次保存结果时创建
+    profile_url: 查看分析结果的地址前缀
+    profile_keep: 最多保留的分析结果数，超出时删除最早的
+    """
+
+    def __init__(self, app, profile_dir: Optional[str] = None, profile_url: str = "/admin/profiles/",
+                 profile_keep: int = 50):
+        self.app = app
+        self.profile_dir = profile_dir
+        self.profile_url = profile_url
+        self.profile_keep = profile_keep
+        # cProfile 同一时间只能有一个分析器生效，正在分析时其他请求不再启用
+        self._profiling = False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        started = time.perf_counter()
+        profiler: Optional[cProfile.Profile] = None
+        profile_id: Optional[str] = None
+        if self.profile_dir is not None and not self._profiling and _wants_profile(scope):
+            self._profiling = True
+            profiler = cProfile.Profile()
+            profile_id = f"{time.strftime('%Y%m%d%H%M%S')}_{uuid4().hex[:8]}"
+
+        def finish_profile():
+            nonlocal profiler
+            if profiler is not None:
+                current, profiler = profiler, None
+                current.disable()
+                self._save_profile(current, profile_id)
+                self._profiling = False
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", timings.header(time.perf_counter() - started).encode("ascii")))
+                if profile_id is not None:
+                    headers.append((b"x-profile", f"{self.profile_url}{profile_id}".encode("ascii")))
+                message = {**message, "headers": headers}
+            elif profiler is not None and message["type"] == "http.response.body" and not message.get("more_body"):
+                # 响应体发送完毕前保存分析结果，客户端收到响应后即可查看
+                finish_profile()
+            await send(message)
+
+        try:
+            if profiler is not None:
+                profiler.enable()
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish_profile()
+            _current.reset(token)
+
+    def _save_profile(self, profiler: cProfile.Profile, profile_id: str) -> None:
+        os.makedirs(self.profile_dir, exist_ok=True)
+        profiler.dump_stats(self.profile_path(profile_id))
+        self._prune()
+
+    def profile_path(self, profile_id: str) -> str:
+        return os.path.join(self.profile_dir, f"{profile_id}{PROFILE_SUFFIX}")
+
+    def _prune(self) -> None:
+        profiles: List[os.DirEntry] = [
+            entry for entry in os.scandir(self.profile_dir) if entry.name.endswith(PROFILE_SUFFIX)
+        ]
+        profiles.sort(key=lambda entry: entry.name)
+        for entry in profiles[:max(len(profiles) - self.profile_keep, 0)]:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
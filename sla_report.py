@@ -0,0 +1,261 @@
+"""
+离线维修时长统计报表
+
+不启动HTTP服务，直接对历史工单导出的CSV文件按 /calculate_repair_time 的规则批量计算，
+输出逐单结果与按仪器类型、派工月份汇总的超期率，用于季度审计等场景。
+
+输入文件按块流式读取，各块交给进程池中的向量化引擎计算，主进程按原顺序写出结果，
+同时在途的块数有上限，内存占用与文件大小无关。
+
+用法::
+
+    python sla_report.py orders.csv --output results.csv --summary summary.csv --workers 8
+
+输入文件需包含 rep_ins_type、rep_start_date 列，quot_start_date、detec_start_date、qc_start_time 列可选；
+其余列原样输出到逐单结果中。日历未覆盖的区间按仅排除周末的规则估算，并在 estimated 列中标记。
+"""
+
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from repair_rules import SLA_STAGES
+from vector_engine import VectorWorkdayEngine
+from workday_calendar import (
+    BUNDLED_CALENDAR_FILE,
+    DEFAULT_SNAPSHOT_FILE,
+    MappedWorkdayCalendar,
+    load_calendar,
+)
+
+INPUT_COLUMNS = ("rep_ins_type", "rep_start_date", "quot_start_date", "detec_start_date", "qc_start_time")
+REQUIRED_COLUMNS = ("rep_ins_type", "rep_start_date")
+RESULT_COLUMNS = (
+    "detection_days",
+    "repair_days",
+    "return_repair_days",
+    "is_detection_overdue",
+    "is_repair_overdue",
+    "is_return_repair_overdue",
+    "estimated",
+    "error",
+)
+
+SUMMARY_COLUMNS = ("rep_ins_type", "month", "stage", "total", "overdue", "overdue_rate", "estimated")
+
+DEFAULT_CHUNK_SIZE = 20000
+
+# 汇总计数：(仪器类型, 派工月份, 阶段) -> [参与统计的工单数, 超期数, 估算数]
+Aggregates = Dict[Tuple[int, str, str], List[int]]
+
+# 工作进程中的计算引擎，由进程池初始化函数创建
+_engine: Optional[VectorWorkdayEngine] = None
+
+
+def load_report_calendar(calendar_files: Sequence[Optional[str]], binary_path: Optional[str] = None):
+    """加载工作日历，与服务端的选择顺序一致：优先映射二进制日历文件，否则从日历文件构建"""
+    if binary_path and os.path.exists(binary_path):
+        return MappedWorkdayCalendar(binary_path)
+    return load_calendar(calendar_files)
+
+
+def _init_worker(calendar_files: Sequence[Optional[str]], binary_path: Optional[str]) -> None:
+    global _engine
+    _engine = VectorWorkdayEngine(load_report_calendar(calendar_files, binary_path))
+
+
+def _format_column(values: np.ndarray) -> List[str]:
+    """将结果列整体转换为输出文本，被掩码的值输出为空"""
+    mask = np.ma.getmaskarray(values)
+    data = np.ma.getdata(values)
+    if data.dtype == bool:
+        text = np.where(data, "true", "false")
+    elif data.dtype == object:
+        text = np.array(["" if value is None else str(value) for value in data], dtype=object)
+    else:
+        text = data.astype(str)
+    return np.where(mask, "", text).tolist()
+
+
+def process_chunk(header: Sequence[str], rows: List[List[str]],
+                  engine: Optional[VectorWorkdayEngine] = None) -> Tuple[str, Aggregates, int]:
+    """计算一块工单，返回 (逐单结果的CSV文本, 汇总计数, 出错工单数)"""
+    engine = engine or _engine
+    positions = {name: header.index(name) if name in header else None for name in INPUT_COLUMNS}
+
+    def column(name: str) -> List[Optional[str]]:
+        position = positions[name]
+        if position is None:
+            return [None] * len(rows)
+        return [row[position] if position < len(row) else None for row in rows]
+
+    # rep_ins_type 无法解析的工单按普通维修计算后整体标记为错误
+    raw_types = column("rep_ins_type")
+    types = np.zeros(len(rows), dtype=np.int64)
+    invalid_type = np.zeros(len(rows), dtype=bool)
+    for i, value in enumerate(raw_types):
+        try:
+            types[i] = int(value)
+        except (TypeError, ValueError):
+            invalid_type[i] = True
+
+    result = engine.compute(types, column("rep_start_date"), column("quot_start_date"),
+                            column("detec_start_date"), column("qc_start_time"))
+
+    errors = result["error"]
+    for i in np.flatnonzero(invalid_type):
+        errors[i] = f"仪器类型格式错误: {raw_types[i]}"
+    failed = ~np.equal(errors, None)
+    for name, days_name, overdue_name in SLA_STAGES:
+        result[days_name][failed] = np.ma.masked
+        result[overdue_name][failed] = np.ma.masked
+    estimated = result["estimated"] & ~failed
+
+    # 按派工月份汇总：月份由解析后的派工时间（带时区的取其所在时区的时间）确定，与服务端统计口径一致
+    months = result["period"]
+    aggregates: Aggregates = {}
+    valid_rows = np.flatnonzero(~failed)
+    if len(valid_rows):
+        group_keys, group_index = np.unique(
+            np.char.add(np.char.add(types[valid_rows].astype(str), "|"), months[valid_rows].astype(str)),
+            return_inverse=True,
+        )
+        for name, days_name, overdue_name in SLA_STAGES:
+            used = ~np.ma.getmaskarray(result[days_name])[valid_rows]
+            overdue = np.ma.filled(result[overdue_name], False)[valid_rows] & used
+            counts = np.bincount(group_index, weights=used, minlength=len(group_keys))
+            overdue_counts = np.bincount(group_index, weights=overdue, minlength=len(group_keys))
+            estimated_counts = np.bincount(group_index, weights=estimated[valid_rows] & used,
+                                           minlength=len(group_keys))
+            for key, total, overdue_total, estimated_total in zip(group_keys, counts, overdue_counts,
+                                                                  estimated_counts):
+                if total:
+                    type_str, month = key.split("|", 1)
+                    aggregates[(int(type_str), month, name)] = [
+                        int(total), int(overdue_total), int(estimated_total)
+                    ]
+
+    output = io.StringIO()
+    writer = csv.writer(output)
+    result["estimated"] = estimated
+    result_columns = [_format_column(result[name]) for name in RESULT_COLUMNS]
+    writer.writerows(row + list(values) for row, values in zip(rows, zip(*result_columns)))
+    return output.getvalue(), aggregates, int(failed.sum())
+
+
+def merge_aggregates(total: Aggregates, part: Aggregates) -> None:
+    for key, counts in part.items():
+        current = total.setdefault(key, [0, 0, 0])
+        for i, value in enumerate(counts):
+            current[i] += value
+
+
+def iter_chunks(reader: Iterator[List[str]], chunk_size: int) -> Iterator[List[List[str]]]:
+    chunk = []
+    for row in reader:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def write_summary(path: str, aggregates: Aggregates, encoding: str) -> None:
+    with open(path, "w", newline="", encoding=encoding) as f:
+        writer = csv.writer(f)
+        writer.writerow(SUMMARY_COLUMNS)
+        for (rep_ins_type, month, stage), (total, overdue, estimated) in sorted(aggregates.items()):
+            writer.writerow([rep_ins_type, month, stage, total, overdue, f"{overdue / total:.4f}", estimated])
+
+
+def run_report(input_path: str, output_path: str, summary_path: str, workers: int,
+               chunk_size: int = DEFAULT_CHUNK_SIZE,
+               calendar_files: Sequence[Optional[str]] = (BUNDLED_CALENDAR_FILE,),
+               binary_path: Optional[str] = None, encoding: str = "utf-8-sig",
+               output_encoding: str = "utf-8-sig") -> Dict[str, object]:
+    """生成报表，返回处理统计"""
+    started = time.monotonic()
+    aggregates: Aggregates = {}
+    orders = errors = 0
+    # 在途块数上限：保证每个工作进程都有待处理的块，同时限制内存占用
+    max_pending = workers * 2
+
+    with open(input_path, newline="", encoding=encoding) as src, \
+            open(output_path, "w", newline="", encoding=output_encoding) as dst, \
+            ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                initargs=(list(calendar_files), binary_path)) as pool:
+        reader = csv.reader(src)
+        header = next(reader, None)
+        if header is None:
+            raise ValueError("输入文件为空")
+        missing = [name for name in REQUIRED_COLUMNS if name not in header]
+        if missing:
+            raise ValueError(f"输入文件缺少列: {', '.join(missing)}")
+        csv.writer(dst).writerow(header + list(RESULT_COLUMNS))
+
+        pending: Deque[Future] = deque()
+
+        def drain(limit: int) -> None:
+            nonlocal orders, errors
+            while len(pending) > limit:
+                text, part, failed = pending.popleft().result()
+                dst.write(text)
+                merge_aggregates(aggregates, part)
+                errors += failed
+
+        for chunk in iter_chunks(reader, chunk_size):
+            orders += len(chunk)
+            pending.append(pool.submit(process_chunk, header, chunk))
+            drain(max_pending)
+        drain(0)
+
+    write_summary(summary_path, aggregates, output_encoding)
+    return {"orders": orders, "errors": errors, "groups": len(aggregates),
+            "elapsed": round(time.monotonic() - started, 3)}
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="离线维修时长统计报表")
+    parser.add_argument("input", help="工单导出CSV文件")
+    parser.add_argument("--output", required=True, help="逐单结果CSV文件")
+    parser.add_argument("--summary", required=True, help="按仪器类型与月份汇总的超期率CSV文件")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="工作进程数，默认为CPU核数")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="每块工单数")
+    parser.add_argument("--encoding", default="utf-8-sig", help="输入文件编码，如 gbk")
+    parser.add_argument("--output-encoding", default="utf-8-sig", help="输出文件编码")
+    parser.add_argument("--snapshot", default=os.getenv("WORKDAY_SNAPSHOT_FILE", DEFAULT_SNAPSHOT_FILE))
+    parser.add_argument("--calendar", default=os.getenv("WORKDAY_CALENDAR_FILE"), help="额外导入的日历文件")
+    parser.add_argument("--calendar-binary", default=os.getenv("WORKDAY_CALENDAR_BINARY"),
+                        help="二进制日历文件，各工作进程共享内存映射")
+
+    args = parser.parse_args(argv)
+    if args.workers < 1 or args.chunk_size < 1:
+        parser.error("--workers 与 --chunk-size 必须大于0")
+
+    try:
+        stats = run_report(
+            args.input, args.output, args.summary, args.workers,
+            chunk_size=args.chunk_size,
+            calendar_files=[BUNDLED_CALENDAR_FILE, args.snapshot, args.calendar],
+            binary_path=args.calendar_binary,
+            encoding=args.encoding,
+            output_encoding=args.output_encoding,
+        )
+    except (OSError, ValueError) as e:
+        print(f"生成报表失败: {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"已处理 {stats['orders']} 条工单（{stats['errors']} 条出错），"
+          f"汇总 {stats['groups']} 组，用时 {stats['elapsed']} 秒")
+
+
+if __name__ == "__main__":
+    main()
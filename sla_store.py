@@ -0,0 +1,203 @@
+"""
+维修时长统计存储
+
+记录每个工单最近一次的计算结果，并按仪器类型、阶段与月份维护超期统计的累计值。
+写入同一工单时先扣除旧结果的计数再计入新结果，统计查询只读取累计表，无需重新扫描历史工单。
+"""
+
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from repair_rules import SLA_STAGES
+
+logger = logging.getLogger(__name__)
+
+ORDER_FIELDS = ("rep_ins_type", "period", "estimated") + tuple(
+    field for _, days_field, overdue_field in SLA_STAGES for field in (days_field, overdue_field)
+)
+
+
+def _contributions(order: Optional[dict]) -> List[Tuple[int, str, str, int, int]]:
+    """工单对累计表的计数：[(仪器类型, 阶段, 月份, 超期, 估算)]，未计算的阶段不计入"""
+    if order is None:
+        return []
+    return [
+        (order["rep_ins_type"], stage, order["period"],
+         int(bool(order[overdue_field])), int(bool(order["estimated"])))
+        for stage, days_field, overdue_field in SLA_STAGES
+        if order[days_field] is not None
+    ]
+
+
+class SLAStore:
+    """基于 SQLite 的维修时长统计存储
+
+    与工作日缓存的持久化存储相同，使用 WAL 模式，写入通过队列交给后台线程批量提交；
+    查询前等待已排队的写入提交，保证能读到此前记录的结果。
+    """
+
+    FILE_NAME = "sla_stats.sqlite3"
+
+    def __init__(self, directory: str, busy_timeout: float = 5.0):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.FILE_NAME)
+        self._busy_timeout = busy_timeout
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        with self._reader:
+            self._reader.execute(
+                "CREATE TABLE IF NOT EXISTS orders ("
+                "order_id TEXT PRIMARY KEY, rep_ins_type INTEGER NOT NULL, period TEXT NOT NULL, "
+                "detection_days INTEGER, is_detection_overdue INTEGER, "
+                "repair_days INTEGER, is_repair_overdue INTEGER, "
+                "return_repair_days INTEGER, is_return_repair_overdue INTEGER, "
+                "estimated INTEGER NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._reader.execute(
+                "CREATE TABLE IF NOT EXISTS sla_aggregates ("
+                "rep_ins_type INTEGER NOT NULL, stage TEXT NOT NULL, period TEXT NOT NULL, "
+                "total INTEGER NOT NULL, overdue INTEGER NOT NULL, estimated INTEGER NOT NULL, "
+                "PRIMARY KEY (rep_ins_type, stage, period)) WITHOUT ROWID"
+            )
+
+        self._queue: "queue.Queue[Optional[Tuple[str, dict]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="sla-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self._busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def record(self, order_id: str, order: Dict[str, object]) -> None:
+        """异步记录工单的计算结果，同一工单再次记录时视为更正
+
+        order 包含 rep_ins_type、period（派工月份，YYYY-MM）、estimated 以及 RepairTimeResult 中各阶段的时长与超期标记。
+        """
+        self._queue.put((order_id, {field: order.get(field) for field in ORDER_FIELDS}))
+
+    def get_order(self, order_id: str) -> Optional[Dict[str, object]]:
+        """读取工单最近一次记录的结果"""
+        self.flush()
+        with self._read_lock:
+            return self._fetch_order(self._reader, order_id)
+
+    def query(self, period: Optional[str] = None, rep_ins_type: Optional[int] = None,
+              stage: Optional[str] = None) -> List[Dict[str, object]]:
+        """查询累计统计；period 为 YYYY-MM 时按月查询，为 YYYY 时返回该年各月"""
+        conditions, params = [], []
+        if period is not None:
+            if len(period) == 4:
+                conditions.append("period >= ? AND period < ?")
+                params.extend([period, f"{int(period) + 1:04d}"])
+            else:
+                conditions.append("period = ?")
+                params.append(period)
+        if rep_ins_type is not None:
+            conditions.append("rep_ins_type = ?")
+            params.append(rep_ins_type)
+        if stage is not None:
+            conditions.append("stage = ?")
+            params.append(stage)
+        sql = "SELECT rep_ins_type, stage, period, total, overdue, estimated FROM sla_aggregates WHERE total > 0"
+        if conditions:
+            sql += " AND " + " AND ".join(conditions)
+        sql += " ORDER BY period, rep_ins_type, stage"
+
+        self.flush()
+        with self._read_lock:
+            rows = self._reader.execute(sql, params).fetchall()
+        return [
+            {"rep_ins_type": rep_ins_type, "stage": stage, "period": period,
+             "total": total, "overdue": overdue, "estimated": estimated}
+            for rep_ins_type, stage, period, total, overdue, estimated in rows
+        ]
+
+    def flush(self) -> None:
+        """等待已排队的写入全部提交"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """提交剩余写入并关闭数据库连接"""
+        self._queue.put(None)
+        self._writer.join()
+        with self._read_lock:
+            self._reader.close()
+
+    @staticmethod
+    def _fetch_order(conn: sqlite3.Connection, order_id: str) -> Optional[Dict[str, object]]:
+        row = conn.execute(
+            f"SELECT {', '.join(ORDER_FIELDS)} FROM orders WHERE order_id = ?", (order_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        order = dict(zip(ORDER_FIELDS, row))
+        for field in ORDER_FIELDS:
+            if (field == "estimated" or field.startswith("is_")) and order[field] is not None:
+                order[field] = bool(order[field])
+        return order
+
+    def _apply(self, conn: sqlite3.Connection, order_id: str, order: dict) -> None:
+        """写入工单结果，并将新旧结果的差值计入累计表"""
+        previous = self._fetch_order(conn, order_id)
+        deltas: Dict[Tuple[int, str, str], List[int]] = {}
+        for sign, contributions in ((-1, _contributions(previous)), (1, _contributions(order))):
+            for rep_ins_type, stage, period, overdue, estimated in contributions:
+                delta = deltas.setdefault((rep_ins_type, stage, period), [0, 0, 0])
+                delta[0] += sign
+                delta[1] += sign * overdue
+                delta[2] += sign * estimated
+
+        conn.execute(
+            f"INSERT OR REPLACE INTO orders (order_id, {', '.join(ORDER_FIELDS)}, updated_at) "
+            f"VALUES (?, {', '.join('?' * len(ORDER_FIELDS))}, ?)",
+            (order_id, *(order[field] for field in ORDER_FIELDS), time.time()),
+        )
+        conn.executemany(
+            "INSERT INTO sla_aggregates (rep_ins_type, stage, period, total, overdue, estimated) "
+            "VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (rep_ins_type, stage, period) DO UPDATE SET "
+            "total = total + excluded.total, overdue = overdue + excluded.overdue, "
+            "estimated = estimated + excluded.estimated",
+            [(*key, *delta) for key, delta in deltas.items() if any(delta)],
+        )
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        # 手动管理事务：读取旧结果与更新累计表需在同一个写事务中，避免多进程同时更正同一工单时重复扣减
+        conn.isolation_level = None
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                # 合并队列中已积压的写入，在同一个事务中按顺序提交
+                while item is not None:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+
+                entries = [entry for entry in batch if entry is not None]
+                if entries:
+                    try:
+                        conn.execute("BEGIN IMMEDIATE")
+                        for order_id, order in entries:
+                            self._apply(conn, order_id, order)
+                        conn.execute("COMMIT")
+                    except sqlite3.Error as e:
+                        if conn.in_transaction:
+                            conn.execute("ROLLBACK")
+                        logger.warning(f"维修时长统计写入失败: {e}")
+
+                for _ in batch:
+                    self._queue.task_done()
+                if len(entries) < len(batch):
+                    return
+        finally:
+            conn.close()
@@ -0,0 +1,111 @@
+"""
+文档模板注册表
+
+每个 .docx 模板只解析一次，之后每次请求复制已解析的文档对象用于渲染，
+模板XML的预处理结果与编译后的 Jinja 模板也在同一模板的各次渲染之间复用；
+模板文件被修改（mtime 或大小变化）后，下一次获取时自动重新加载。
+"""
+
+import copy
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+from docx import Document
+from docxtpl import DocxTemplate
+from jinja2 import Environment
+
+
+class _CachingEnvironment(Environment):
+    """按模板源码缓存编译结果的 Jinja 环境
+
+    docxtpl 每次渲染都会对文档各部分的XML调用 from_string，同一模板的源码不变，编译结果可直接复用。
+    """
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._compiled = {}
+
+    def from_string(self, source, globals=None, template_class=None):
+        if globals or template_class is not None or not isinstance(source, str):
+            return super().from_string(source, globals, template_class)
+        template = self._compiled.get(source)
+        if template is None:
+            template = super().from_string(source)
+            self._compiled[source] = template
+        return template
+
+
+class _TemplateEntry:
+    """已加载的模板：解析后的文档、预处理结果缓存与 Jinja 环境"""
+
+    def __init__(self, path: str, signature: Tuple[int, int]):
+        self.path = path
+        self.signature = signature
+        self.docx = Document(path)
+        self.patched: Dict[str, str] = {}
+        self.jinja_env = _CachingEnvironment()
+        self.renders = 0
+
+
+class RenderableTemplate(DocxTemplate):
+    """供单次请求渲染的模板副本，渲染与保存不影响注册表中的模板"""
+
+    def __init__(self, entry: _TemplateEntry):
+        super().__init__(entry.path)
+        self.docx = copy.deepcopy(entry.docx)
+        self._entry = entry
+
+    def patch_xml(self, src_xml: str) -> str:
+        patched = self._entry.patched.get(src_xml)
+        if patched is None:
+            patched = super().patch_xml(src_xml)
+            self._entry.patched[src_xml] = patched
+        return patched
+
+    def render(self, context, jinja_env: Optional[Environment] = None, autoescape: bool = False) -> None:
+        if jinja_env is None and not autoescape:
+            jinja_env = self._entry.jinja_env
+        super().render(context, jinja_env, autoescape)
+
+
+class TemplateRegistry:
+    """按文件名管理模板目录下的 .docx 模板"""
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._entries: Dict[str, _TemplateEntry] = {}
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.reloads = 0
+
+    def get(self, name: str) -> RenderableTemplate:
+        """获取模板的渲染副本，模板不存在时抛出 FileNotFoundError"""
+        return RenderableTemplate(self._get_entry(name))
+
+    def _get_entry(self, name: str) -> _TemplateEntry:
+        path = os.path.join(self.directory, name)
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            raise FileNotFoundError(f"模板未找到: {name}")
+        signature = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is None or entry.signature != signature:
+                if entry is not None:
+                    self.reloads += 1
+                entry = _TemplateEntry(path, signature)
+                self._entries[name] = entry
+                self.loads += 1
+            entry.renders += 1
+            return entry
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "loads": self.loads,
+                "reloads": self.reloads,
+                "templates": {name: {"renders": entry.renders} for name, entry in self._entries.items()},
+            }
@@ -0,0 +1,106 @@
+"""
+批量接口请求体解析单元测试
+
+JSON数组按顶层元素切分：单个元素格式错误只影响该元素，缺少逗号等结构错误时停止解析；
+元素被拆分在多个数据块中时结果与一次性接收相同。
+
+运行：python -m pytest -q test_batch_parser.py
+"""
+
+import asyncio
+import json
+
+import pytest
+
+from repair_time import BatchRecordError, _iter_json_array_records, _iter_ndjson_records
+
+
+async def _chunks(parts):
+    for part in parts:
+        yield part
+
+
+def parse_array(*parts: bytes) -> list:
+    async def collect():
+        return [record async for record in _iter_json_array_records(_chunks(parts))]
+    return asyncio.run(collect())
+
+
+def parse_ndjson(*parts: bytes) -> list:
+    async def collect():
+        return [record async for record in _iter_ndjson_records(_chunks(parts))]
+    return asyncio.run(collect())
+
+
+def describe(records: list) -> list:
+    """BatchRecordError 换成 "error"，便于比较"""
+    return ["error" if isinstance(record, BatchRecordError) else record for record in records]
+
+
+RECORDS = [
+    {"rep_ins_type": 1, "rep_start_date": "2025-03-03 09:00:00", "order_id": "A1"},
+    {"rep_ins_type": 3, "rep_start_date": "2025-03-04 09:00:00", "note": "含 ] } , \" \\ 字符"},
+    {"rep_ins_type": 2, "rep_start_date": "2025-03-05 09:00:00", "items": [1, [2, {"x": "]"}]]},
+]
+
+
+def test_parses_array():
+    assert parse_array(json.dumps(RECORDS).encode()) == RECORDS
+    assert parse_array(b"  [ ]  ") == []
+    assert parse_array(b'[1, "a", null, {"b": [true]}]') == [1, "a", None, {"b": [True]}]
+
+
+def test_chunk_split_elements_match_whole_body():
+    body = json.dumps(RECORDS, ensure_ascii=False, indent=1).encode("utf-8")
+    # 逐字节拆分：覆盖在字符串、转义符、多字节字符与括号中间断开的情况
+    assert parse_array(*[body[i:i + 1] for i in range(len(body))]) == RECORDS
+    for size in (2, 3, 7, 16):
+        assert parse_array(*[body[i:i + size] for i in range(0, len(body), size)]) == RECORDS
+
+
+@pytest.mark.parametrize("body", [b'[1.5, 2]', b'[-2500.0]', b'[1e5, -2500.0, 1.5]', b'[ 1E+5 ,true,null]'])
+def test_chunk_split_top_level_numbers(body):
+    expected = json.loads(body)
+    # 顶层数字在任意位置断开（如 "1." 与 "5, 2]"）都不应被截断为较短的数字
+    for i in range(1, len(body)):
+        assert parse_array(body[:i], body[i:]) == expected, body[:i]
+    assert parse_array(*[body[i:i + 1] for i in range(len(body))]) == expected
+
+
+def test_malformed_element_only_fails_that_index():
+    body = b'[{"order_id": "A1"}, {"order_id": "A2",, }, {"order_id": "A3"}, {order_id: 4}, {"order_id": "A5"}]'
+    for parts in ([body], [body[i:i + 5] for i in range(0, len(body), 5)]):
+        assert describe(parse_array(*parts)) == [
+            {"order_id": "A1"}, "error", {"order_id": "A3"}, "error", {"order_id": "A5"},
+        ]
+
+
+def test_missing_comma_is_rejected():
+    for body in (
+        b'[{"order_id": "A1"} {"order_id": "A2"}]',
+        b'[{"order_id": "A1"}\n{"order_id": "A2"}]',
+        b'["A1" "A2"]',
+        b'[1 2]',
+        b'[[1] 2]',
+    ):
+        records = parse_array(body)
+        # 缺少逗号的两个元素都不产出，只产出一条结构错误
+        assert len(records) == 1 and isinstance(records[0], BatchRecordError), body
+        assert "第1个元素之后缺少逗号" in str(records[0])
+    assert describe(parse_array(b'[{"a": 1}, {"a": 2} {"a": 3}, {"a": 4}]')) == [{"a": 1}, "error"]
+
+
+@pytest.mark.parametrize("body", [b'[1,,2]', b'[,1]', b'[1,]'])
+def test_empty_element_is_rejected(body):
+    assert describe(parse_array(body))[-1] == "error"
+
+
+@pytest.mark.parametrize("body", [b'', b'[{"a": 1}', b'[{"a": "1}]', b'{"a": 1}', b'[1] 2'])
+def test_incomplete_or_not_array(body):
+    records = parse_array(body)
+    assert isinstance(records[-1], BatchRecordError)
+
+
+def test_ndjson_bad_line_only_fails_that_line():
+    body = b'{"a": 1}\n{"a": \n\n{"a": 3}'
+    assert describe(parse_ndjson(body[:5], body[5:12], body[12:])) == [{"a": 1}, "error", {"a": 3}]
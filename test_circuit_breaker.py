@@ -0,0 +1,61 @@
+"""
+外部API熔断器单元测试
+
+运行：python -m pytest -q test_circuit_breaker.py
+"""
+
+import asyncio
+
+from circuit_breaker import CircuitBreaker
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("测试", failure_threshold=3, probe_interval=60)
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()  # 成功后重新计数
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow_request()
+    assert breaker.stats()["rejected"] == 1 and breaker.stats()["times_opened"] == 1
+
+
+def test_without_probe_task_lets_one_request_through_per_interval():
+    breaker = CircuitBreaker("测试", failure_threshold=1, probe_interval=0.05)
+    breaker.record_failure()
+    assert not breaker.allow_request()
+    asyncio.run(asyncio.sleep(0.06))
+    assert breaker.allow_request()
+    assert not breaker.allow_request()
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED and breaker.allow_request()
+
+
+def test_background_probe_closes_breaker():
+    attempts = []
+
+    async def probe():
+        attempts.append(1)
+        if len(attempts) < 2:
+            raise ConnectionError("仍不可用")
+
+    async def scenario():
+        breaker = CircuitBreaker("测试", failure_threshold=1, probe_interval=0.01, probe=probe)
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        # 有后台探测任务时，熔断期间不放行调用
+        await asyncio.sleep(0.015)
+        assert breaker.state == CircuitBreaker.OPEN and not breaker.allow_request()
+        for _ in range(100):
+            if breaker.state == CircuitBreaker.CLOSED:
+                break
+            await asyncio.sleep(0.01)
+        await breaker.close()
+        return breaker.state
+
+    assert asyncio.run(scenario()) == CircuitBreaker.CLOSED
+    assert len(attempts) == 2
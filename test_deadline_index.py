@@ -0,0 +1,87 @@
+"""
+未结工单截止日索引单元测试
+
+运行：python -m pytest -q test_deadline_index.py
+"""
+
+import asyncio
+from datetime import date
+
+import repair_time
+from deadline_index import Deadline, DeadlineIndex, SQLiteDeadlineStore
+
+
+def deadline(order_id: str, due_day: int, stage: str = "detection") -> Deadline:
+    return Deadline(date(2025, 3, due_day), order_id, stage, date(2025, 3, 1), 7, False)
+
+
+def test_between_is_sorted_and_closed():
+    index = DeadlineIndex()
+    index.update("B", [deadline("B", 12)])
+    index.update("A", [deadline("A", 10), deadline("A", 20, "repair")])
+    index.update("C", [deadline("C", 15)])
+    assert [d.order_id for d in index.between()] == ["A", "B", "C", "A"]
+    assert [d.order_id for d in index.between(date(2025, 3, 12), date(2025, 3, 15))] == ["B", "C"]
+    assert [d.order_id for d in index.between(end=date(2025, 3, 12), limit=1)] == ["A"]
+    assert len(index) == 3
+
+
+def test_update_replaces_and_empty_update_removes():
+    index = DeadlineIndex()
+    index.update("A", [deadline("A", 10)])
+    index.update("A", [deadline("A", 18, "repair")])
+    assert index.get("A") == [deadline("A", 18, "repair")]
+    assert [d.due_date.day for d in index.between()] == [18]
+    index.update("A", [])
+    assert index.get("A") == [] and len(index) == 0
+    assert not index.remove("A")
+
+
+def test_index_is_rebuilt_from_store(tmp_path):
+    index = DeadlineIndex(SQLiteDeadlineStore(str(tmp_path)))
+    index.update("A", [deadline("A", 10), deadline("A", 20, "repair")])
+    index.update("B", [deadline("B", 12)])
+    index.update("C", [deadline("C", 15)])
+    assert index.remove("C")
+    index.close()
+
+    # 模拟服务重启
+    restarted = DeadlineIndex(SQLiteDeadlineStore(str(tmp_path)))
+    assert restarted.between() == [deadline("A", 10), deadline("B", 12), deadline("A", 20, "repair")]
+    assert restarted.get("A") == [deadline("A", 10), deadline("A", 20, "repair")]
+    assert len(restarted) == 2
+    restarted.close()
+
+
+def test_workers_see_each_others_changes(tmp_path):
+    worker_1 = DeadlineIndex(SQLiteDeadlineStore(str(tmp_path)))
+    worker_2 = DeadlineIndex(SQLiteDeadlineStore(str(tmp_path)))
+
+    worker_1.update("A", [deadline("A", 10)])
+    assert worker_2.get("A") == [deadline("A", 10)]
+
+    worker_2.update("A", [deadline("A", 11)])
+    worker_2.update("B", [deadline("B", 9)])
+    assert worker_1.between() == [deadline("B", 9), deadline("A", 11)]
+
+    # 由另一个 worker 登记的工单也能移除
+    assert worker_1.remove("B")
+    assert worker_2.between() == [deadline("A", 11)]
+    assert not worker_2.remove("B")
+
+    worker_1.close()
+    worker_2.close()
+
+
+def test_shutdown_closes_the_store(tmp_path, monkeypatch):
+    index = DeadlineIndex(SQLiteDeadlineStore(str(tmp_path)))
+    index.update("A", [deadline("A", 10)])
+    monkeypatch.setattr(repair_time, "_deadline_index", index)
+    asyncio.run(repair_time.shutdown())
+
+    # 关闭后的修改只保存在内存中
+    index.update("B", [deadline("B", 12)])
+    assert [d.order_id for d in index.between()] == ["A", "B"]
+    restarted = DeadlineIndex(SQLiteDeadlineStore(str(tmp_path)))
+    assert restarted.between() == [deadline("A", 10)]
+    restarted.close()
@@ -0,0 +1,80 @@
+"""
+文档渲染器单元测试
+
+渲染函数由测试直接传给 DocumentRenderer._run，在线程池（workers=0）中执行。
+
+运行：python -m pytest -q test_document_renderer.py
+"""
+
+import asyncio
+import threading
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from document_renderer import DocumentRenderer, DocumentRendererBusy
+
+
+def blocking_render(started: threading.Event, release: threading.Event):
+    started.set()
+    release.wait(5)
+    return "done", {"render": 0.0}
+
+
+def test_cancelled_render_keeps_its_slot_until_it_finishes(tmp_path):
+    renderer = DocumentRenderer(str(tmp_path), workers=0, queue_size=0, queue_timeout=0.05)
+    started, release = threading.Event(), threading.Event()
+
+    async def run():
+        task = asyncio.ensure_future(renderer._run(blocking_render, started, release))
+        await asyncio.to_thread(started.wait, 5)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # 等待方已取消，渲染仍在执行，队列空位不释放
+        assert renderer.pending == 1
+        with pytest.raises(DocumentRendererBusy):
+            await renderer._run(blocking_render, threading.Event(), threading.Event())
+
+        release.set()
+        for _ in range(100):
+            if renderer.pending == 0:
+                break
+            await asyncio.sleep(0.01)
+        assert renderer.pending == 0
+        next_started = threading.Event()
+        next_started.set()
+        assert await renderer._run(blocking_render, threading.Event(), next_started) == "done"
+        await renderer.close()
+
+    asyncio.run(run())
+    assert (renderer.rendered, renderer.rejected, renderer.failed) == (1, 1, 0)
+
+
+class BrokenExecutor:
+    def __init__(self):
+        self.shutdown_calls = []
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("工作进程异常退出"))
+        return future
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self.shutdown_calls.append((wait, cancel_futures))
+
+
+def test_broken_pool_is_shut_down_and_replaced(tmp_path):
+    renderer = DocumentRenderer(str(tmp_path), workers=0)
+    broken = renderer._executor = BrokenExecutor()
+
+    async def run():
+        with pytest.raises(BrokenProcessPool):
+            await renderer._run(blocking_render, threading.Event(), threading.Event())
+        await asyncio.sleep(0)
+        assert renderer.pending == 0
+
+    asyncio.run(run())
+    assert broken.shutdown_calls == [(False, True)]
+    assert renderer._executor is None and renderer.failed == 1
@@ -0,0 +1,87 @@
+"""
+生成文件存储单元测试
+
+运行：python -m pytest -q test_document_store.py
+"""
+
+import os
+import time
+
+import document_store
+from document_store import GeneratedFileStore, StoredFile
+
+
+def write_file(store: GeneratedFileStore, name: str, size: int = 10) -> StoredFile:
+    path = store.path_for(name)
+    with open(path, "wb") as f:
+        f.write(b"x" * size)
+    return store.register(name, path)
+
+
+def test_sweep_removes_expired_files(tmp_path):
+    store = GeneratedFileStore(str(tmp_path), ttl=60)
+    kept = write_file(store, "kept.docx")
+    expired = write_file(store, "expired.docx")
+    store._conn.execute("UPDATE files SET expires_at = ? WHERE name = ?", (time.time() - 1, expired.name))
+    store._conn.commit()
+
+    assert store.sweep() == {"removed": 1, "freed_bytes": 10}
+    assert not os.path.exists(expired.path) and store.resolve(expired.name) is None
+    assert os.path.exists(kept.path) and store.resolve(kept.name) is not None
+    assert store.stats()["swept_files"] == 1
+
+
+def test_sweep_keeps_files_reused_by_another_worker(tmp_path):
+    sweeping = GeneratedFileStore(str(tmp_path), ttl=60)
+    serving = GeneratedFileStore(str(tmp_path), ttl=60)
+    entry = write_file(serving, "reused.docx")
+    with sweeping._lock:
+        selected = StoredFile(*sweeping._conn.execute(
+            f"SELECT {sweeping._COLUMNS} FROM files WHERE name = ?", (entry.name,)).fetchone())
+
+    # 清理任务选出条目之后，另一个 worker 复用了该文件（重新计时）
+    time.sleep(0.01)
+    assert serving.touch(entry.name) is not None
+
+    assert sweeping._delete([selected]) == (0, 0)
+    assert os.path.exists(entry.path)
+    assert serving.resolve(entry.name) is not None
+
+
+def test_sweep_enforces_max_bytes_oldest_expiry_first(tmp_path):
+    store = GeneratedFileStore(str(tmp_path), ttl=60, max_bytes=25)
+    first = write_file(store, "first.docx")
+    time.sleep(0.01)
+    second = write_file(store, "second.docx")
+    time.sleep(0.01)
+    third = write_file(store, "third.docx")
+
+    assert store.sweep() == {"removed": 1, "freed_bytes": 10}
+    assert not os.path.exists(first.path)
+    assert os.path.exists(second.path) and os.path.exists(third.path)
+
+
+def test_migrate_flat_files(tmp_path):
+    (tmp_path / "出库单_old.docx").write_bytes(b"old")
+    store = GeneratedFileStore(str(tmp_path))
+    assert store.migrate_flat_files() == 1
+    entry = store.resolve("出库单_old.docx")
+    assert entry is not None and os.path.dirname(entry.path) != str(tmp_path)
+    assert not (tmp_path / "出库单_old.docx").exists()
+
+
+def test_migrate_skips_files_moved_by_another_worker(tmp_path, monkeypatch):
+    (tmp_path / "a.docx").write_bytes(b"a")
+    (tmp_path / "b.docx").write_bytes(b"b")
+    store = GeneratedFileStore(str(tmp_path))
+    replace = os.replace
+
+    def concurrent_replace(src, dst):
+        # 模拟另一个 worker 在本进程列出目录之后抢先迁移了 a.docx
+        if src.endswith("a.docx"):
+            os.remove(src)
+        return replace(src, dst)
+
+    monkeypatch.setattr(document_store.os, "replace", concurrent_replace)
+    assert store.migrate_flat_files() == 1
+    assert store.resolve("b.docx") is not None
@@ -0,0 +1,211 @@
+"""
+文档生成接口单元测试
+
+测试使用 python-docx 临时生成的简单模板，在线程中渲染（DOCUMENT_RENDER_WORKERS=0 的方式），
+生成文件写入临时目录。
+
+运行：python -m pytest -q test_documents.py
+"""
+
+import asyncio
+import io
+import os
+import zipfile
+
+import docx
+import httpx
+import pytest
+from fastapi import FastAPI
+
+import documents
+from document_renderer import DocumentRenderer
+
+
+@pytest.fixture
+def docs(tmp_path, monkeypatch):
+    """documents 模块改用临时模板目录、生成文件目录与线程渲染器，返回模板目录"""
+    template_dir = tmp_path / "templates"
+    template_dir.mkdir()
+    for name in (documents.DELIVERY_NOTE_TEMPLATE, documents.MAINTENANCE_QUOTE_TEMPLATE):
+        document = docx.Document()
+        document.add_paragraph("{{ customer_delivery_addres }}{{ cust_name }}")
+        document.save(str(template_dir / name))
+
+    renderer = DocumentRenderer(str(template_dir), workers=0)
+    monkeypatch.setattr(documents, "TEMPLATE_DIR", str(template_dir))
+    monkeypatch.setattr(documents, "GENERATED_FILES_DIR", str(tmp_path / "generated"))
+    monkeypatch.setattr(documents, "_generated_files", None)
+    monkeypatch.setattr(documents, "_document_renderer", renderer)
+    monkeypatch.setattr(documents, "_document_stats", {"reused": 0, "coalesced": 0})
+    yield template_dir
+    asyncio.run(renderer.close())
+    if documents._generated_files is not None:
+        documents._generated_files.close()
+
+
+def call(*requests):
+    """并发发出一组请求 (method, url, kwargs)，按请求顺序返回响应"""
+    app = FastAPI()
+    app.include_router(documents.router)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return await asyncio.gather(*(client.request(method, url, **kwargs) for method, url, kwargs in requests))
+
+    return asyncio.run(run())
+
+
+def delivery_note(address: str = "西安市高新区") -> tuple:
+    return "POST", "/generate_delivery_note", {"json": {"customer_delivery_addres": address, "instmt_model": "A"}}
+
+
+def test_identical_requests_reuse_one_document(docs):
+    first, = call(delivery_note())
+    second, = call(delivery_note())
+    other, = call(delivery_note("宝鸡市"))
+    assert first.status_code == 200 and first.text == second.text
+    assert other.text != first.text
+    assert documents._document_renderer.rendered == 2
+    assert documents._document_stats["reused"] == 1
+
+    file_name = first.text.rsplit("/", 1)[1]
+    assert file_name.startswith("出库单_") and len(file_name) == len("出库单_") + 16 + len(".docx")
+
+
+def test_concurrent_identical_requests_share_one_render(docs):
+    responses = call(*[delivery_note()] * 5)
+    assert {response.text for response in responses} == {responses[0].text}
+    assert documents._document_renderer.rendered == 1
+    assert documents._document_stats["coalesced"] == 4
+
+
+def test_changed_template_produces_a_new_document(docs):
+    first, = call(delivery_note())
+    document = docx.Document()
+    document.add_paragraph("新版 {{ customer_delivery_addres }}")
+    document.save(str(docs / documents.DELIVERY_NOTE_TEMPLATE))
+    second, = call(delivery_note())
+    assert first.text != second.text
+
+
+def test_missing_template_returns_404_without_path(docs):
+    os.remove(docs / documents.DELIVERY_NOTE_TEMPLATE)
+    os.remove(docs / documents.MAINTENANCE_QUOTE_TEMPLATE)
+    single, inline, bulk, quote = call(
+        delivery_note(),
+        ("POST", "/generate_delivery_note?response=docx", delivery_note()[2]),
+        ("POST", "/generate_delivery_note/bulk", {"json": [delivery_note()[2]["json"]]}),
+        ("POST", "/generate_maintenance_quote", {"json": {"cust_name": "甲"}}),
+    )
+    for response in (single, inline, bulk):
+        assert response.status_code == 404
+        assert response.json() == {"detail": "发货单模板未找到"}
+    assert quote.status_code == 404 and quote.json() == {"detail": "维修确认单模板未找到"}
+
+
+@pytest.mark.parametrize("count, width", [(3, 2), (100, 3)])
+def test_bulk_entry_names(docs, count, width):
+    # 条目名至少两位（出库单_01），超过 99 份时按总数补齐位数
+    payload = [{"customer_delivery_addres": f"地址{i}"} for i in range(count)]
+    response, = call(("POST", "/generate_delivery_note/bulk", {"json": payload}))
+    assert response.status_code == 200
+    names = zipfile.ZipFile(io.BytesIO(response.content)).namelist()
+    assert sorted(names) == [f"出库单_{i:0{width}d}.docx" for i in range(1, count + 1)]
+
+
+def test_bulk_records_failed_entries_and_rejects_bad_bodies(docs, monkeypatch):
+    render_bytes = documents._document_renderer.render_bytes
+
+    async def failing_render_bytes(template_name, context):
+        if context["customer_delivery_addres"] == "无法渲染":
+            raise RuntimeError("渲染出错")
+        return await render_bytes(template_name, context)
+
+    monkeypatch.setattr(documents._document_renderer, "render_bytes", failing_render_bytes)
+    payload = [{"customer_delivery_addres": address} for address in ("甲", "无法渲染", "丙")]
+    response, bad_json, empty, not_objects = call(
+        ("POST", "/generate_delivery_note/bulk", {"json": payload}),
+        ("POST", "/generate_delivery_note/bulk", {"content": b"[{"}),
+        ("POST", "/generate_delivery_note/bulk", {"json": []}),
+        ("POST", "/generate_delivery_note/bulk", {"json": [1, 2]}),
+    )
+    assert response.status_code == 200 and response.headers["content-type"] == "application/zip"
+    archive = zipfile.ZipFile(io.BytesIO(response.content))
+    assert sorted(archive.namelist()) == ["出库单_01.docx", "出库单_02.txt", "出库单_03.docx"]
+    assert archive.read("出库单_02.txt").decode("utf-8") == "生成失败: 渲染出错"
+    assert "甲" in docx.Document(io.BytesIO(archive.read("出库单_01.docx"))).paragraphs[0].text
+    assert (bad_json.status_code, empty.status_code, not_objects.status_code) == (400, 400, 422)
+
+
+def test_inline_response_writes_nothing_to_disk(docs):
+    query, accept = call(
+        ("POST", "/generate_delivery_note?response=docx", delivery_note()[2]),
+        ("POST", "/generate_delivery_note",
+         {**delivery_note("宝鸡市")[2], "headers": {"accept": documents.DOCX_MEDIA_TYPE}}),
+    )
+    for response, address in ((query, "西安市高新区"), (accept, "宝鸡市")):
+        assert response.status_code == 200
+        assert response.headers["content-type"] == documents.DOCX_MEDIA_TYPE
+        assert response.headers["content-disposition"].startswith("attachment; filename*=utf-8''")
+        assert address in docx.Document(io.BytesIO(response.content)).paragraphs[0].text
+    assert documents._generated_files is None
+    assert not os.path.exists(documents.GENERATED_FILES_DIR)
+
+    # 已生成过的相同文档直接返回该文件
+    link, = call(delivery_note())
+    again, = call(("POST", "/generate_delivery_note?response=docx", delivery_note()[2]))
+    assert documents._document_stats["reused"] == 1
+    assert again.content == call(("GET", link.text.replace("http://test", ""), {}))[0].content
+
+
+def test_conditional_and_ranged_downloads(docs):
+    link, = call(delivery_note())
+    file_name = link.text.rsplit("/", 1)[1]
+    url = f"/download/{file_name}"
+    stored = documents.get_generated_files().resolve(file_name)
+    with open(stored.path, "rb") as f:
+        content = f.read()
+
+    full, head, static = call(("GET", url, {}), ("HEAD", url, {}), ("GET", f"/static/{file_name}", {}))
+    etag = full.headers["etag"]
+    assert full.status_code == 200 and full.content == content
+    assert etag == f'"{stored.digest}"'
+    assert full.headers["cache-control"] == documents.GENERATED_FILES_CACHE_CONTROL
+    assert full.headers["accept-ranges"] == "bytes"
+    assert full.headers["content-disposition"].startswith("attachment; filename*=utf-8''")
+    assert head.status_code == 200 and head.content == b""
+    assert head.headers["content-length"] == str(len(content)) and head.headers["etag"] == etag
+    assert static.content == content and "content-disposition" not in static.headers
+
+    last_modified = full.headers["last-modified"]
+    by_etag, by_date, stale, ranged, if_range, unsatisfiable, missing = call(
+        ("GET", url, {"headers": {"if-none-match": f'"other", W/{etag}'}}),
+        ("GET", url, {"headers": {"if-modified-since": last_modified}}),
+        ("GET", url, {"headers": {"if-none-match": '"other"', "if-modified-since": last_modified}}),
+        ("GET", url, {"headers": {"range": "bytes=10-19"}}),
+        ("GET", url, {"headers": {"range": "bytes=10-19", "if-range": '"other"'}}),
+        ("GET", url, {"headers": {"range": f"bytes={len(content)}-"}}),
+        ("GET", "/download/出库单_0000000000000000.docx", {}),
+    )
+    for response in (by_etag, by_date):
+        assert response.status_code == 304 and response.content == b"" and response.headers["etag"] == etag
+    # If-None-Match 优先于 If-Modified-Since
+    assert stale.status_code == 200
+    assert ranged.status_code == 206 and ranged.content == content[10:20]
+    assert ranged.headers["content-range"] == f"bytes 10-19/{len(content)}"
+    # If-Range 校验值不匹配时返回完整文件
+    assert if_range.status_code == 200 and if_range.content == content
+    assert unsatisfiable.status_code == 416
+    assert missing.status_code == 404 and missing.json() == {"detail": "文件不存在"}
+
+
+def test_full_render_queue_returns_503(docs, monkeypatch):
+    renderer = DocumentRenderer(str(docs), workers=0, queue_size=0, queue_timeout=0.05)
+    monkeypatch.setattr(documents, "_document_renderer", renderer)
+    # 所有空位都已被占用
+    renderer._slots = asyncio.Semaphore(0)
+    single, inline = call(delivery_note(), ("POST", "/generate_delivery_note?response=docx", delivery_note()[2]))
+    for response in (single, inline):
+        assert response.status_code == 503
+        assert response.json() == {"detail": "文档渲染队列已满，请稍后重试"}
+    assert renderer.rejected == 2 and renderer.rendered == 0
@@ -0,0 +1,41 @@
+"""
+日志配置单元测试
+
+运行：python -m pytest -q test_log_config.py
+"""
+
+import logging
+import logging.handlers
+import os
+
+from log_config import LOG_FORMAT, _file_handler
+
+
+def write(handler: logging.Handler, message: str) -> None:
+    handler.handle(logging.LogRecord("test", logging.INFO, __file__, 0, message, None, None))
+
+
+def test_default_handler_follows_external_rotation(tmp_path, monkeypatch):
+    monkeypatch.delenv("LOG_FILE_MAX_BYTES", raising=False)
+    log_file = tmp_path / "app.log"
+    handler = _file_handler(str(log_file))
+    assert isinstance(handler, logging.handlers.WatchedFileHandler)
+    handler.setFormatter(logging.Formatter(LOG_FORMAT))
+
+    write(handler, "轮转前")
+    # 模拟 logrotate：改名后由本进程重新打开新文件，不再写入已改名的文件
+    os.rename(log_file, tmp_path / "app.log.1")
+    write(handler, "轮转后")
+    handler.close()
+    assert "轮转前" in (tmp_path / "app.log.1").read_text(encoding="utf-8")
+    assert "轮转后" not in (tmp_path / "app.log.1").read_text(encoding="utf-8")
+    assert "轮转后" in log_file.read_text(encoding="utf-8")
+
+
+def test_size_rotation_is_opt_in(tmp_path, monkeypatch):
+    monkeypatch.setenv("LOG_FILE_MAX_BYTES", "1024")
+    monkeypatch.setenv("LOG_FILE_BACKUP_COUNT", "2")
+    handler = _file_handler(str(tmp_path / "app.log"))
+    assert isinstance(handler, logging.handlers.RotatingFileHandler)
+    assert (handler.maxBytes, handler.backupCount) == (1024, 2)
+    handler.close()
@@ -0,0 +1,66 @@
+"""
+按功能启用（ENABLE_REPAIR_TIME / ENABLE_DOCUMENTS）单元测试
+
+每种配置在独立的子进程中导入 main，检查加载的模块与根路径列出的接口。
+
+运行：python -m pytest -q test_main.py
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+SCRIPT = """
+import asyncio, json, sys
+import httpx
+import main
+
+async def run():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        root = (await client.get("/")).json()
+        statuses = {path: (await client.post(path, json={})).status_code
+                    for path in ("/calculate_repair_time", "/generate_delivery_note")}
+    return root, statuses
+
+root, statuses = asyncio.run(run())
+modules = [name for name in ("repair_time", "documents", "docxtpl", "docx", "numpy") if name in sys.modules]
+print(json.dumps({"endpoints": list(root["endpoints"]), "statuses": statuses, "modules": modules}))
+"""
+
+
+def run_main(**env) -> dict:
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "LOG_FILE": "", "LOG_CONSOLE": "0", **env},
+        capture_output=True, text=True, timeout=60,
+    )
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.splitlines()[-1])
+
+
+@pytest.mark.parametrize("env, enabled, disabled", [
+    ({"ENABLE_DOCUMENTS": "0"}, "repair_time", "documents"),
+    ({"ENABLE_REPAIR_TIME": "0"}, "documents", "repair_time"),
+])
+def test_disabled_feature_is_not_imported(env, enabled, disabled):
+    result = run_main(**env)
+    # 文档渲染依赖只在渲染时加载，批量计算引擎只在离线报表中使用，启动时都不导入
+    assert result["modules"] == [enabled]
+    enabled_endpoint, disabled_endpoint = (
+        ("/calculate_repair_time", "/generate_delivery_note") if enabled == "repair_time"
+        else ("/generate_delivery_note", "/calculate_repair_time")
+    )
+    assert enabled_endpoint in result["endpoints"] and disabled_endpoint not in result["endpoints"]
+    assert result["statuses"][disabled_endpoint] == 404
+    assert result["statuses"][enabled_endpoint] == 422
+
+
+def test_all_features_enabled_by_default():
+    result = run_main(ENABLE_REPAIR_TIME="1", ENABLE_DOCUMENTS="1")
+    assert result["modules"] == ["repair_time", "documents"]
+    assert {"/calculate_repair_time", "/generate_delivery_note", "/metrics"} <= set(result["endpoints"])
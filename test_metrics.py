@@ -0,0 +1,75 @@
+"""
+进程内运行指标单元测试
+
+运行：python -m pytest -q test_metrics.py
+"""
+
+import asyncio
+
+import httpx
+import pytest
+from fastapi import FastAPI
+
+from metrics import MetricsRegistry, RequestMetricsMiddleware
+
+
+def test_render_counter_histogram_and_callback():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "请求数", ("method",))
+    durations = registry.histogram("duration_seconds", "耗时", buckets=(0.1, 1.0))
+    registry.callback("cache_entries", "缓存条目数", "gauge", lambda: 3)
+    registry.callback("breaker_state", "熔断器状态", "gauge", lambda: [(("api",), 1)], ("name",))
+    requests.inc("GET")
+    requests.inc("GET", amount=2)
+    requests.inc('P"OST')
+    for value in (0.05, 0.1, 0.5, 2.0):
+        durations.observe(value)
+
+    lines = registry.render().splitlines()
+    assert lines[:4] == [
+        "# HELP requests_total 请求数",
+        "# TYPE requests_total counter",
+        'requests_total{method="GET"} 3',
+        'requests_total{method="P\\"OST"} 1',
+    ]
+    # 分桶按上限累计，边界值计入该分桶
+    assert lines[6:11] == [
+        'duration_seconds_bucket{le="0.1"} 2',
+        'duration_seconds_bucket{le="1"} 3',
+        'duration_seconds_bucket{le="+Inf"} 4',
+        "duration_seconds_sum 2.65",
+        "duration_seconds_count 4",
+    ]
+    assert "cache_entries 3" in lines
+    assert 'breaker_state{name="api"} 1' in lines
+
+
+def test_duplicate_metric_names_are_rejected():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "请求数")
+    with pytest.raises(ValueError):
+        registry.histogram("requests_total", "耗时")
+
+
+def test_middleware_labels_requests_by_route_template():
+    registry = MetricsRegistry()
+    requests = registry.counter("requests_total", "请求数", ("method", "path", "status"))
+    durations = registry.histogram("duration_seconds", "耗时", ("method", "path"))
+    app = FastAPI()
+
+    @app.get("/download/{file_name}")
+    async def download(file_name: str):
+        return file_name
+
+    app.add_middleware(RequestMetricsMiddleware, requests=requests, durations=durations)
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            for url in ("/download/a.docx", "/download/b.docx", "/missing/1", "/missing/2"):
+                await client.get(url)
+
+    asyncio.run(run())
+    text = registry.render()
+    assert 'requests_total{method="GET",path="/download/{file_name}",status="200"} 2' in text
+    assert 'requests_total{method="GET",path="unmatched",status="404"} 2' in text
+    assert 'duration_seconds_count{method="GET",path="/download/{file_name}"} 2' in text
@@ -0,0 +1,66 @@
+"""
+请求耗时分解与性能分析单元测试
+
+运行：python -m pytest -q test_request_timing.py
+"""
+
+import asyncio
+import os
+import pstats
+
+import httpx
+from fastapi import FastAPI
+
+from request_timing import ServerTimingMiddleware, record, span
+
+
+def timed_app(**options) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/work")
+    async def work():
+        with span("parse"):
+            pass
+        with span("parse"):
+            pass
+        record("render", 0.25)
+        return "ok"
+
+    app.add_middleware(ServerTimingMiddleware, **options)
+    return app
+
+
+def get(app: FastAPI, *requests):
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            return [await client.get(url, headers=headers) for url, headers in requests]
+
+    return asyncio.run(run())
+
+
+def test_server_timing_header_sums_spans():
+    response, = get(timed_app(), ("/work", {}))
+    parts = [part.split(";dur=") for part in response.headers["server-timing"].split(", ")]
+    assert [name for name, _ in parts] == ["parse", "render", "total"]
+    assert dict(parts)["render"] == "250.00"
+    assert "x-profile" not in response.headers
+
+
+def test_spans_outside_requests_are_ignored():
+    with span("parse"):
+        pass
+    record("render", 1.0)
+
+
+def test_profiled_requests_are_saved_and_pruned(tmp_path):
+    profile_dir = tmp_path / "profiles"
+    app = timed_app(profile_dir=str(profile_dir), profile_keep=2)
+    plain, *profiled = get(app, ("/work", {}), ("/work", {"x-profile": "1"}),
+                           ("/work?profile=1", {}), ("/work", {"x-profile": "1"}))
+    assert "x-profile" not in plain.headers
+    urls = [response.headers["x-profile"] for response in profiled]
+    assert all(url.startswith("/admin/profiles/") for url in urls)
+    # 只保留最近的两份分析结果
+    names = sorted(os.listdir(profile_dir))
+    assert len(names) == 2
+    assert pstats.Stats(str(profile_dir / names[-1])).total_calls > 0
@@ -0,0 +1,41 @@
+"""
+离线维修时长统计报表单元测试
+
+运行：python -m pytest -q test_sla_report.py
+"""
+
+import csv
+import io
+
+import pytest
+
+from sla_report import process_chunk
+from vector_engine import VectorWorkdayEngine
+from workday_calendar import load_calendar
+
+HEADER = ["order_id", "rep_ins_type", "rep_start_date", "quot_start_date"]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return VectorWorkdayEngine(load_calendar())
+
+
+def test_months_come_from_parsed_dispatch_time(engine):
+    rows = [
+        ["A1", "1", "2024-05-31 23:00:00", "2024-06-05 10:00:00"],
+        # ISO 基本格式：字符串前7位并不是年月
+        ["A2", "1", "20240603T0900", "20240605T1000"],
+        # 带时区的时间按其所在时区的日期归月
+        ["A3", "1", "2024-05-31T23:30:00-08:00", "2024-06-05T10:00:00-08:00"],
+        ["A4", "x", "2024-06-03", "2024-06-05"],
+    ]
+    text, aggregates, errors = process_chunk(HEADER, rows, engine)
+    assert errors == 1
+    assert aggregates == {
+        (1, "2024-05", "detection"): [2, 0, 0],
+        (1, "2024-06", "detection"): [1, 0, 0],
+    }
+    results = list(csv.reader(io.StringIO(text)))
+    assert [row[0] for row in results] == ["A1", "A2", "A3", "A4"]
+    assert results[1][len(HEADER)] == "3"
@@ -0,0 +1,88 @@
+"""
+维修时长统计存储单元测试
+
+运行：python -m pytest -q test_sla_store.py
+"""
+
+import asyncio
+
+import repair_time
+from sla_store import SLAStore
+
+
+def order(rep_ins_type=1, period="2024-05", detection_days=None, repair_days=None,
+          return_repair_days=None, estimated=False):
+    def overdue(days, limit):
+        return None if days is None else days > limit
+    return {
+        "rep_ins_type": rep_ins_type,
+        "period": period,
+        "estimated": estimated,
+        "detection_days": detection_days,
+        "is_detection_overdue": overdue(detection_days, 7),
+        "repair_days": repair_days,
+        "is_repair_overdue": overdue(repair_days, 10),
+        "return_repair_days": return_repair_days,
+        "is_return_repair_overdue": overdue(return_repair_days, 10),
+    }
+
+
+def counts(store, **filters):
+    return {(g["rep_ins_type"], g["stage"], g["period"]): (g["total"], g["overdue"], g["estimated"])
+            for g in store.query(**filters)}
+
+
+def test_aggregates_by_type_stage_and_month(tmp_path):
+    store = SLAStore(str(tmp_path))
+    store.record("A1", order(detection_days=5, repair_days=12))
+    store.record("A2", order(detection_days=9, estimated=True))
+    store.record("A3", order(rep_ins_type=3, period="2024-06", return_repair_days=4))
+    assert counts(store) == {
+        (1, "detection", "2024-05"): (2, 1, 1),
+        (1, "repair", "2024-05"): (1, 1, 0),
+        (3, "return_repair", "2024-06"): (1, 0, 0),
+    }
+    assert counts(store, period="2024-06") == {(3, "return_repair", "2024-06"): (1, 0, 0)}
+    assert len(store.query(period="2024")) == 3
+    assert store.query(period="2025") == []
+    assert counts(store, stage="repair", rep_ins_type=1) == {(1, "repair", "2024-05"): (1, 1, 0)}
+    store.close()
+
+
+def test_recording_an_order_again_replaces_its_contribution(tmp_path):
+    store = SLAStore(str(tmp_path))
+    store.record("A1", order(detection_days=9, estimated=True))
+    store.record("A1", order(detection_days=5, repair_days=3))
+    store.record("A1", order(period="2024-06", detection_days=5, repair_days=3))
+    assert counts(store) == {
+        (1, "detection", "2024-06"): (1, 0, 0),
+        (1, "repair", "2024-06"): (1, 0, 0),
+    }
+    assert store.get_order("A1")["is_detection_overdue"] is False
+    assert store.get_order("missing") is None
+    store.close()
+
+
+def test_workers_share_the_aggregates(tmp_path):
+    worker_1, worker_2 = SLAStore(str(tmp_path)), SLAStore(str(tmp_path))
+    worker_1.record("A1", order(detection_days=9))
+    worker_1.flush()
+    # 另一个进程更正同一工单时扣除的是第一个进程写入的结果
+    worker_2.record("A1", order(detection_days=5))
+    worker_2.flush()
+    assert counts(worker_1) == {(1, "detection", "2024-05"): (1, 0, 0)}
+    worker_1.close()
+    worker_2.close()
+
+
+def test_shutdown_flushes_and_closes_the_store(tmp_path, monkeypatch):
+    store = SLAStore(str(tmp_path))
+    store.record("A1", order(detection_days=5))
+    monkeypatch.setattr(repair_time, "_sla_store", store)
+    asyncio.run(repair_time.shutdown())
+    assert not store._writer.is_alive()
+
+    # 模拟服务重启
+    restarted = SLAStore(str(tmp_path))
+    assert counts(restarted) == {(1, "detection", "2024-05"): (1, 0, 0)}
+    restarted.close()
@@ -0,0 +1,62 @@
+"""
+文档模板注册表单元测试
+
+运行：python -m pytest -q test_template_registry.py
+"""
+
+import io
+import os
+
+import docx
+import pytest
+
+import documents
+from template_registry import TemplateRegistry
+
+
+def write_template(path, text: str) -> None:
+    document = docx.Document()
+    document.add_paragraph(text)
+    document.save(str(path))
+
+
+def render_text(registry: TemplateRegistry, name: str, context: dict) -> str:
+    template = registry.get(name)
+    template.render(context)
+    buffer = io.BytesIO()
+    template.save(buffer)
+    return docx.Document(io.BytesIO(buffer.getvalue())).paragraphs[0].text
+
+
+def test_template_is_parsed_once(tmp_path):
+    write_template(tmp_path / "t.docx", "客户：{{ name }}")
+    registry = TemplateRegistry(str(tmp_path))
+    assert render_text(registry, "t.docx", {"name": "甲"}) == "客户：甲"
+    assert render_text(registry, "t.docx", {"name": "乙"}) == "客户：乙"
+    assert registry.loads == 1 and registry.reloads == 0
+    assert registry.stats()["templates"] == {"t.docx": {"renders": 2}}
+
+
+def test_modified_template_is_reloaded(tmp_path):
+    path = tmp_path / "t.docx"
+    write_template(path, "旧版：{{ name }}")
+    registry = TemplateRegistry(str(tmp_path))
+    assert render_text(registry, "t.docx", {"name": "甲"}) == "旧版：甲"
+    old_signature = registry._entries["t.docx"].signature
+    old_version = documents.template_version(str(path))
+
+    write_template(path, "新版：{{ name }}")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, old_signature[0] + 1_000_000_000))
+
+    assert render_text(registry, "t.docx", {"name": "甲"}) == "新版：甲"
+    assert registry.loads == 2 and registry.reloads == 1
+    assert registry._entries["t.docx"].signature != old_signature
+    # 生成文件的去重键随模板内容变化
+    assert documents.template_version(str(path)) != old_version
+
+
+def test_missing_template(tmp_path):
+    registry = TemplateRegistry(str(tmp_path))
+    with pytest.raises(FileNotFoundError, match="missing.docx"):
+        registry.get("missing.docx")
@@ -0,0 +1,97 @@
+"""
+向量化批量计算引擎单元测试
+
+随机生成的时间区间与工单分别交给向量化引擎与接口使用的逐条计算，结果必须一致。
+工作日API在测试中处于熔断状态：日历覆盖的区间两边都按日历计算，其余按仅排除周末估算。
+
+运行：python -m pytest -q test_vector_engine.py
+"""
+
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+import repair_time
+from repair_rules import SLA_STAGES
+from vector_engine import VectorWorkdayEngine, parse_datetime_column
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return VectorWorkdayEngine(repair_time.get_workday_calendar())
+
+
+@pytest.fixture
+def api_unavailable():
+    repair_time._workday_cache.clear()
+    repair_time._workday_api_breaker._open()
+    yield
+    repair_time._workday_api_breaker.record_success()
+    repair_time._workday_cache.clear()
+
+
+def random_times(rng: random.Random, count: int):
+    starts, ends = [], []
+    for _ in range(count):
+        # 跨越日历覆盖范围的边界，包含结束早于开始的区间
+        start = datetime(2023, 6, 1) + timedelta(minutes=rng.randrange(60 * 24 * 365 * 5))
+        starts.append(start)
+        ends.append(start + timedelta(minutes=rng.randrange(-60 * 24 * 5, 60 * 24 * 60)))
+    return starts, ends
+
+
+def test_count_matches_scalar(engine, api_unavailable):
+    starts, ends = random_times(random.Random(5), 2000)
+    counts, estimated = engine.count(np.array(starts, dtype="datetime64[s]"), np.array(ends, dtype="datetime64[s]"))
+
+    async def scalar():
+        return [await repair_time.calculate_workdays_detailed(start, end) for start, end in zip(starts, ends)]
+
+    expected = asyncio.run(scalar())
+    assert [(int(count), bool(flag)) for count, flag in zip(counts, estimated)] == expected
+
+
+def test_compute_matches_compute_repair_time(engine, api_unavailable):
+    rng = random.Random(6)
+    starts, ends = random_times(rng, 600)
+    records = []
+    for start, end in zip(starts, ends):
+        middle = start + (end - start) / 2
+        record = {"rep_ins_type": rng.choice([1, 2, 3]), "rep_start_date": start.strftime("%Y-%m-%d %H:%M:%S")}
+        for field, value in (("quot_start_date", middle), ("detec_start_date", middle), ("qc_start_time", end)):
+            if rng.random() < 0.7:
+                record[field] = value.strftime("%Y-%m-%d %H:%M:%S")
+        records.append(record)
+
+    def column(field):
+        return [record.get(field) for record in records]
+
+    result = engine.compute(column("rep_ins_type"), column("rep_start_date"), column("quot_start_date"),
+                            column("detec_start_date"), column("qc_start_time"))
+
+    async def scalar():
+        return [await repair_time.compute_repair_time(repair_time.RepairTimeCalculationRequest(**record))
+                for record in records]
+
+    for i, expected in enumerate(asyncio.run(scalar())):
+        assert result["error"][i] is None
+        for _, days_field, overdue_field in SLA_STAGES:
+            days = result[days_field][i]
+            assert (None if days is np.ma.masked else int(days)) == getattr(expected, days_field), records[i]
+            overdue = result[overdue_field][i]
+            assert (None if overdue is np.ma.masked else bool(overdue)) == getattr(expected, overdue_field)
+        assert bool(result["estimated"][i]) == (repair_time.LOCAL_FALLBACK_MARK in expected.message)
+        assert result["period"][i] == records[i]["rep_start_date"][:7]
+
+
+def test_parse_datetime_column():
+    column = parse_datetime_column(["2025-03-03", "2025-03-03 09:30:00", "2025-03-03T09:30:00+08:00",
+                                    None, "", "03/03/2025"])
+    assert column.present.tolist() == [True, True, True, False, False, True]
+    assert column.aware.tolist() == [False, False, True, False, False, False]
+    assert str(column.wall[2]) == "2025-03-03T09:30:00"
+    assert str(column.instant[2]) == "2025-03-03T01:30:00"
+    assert [error is None for error in column.errors] == [True, True, True, True, True, False]
@@ -0,0 +1,91 @@
+"""
+工作日查询缓存单元测试
+
+运行：python -m pytest -q test_workday_cache.py
+"""
+
+import asyncio
+import sqlite3
+import time
+
+import pytest
+
+from workday_cache import SQLiteWorkdayStore, WorkdayCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_lru_eviction():
+    cache = WorkdayCache(max_size=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # a 变为最近使用
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+    assert cache.stats()["hits"] == 3 and cache.stats()["misses"] == 1
+
+
+def test_ttl_expiry():
+    clock = FakeClock()
+    cache = WorkdayCache(max_size=10, ttl=60, clock=clock)
+    cache.set("a", 1)
+    clock.now += 59
+    assert cache.get("a") == 1
+    clock.now += 1
+    assert cache.get("a") is None
+    assert cache.expirations == 1 and len(cache) == 0
+
+
+def test_invalidate_where_and_clear():
+    cache = WorkdayCache(max_size=10)
+    for key in ("2024-01-01_2024-12-31", "2024-12-01_2025-01-31", "2025-03-01_2025-03-31"):
+        cache.set(key, 1)
+    assert cache.invalidate_where(lambda key: key.startswith("2024")) == 2
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_invalid_max_size():
+    with pytest.raises(ValueError):
+        WorkdayCache(max_size=0)
+
+
+def test_backend_read_through_and_warm(tmp_path):
+    writer = WorkdayCache(max_size=10, ttl=60, backend=SQLiteWorkdayStore(str(tmp_path)))
+    writer.set("a", 5)
+    writer.set("b", 6)
+    writer.close()
+    assert writer.backend is None
+
+    reader = WorkdayCache(max_size=10, ttl=60, backend=SQLiteWorkdayStore(str(tmp_path)))
+    assert asyncio.run(reader.aget("a")) == 5
+    assert reader.backend_hits == 1 and len(reader) == 1
+    assert asyncio.run(reader.aget("missing")) is None
+    assert reader.misses == 1
+    assert reader.warm() == 2 and len(reader) == 2
+
+    assert reader.invalidate_where(lambda key: key == "b") == 1
+    assert reader.backend.keys() == ["a"]
+    reader.close()
+
+
+def test_expired_rows_are_purged_on_open(tmp_path):
+    store = SQLiteWorkdayStore(str(tmp_path))
+    store.put("expired", 1, time.time() - 1)
+    store.put("valid", 2, time.time() + 60)
+    store.put("forever", 3, None)
+    store.close()
+
+    SQLiteWorkdayStore(str(tmp_path)).close()
+    conn = sqlite3.connect(str(tmp_path / SQLiteWorkdayStore.FILE_NAME))
+    assert sorted(row[0] for row in conn.execute("SELECT key FROM workdays")) == ["forever", "valid"]
+    conn.close()
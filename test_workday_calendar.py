@@ -0,0 +1,190 @@
+"""
+本地工作日历单元测试
+
+工作日数量统一按日期闭区间 [起始日, 结束日] 计算：本地日历、二进制日历、工作日API与仅排除周末的本地估算
+对同一形状的区间必须给出相同的结果。
+
+运行：python -m pytest -q test_workday_calendar.py
+"""
+
+import asyncio
+import random
+from datetime import date, datetime, timedelta
+
+import httpx
+import pytest
+
+import repair_time
+from workday_calendar import (
+    MappedWorkdayCalendar,
+    WorkdayCalendar,
+    count_weekdays,
+    derive_year,
+    load_calendar,
+    write_binary_calendar,
+)
+
+
+@pytest.fixture(scope="module")
+def calendar():
+    return load_calendar()
+
+
+def brute_force_count(calendar: WorkdayCalendar, start_day: date, end_day: date) -> int:
+    return sum(calendar.is_workday(start_day + timedelta(days=i)) for i in range((end_day - start_day).days + 1))
+
+
+def test_count_is_closed_interval(calendar):
+    # 2025-03-03 为周一，2025-03-07 为周五
+    assert calendar.count(date(2025, 3, 3), date(2025, 3, 7)) == 5
+    assert calendar.count(datetime(2025, 3, 3, 9), datetime(2025, 3, 7, 17)) == 5
+    assert calendar.count(date(2025, 3, 3), date(2025, 3, 3)) == 1
+    assert calendar.count(date(2025, 3, 8), date(2025, 3, 9)) == 0
+    assert calendar.count(date(2025, 3, 7), date(2025, 3, 3)) == 0
+
+
+def test_count_matches_daily_flags(calendar):
+    rng = random.Random(1)
+    first_day = date(min(calendar.covered_years), 1, 1)
+    last_day = date(max(calendar.covered_years), 12, 31)
+    span = (last_day - first_day).days
+    for _ in range(500):
+        start_day = first_day + timedelta(days=rng.randrange(span + 1))
+        end_day = start_day + timedelta(days=rng.randrange(min(120, (last_day - start_day).days + 1)))
+        assert calendar.count(start_day, end_day) == brute_force_count(calendar, start_day, end_day)
+
+
+def test_count_up_to_last_covered_day(calendar):
+    last_day = date(max(calendar.covered_years), 12, 31)
+    assert calendar.count(last_day, last_day) == int(calendar.is_workday(last_day))
+    with pytest.raises(KeyError):
+        calendar.count(last_day, last_day + timedelta(days=1))
+
+
+def test_mapped_calendar_matches(calendar, tmp_path):
+    path = str(tmp_path / "calendar.bin")
+    write_binary_calendar(calendar, path)
+    mapped = MappedWorkdayCalendar(path)
+    rng = random.Random(2)
+    for _ in range(200):
+        start_day = date(2024, 1, 1) + timedelta(days=rng.randrange(1000))
+        end_day = start_day + timedelta(days=rng.randrange(60))
+        if not calendar.covers(start_day, end_day):
+            continue
+        assert mapped.count(start_day, end_day) == calendar.count(start_day, end_day)
+        assert mapped.add_workdays(start_day, 7) == calendar.add_workdays(start_day, 7)
+
+
+def test_missing_binary_calendar_is_built_once_until_published(calendar, tmp_path, monkeypatch, caplog):
+    path = str(tmp_path / "calendar.bin")
+    builds = []
+
+    def counting_load_calendar(paths):
+        builds.append(paths)
+        return calendar
+
+    monkeypatch.setattr(repair_time, "load_calendar", counting_load_calendar)
+    monkeypatch.setattr(repair_time, "WORKDAY_CALENDAR_BINARY", path)
+    monkeypatch.setattr(repair_time, "WORKDAY_CALENDAR_CHECK_INTERVAL", 0)
+    # 测试结束后恢复当前日历
+    monkeypatch.setattr(repair_time, "_workday_calendar", repair_time._workday_calendar)
+    monkeypatch.setattr(repair_time, "_calendar_binary_signature", repair_time._calendar_binary_signature)
+
+    repair_time.reload_workday_calendar()
+    for _ in range(5):
+        assert repair_time.get_workday_calendar() is calendar
+    assert len(builds) == 1
+    assert sum("不存在" in record.getMessage() for record in caplog.records) == 1
+
+    write_binary_calendar(calendar, path)
+    assert isinstance(repair_time.get_workday_calendar(), MappedWorkdayCalendar)
+    assert len(builds) == 1
+
+
+def test_add_workdays_returns_nth_workday(calendar):
+    assert calendar.add_workdays(date(2025, 3, 3), 5) == date(2025, 3, 7)
+    # 周六开始：第1个工作日为下周一
+    assert calendar.add_workdays(date(2025, 3, 8), 1) == date(2025, 3, 10)
+    assert calendar.add_workdays(date(2025, 3, 8), 0) == date(2025, 3, 8)
+    rng = random.Random(3)
+    for _ in range(300):
+        start_day = date(2024, 1, 1) + timedelta(days=rng.randrange(600))
+        workdays = rng.randrange(1, 30)
+        due_day = calendar.add_workdays(start_day, workdays)
+        assert calendar.is_workday(due_day)
+        assert calendar.count(start_day, due_day) == workdays
+        assert calendar.count(start_day, due_day - timedelta(days=1)) == workdays - 1
+
+
+def test_weekend_only_calendar_matches_count_weekdays():
+    calendar = WorkdayCalendar({2030: {}})
+    rng = random.Random(4)
+    for _ in range(300):
+        start_day = date(2030, 1, 1) + timedelta(days=rng.randrange(300))
+        end_day = start_day + timedelta(days=rng.randrange(60))
+        assert calendar.count(start_day, end_day) == count_weekdays(start_day, end_day)
+        workdays = rng.randrange(0, 20)
+        assert repair_time.add_workdays_local(start_day, workdays) == calendar.add_workdays(start_day, workdays)
+
+
+def inclusive_workday_api(request: httpx.Request) -> httpx.Response:
+    """与真实工作日API相同，返回 [startDate, endDate] 闭区间内的工作日数量（此处不含节假日）"""
+    start_day = date.fromisoformat(request.url.params["startDate"])
+    end_day = date.fromisoformat(request.url.params["endDate"])
+    return httpx.Response(200, json={"code": 200, "msg": "success", "data": count_weekdays(start_day, end_day)})
+
+
+def failing_workday_api(request: httpx.Request) -> httpx.Response:
+    return httpx.Response(500)
+
+
+async def detailed(handler, start: datetime, end: datetime):
+    repair_time._workday_cache.clear()
+    repair_time._workday_api_breaker.record_success()
+    repair_time._http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    try:
+        return await repair_time.calculate_workdays_detailed(start, end)
+    finally:
+        await repair_time._http_client.aclose()
+        repair_time._http_client = None
+        repair_time._workday_cache.clear()
+
+
+@pytest.mark.parametrize("start_time, end_time", [(9, 17), (17, 9), (0, 0)])
+def test_calendar_api_and_fallback_agree(start_time, end_time):
+    # 同为周一至周五且均无节假日的一周：2025 年由日历计算，2030 年由API或本地估算计算
+    covered = (datetime(2025, 3, 3, start_time), datetime(2025, 3, 7, end_time))
+    uncovered = (datetime(2030, 3, 4, start_time), datetime(2030, 3, 8, end_time))
+
+    from_calendar = asyncio.run(detailed(inclusive_workday_api, *covered))
+    from_api = asyncio.run(detailed(inclusive_workday_api, *uncovered))
+    from_fallback = asyncio.run(detailed(failing_workday_api, *uncovered))
+
+    assert from_calendar == (5, False)
+    assert from_api == (5, False)
+    assert from_fallback == (5, True)
+    assert repair_time.calculate_workdays_local(*uncovered) == 5
+
+
+def test_multi_year_segments_do_not_overlap():
+    start, end = datetime(2029, 6, 3, 9), datetime(2031, 2, 14, 17)
+    expected = count_weekdays(start.date(), end.date())
+    assert asyncio.run(detailed(inclusive_workday_api, start, end)) == (expected, False)
+    assert asyncio.run(detailed(failing_workday_api, start, end)) == (expected, True)
+
+
+def test_bootstrap_derives_calendar_from_inclusive_counts(calendar):
+    # 以日历本身作为闭区间的工作日API，引导推导出的逐日工作日标记应与日历一致
+    # （日历中落在周末的放假日不影响计数，推导结果中不包含）
+    derived = WorkdayCalendar({2025: derive_year(2025, calendar.count)})
+    day = date(2025, 1, 1)
+    while day.year == 2025:
+        assert derived.is_workday(day) == calendar.is_workday(day), day
+        day += timedelta(days=1)
+
+
+def test_count_weekdays_is_closed_interval():
+    assert count_weekdays(date(2030, 3, 4), date(2030, 3, 8)) == 5
+    assert count_weekdays(date(2030, 3, 4), date(2030, 3, 4)) == 1
+    assert count_weekdays(date(2030, 3, 9), date(2030, 3, 10)) == 0
+    assert count_weekdays(date(2030, 3, 8), date(2030, 3, 4)) == 0
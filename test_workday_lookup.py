@@ -0,0 +1,137 @@
+"""
+工作日API查询单元测试
+
+上游工作日API由 httpx.MockTransport 模拟，查询日历未覆盖的 2030 年。
+
+运行：python -m pytest -q test_workday_lookup.py
+"""
+
+import asyncio
+from datetime import date, datetime
+
+import httpx
+import pytest
+
+import repair_time
+from workday_calendar import count_weekdays
+
+
+class FakeWorkdayAPI:
+    """闭区间计数的模拟工作日API，可设置响应延迟与失败"""
+
+    def __init__(self, delay: float = 0.0, fail: bool = False):
+        self.delay = delay
+        self.fail = fail
+        self.requests = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            return httpx.Response(500)
+        start_day = date.fromisoformat(request.url.params["startDate"])
+        end_day = date.fromisoformat(request.url.params["endDate"])
+        return httpx.Response(200, json={"code": 200, "msg": "success", "data": count_weekdays(start_day, end_day)})
+
+
+@pytest.fixture
+def use_api():
+    """返回一个函数，把模拟API设置为 repair_time 使用的上游；测试结束后恢复初始状态"""
+    def install(api: FakeWorkdayAPI) -> FakeWorkdayAPI:
+        repair_time._http_client = httpx.AsyncClient(transport=httpx.MockTransport(api))
+        return api
+
+    repair_time._workday_cache.clear()
+    repair_time._workday_api_breaker.record_success()
+    stats = dict(repair_time._lookup_stats)
+    yield install
+    if repair_time._http_client is not None:
+        asyncio.run(repair_time._http_client.aclose())
+    repair_time._http_client = None
+    repair_time._workday_api_breaker.record_success()
+    repair_time._workday_cache.clear()
+    repair_time._lookup_stats.update(stats)
+
+
+START = datetime(2030, 3, 4, 9)
+END = datetime(2030, 3, 15, 17)
+
+
+def test_concurrent_identical_lookups_share_one_call(use_api):
+    api = use_api(FakeWorkdayAPI(delay=0.05))
+    before = dict(repair_time._lookup_stats)
+
+    async def lookups():
+        return await asyncio.gather(*(repair_time.calculate_workdays_detailed(START, END) for _ in range(10)))
+
+    assert asyncio.run(lookups()) == [(10, False)] * 10
+    assert api.requests == 1
+    assert repair_time._lookup_stats["upstream_calls"] - before["upstream_calls"] == 1
+    assert repair_time._lookup_stats["coalesced"] - before["coalesced"] == 9
+    assert not repair_time._inflight_lookups
+
+    # 结果已缓存，之后的查询不再调用API
+    assert asyncio.run(repair_time.calculate_workdays_detailed(START, END)) == (10, False)
+    assert api.requests == 1
+
+
+def test_different_ranges_are_not_coalesced(use_api):
+    api = use_api(FakeWorkdayAPI(delay=0.01))
+
+    async def lookups():
+        return await asyncio.gather(repair_time.calculate_workdays_detailed(START, END),
+                                    repair_time.calculate_workdays_detailed(START, datetime(2030, 3, 8)))
+
+    assert asyncio.run(lookups()) == [(10, False), (5, False)]
+    assert api.requests == 2
+
+
+def test_failures_open_the_breaker_and_skip_the_api(use_api, monkeypatch):
+    api = use_api(FakeWorkdayAPI(fail=True))
+    breaker = repair_time._workday_api_breaker
+    monkeypatch.setattr(breaker, "probe", None)
+
+    async def lookups():
+        results = []
+        for day in range(1, breaker.failure_threshold + 4):
+            results.append(await repair_time.calculate_workdays_detailed(datetime(2030, 4, day), datetime(2030, 4, 20)))
+        return results
+
+    results = asyncio.run(lookups())
+    assert all(estimated for _, estimated in results)
+    assert [workdays for workdays, _ in results] == [
+        count_weekdays(date(2030, 4, day), date(2030, 4, 20)) for day in range(1, breaker.failure_threshold + 4)
+    ]
+    assert breaker.state == breaker.OPEN
+    assert api.requests == breaker.failure_threshold
+
+
+def test_slow_api_is_cut_off_by_latency_budget(use_api, monkeypatch):
+    api = use_api(FakeWorkdayAPI(delay=1.0))
+    monkeypatch.setattr(repair_time, "WORKDAY_API_LATENCY_BUDGET", 0.05)
+
+    async def lookup():
+        started = asyncio.get_running_loop().time()
+        result = await repair_time.calculate_workdays_detailed(START, END)
+        return result, asyncio.get_running_loop().time() - started
+
+    (workdays, estimated), elapsed = asyncio.run(lookup())
+    assert (workdays, estimated) == (10, True)
+    assert elapsed < 0.5
+    assert api.requests == 1
+
+
+def test_multi_year_segments_share_one_budget(use_api, monkeypatch):
+    api = use_api(FakeWorkdayAPI(delay=0.2))
+    monkeypatch.setattr(repair_time, "WORKDAY_API_LATENCY_BUDGET", 0.3)
+
+    async def lookup():
+        started = asyncio.get_running_loop().time()
+        result = await repair_time.calculate_workdays_detailed(datetime(2029, 6, 3), datetime(2031, 2, 14))
+        return result, asyncio.get_running_loop().time() - started
+
+    (workdays, estimated), elapsed = asyncio.run(lookup())
+    assert workdays == count_weekdays(date(2029, 6, 3), date(2031, 2, 14)) and estimated
+    # 三个分段逐个查询：第一段用掉大部分预算，第二段超时，第三段不再调用API
+    assert elapsed < 0.6
+    assert api.requests == 2
@@ -0,0 +1,209 @@
+"""
+向量化工作日计算引擎
+
+以列为单位批量计算维修各阶段的工作日时长与超期标记，用于月末重算等大批量场景。
+工作日数量通过本地工作日历的序号前缀和数组查表得到，与 /calculate_repair_time 的计算结果一致；
+日历未覆盖的区间按仅排除周末的本地规则计算（与接口的备用方案一致），并在 estimated 列中标记。
+"""
+
+from datetime import timezone
+from typing import Dict, NamedTuple, Optional, Sequence, Tuple
+
+import numpy as np
+
+from repair_rules import (
+    DETECTION_DAYS_LIMIT,
+    REPAIR_DAYS_LIMIT,
+    RETURN_REPAIR_DAYS_LIMIT,
+    RETURN_REPAIR_TYPE,
+    parse_datetime,
+)
+from workday_calendar import WorkdayCalendar
+
+
+class DatetimeColumn(NamedTuple):
+    """解析后的日期时间列
+
+    wall: 当地时间（带时区的值取其所在时区的时间），用于确定日期
+    instant: 用于比较先后与计算时长的时间，带时区的值换算为UTC，不带时区的值与 wall 相同
+    present: 是否有值（None 或空字符串视为无值）
+    aware: 是否带时区
+    errors: 解析错误信息，无错误为 None
+    """
+    wall: np.ndarray
+    instant: np.ndarray
+    present: np.ndarray
+    aware: np.ndarray
+    errors: np.ndarray
+
+
+def parse_datetime_column(values: Sequence) -> DatetimeColumn:
+    """批量解析日期时间列
+
+    形如 YYYY-MM-DD 与 YYYY-MM-DD HH:MM:SS 的值整体交给 numpy 解析，其余逐个使用 parse_datetime。
+    """
+    column = np.asarray(values, dtype=object)
+    wall = np.full(len(column), np.datetime64("NaT"), dtype="datetime64[s]")
+    aware = np.zeros(len(column), dtype=bool)
+    errors = np.full(len(column), None, dtype=object)
+    present = np.frompyfunc(bool, 1, 1)(column).astype(bool) if len(column) else np.zeros(0, dtype=bool)
+
+    indices = np.flatnonzero(present)
+    if not len(indices):
+        return DatetimeColumn(wall, wall.copy(), present, aware, errors)
+
+    texts = column[indices].astype(str)
+    lengths = np.char.str_len(texts)
+    simple = lengths == 10
+    if texts.dtype.itemsize >= 19 * 4:
+        # 按 UCS4 码点查看第11个字符，判断日期与时间之间的分隔符
+        codepoints = texts.view(np.uint32).reshape(len(texts), -1)
+        simple |= (lengths == 19) & np.isin(codepoints[:, 10], [ord(" "), ord("T")])
+
+    remaining = indices[~simple]
+    if simple.any():
+        try:
+            wall[indices[simple]] = texts[simple].astype("datetime64[s]")
+        except ValueError:
+            remaining = indices
+
+    instant = wall.copy()
+    for i in remaining:
+        try:
+            value = parse_datetime(str(column[i]))
+        except ValueError as e:
+            errors[i] = f"日期格式错误: {column[i]} ({e})"
+            continue
+        wall[i] = np.datetime64(value.replace(tzinfo=None), "s")
+        if value.tzinfo is not None:
+            aware[i] = True
+            instant[i] = np.datetime64(value.astimezone(timezone.utc).replace(tzinfo=None), "s")
+        else:
+            instant[i] = wall[i]
+
+    return DatetimeColumn(wall, instant, present, aware, errors)
+
+
+class VectorWorkdayEngine:
+    """基于工作日历前缀和数组的向量化工作日计算"""
+
+    def __init__(self, calendar: WorkdayCalendar):
+        self.calendar = calendar
+        self._size = len(calendar.flags)
+        if calendar.first_day is not None:
+            self._first_day = np.datetime64(calendar.first_day, "D")
+            self._ordinals = np.asarray(calendar.ordinals, dtype=np.int64)
+            # 逐日标记所在年份是否被覆盖，并计算未覆盖天数的前缀和，用于判断区间是否完全被覆盖
+            days = self._first_day + np.arange(self._size)
+            years = days.astype("datetime64[Y]").astype(np.int64) + 1970
+            uncovered = ~np.isin(years, sorted(calendar.covered_years))
+            self._uncovered = np.concatenate(([0], np.cumsum(uncovered, dtype=np.int64)))
+        else:
+            self._first_day = None
+
+    def count(self, start: np.ndarray, end: np.ndarray, start_instant: Optional[np.ndarray] = None,
+              end_instant: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """计算每一行 [start, end] 之间的工作日数量（按日期计，包含起始日与结束日），返回 (工作日数量, 是否按本地规则估算)
+
+        start/end 为当地时间，用于确定日期；start_instant/end_instant 用于比较先后与计算时长，
+        省略时与 start/end 相同。起止时间先后颠倒或任一端为空时为0。
+        """
+        start = np.asarray(start, dtype="datetime64[s]")
+        end = np.asarray(end, dtype="datetime64[s]")
+        start_instant = start if start_instant is None else np.asarray(start_instant, dtype="datetime64[s]")
+        end_instant = end if end_instant is None else np.asarray(end_instant, dtype="datetime64[s]")
+        counts = np.zeros(len(start), dtype=np.int64)
+        estimated = np.zeros(len(start), dtype=bool)
+
+        positive = ~np.isnat(start_instant) & ~np.isnat(end_instant)
+        positive[positive] = end_instant[positive] > start_instant[positive]
+        if not positive.any():
+            return counts, estimated
+
+        start_day = start.astype("datetime64[D]")
+        end_day = end.astype("datetime64[D]")
+
+        covered = np.zeros(len(start), dtype=bool)
+        if self._first_day is not None:
+            start_index = (start_day - self._first_day).astype(np.int64)
+            # 闭区间 [起始日, 结束日] 对应前缀和数组的 [start_index, end_index + 1)
+            end_index = (end_day - self._first_day).astype(np.int64) + 1
+            # 结束日早于起始日（带时区的值换算后）时只要求起始日所在年份被覆盖
+            check_end = np.maximum(end_index, start_index + 1)
+            in_range = positive & (start_index >= 0) & (check_end <= self._size)
+            lo = np.clip(start_index, 0, self._size)
+            hi = np.clip(check_end, 0, self._size)
+            covered = in_range & (self._uncovered[hi] == self._uncovered[lo])
+
+            diff = self._ordinals[hi] - self._ordinals[lo]
+            counts[covered] = np.where(end_day >= start_day, diff, 0)[covered]
+
+        # 日历未覆盖的区间：与 calculate_workdays_local 相同，按日期闭区间仅排除周末
+        local = positive & ~covered
+        if local.any():
+            counts[local] = np.busday_count(start_day[local], np.maximum(end_day[local] + 1, start_day[local]))
+            estimated[local] = True
+
+        return counts, estimated
+
+    def compute(self, rep_ins_type: Sequence[int], rep_start_date: Sequence, quot_start_date: Sequence,
+                detec_start_date: Sequence, qc_start_time: Sequence) -> Dict[str, np.ndarray]:
+        """按维修规则批量计算，列名与 RepairTimeResult 字段一致
+
+        工作日时长与超期标记以 numpy 掩码数组返回，不适用的阶段被掩码；
+        另返回 estimated（是否有阶段按本地规则估算）、error（日期解析错误，无错误为 None）
+        与 period（由解析后的派工时间确定的月份 YYYY-MM，与维修时长统计存储的口径一致，无法解析时为空）三列。
+        """
+        types = np.asarray(rep_ins_type, dtype=np.int64)
+        rep_start = parse_datetime_column(rep_start_date)
+        quot_start = parse_datetime_column(quot_start_date)
+        detec_start = parse_datetime_column(detec_start_date)
+        qc_start = parse_datetime_column(qc_start_time)
+
+        normal = types != RETURN_REPAIR_TYPE
+        detection_rows = normal & quot_start.present
+        repair_rows = normal & qc_start.present & detec_start.present
+        return_repair_rows = ~normal & qc_start.present
+
+        # 只有参与计算的字段解析失败才算错误，与接口逐条计算时的行为一致
+        errors = np.where(rep_start.present, rep_start.errors, "rep_start_date 缺失")
+        for rows, column in ((detection_rows, quot_start), (repair_rows, detec_start),
+                             (repair_rows | return_repair_rows, qc_start)):
+            use = rows & np.equal(errors, None) & ~np.equal(column.errors, None)
+            errors[use] = column.errors[use]
+        # 带时区与不带时区的时间无法比较先后
+        for rows, start, end in ((detection_rows, rep_start, quot_start), (repair_rows, detec_start, qc_start),
+                                 (return_repair_rows, rep_start, qc_start)):
+            use = rows & np.equal(errors, None) & (start.aware != end.aware)
+            errors[use] = "带时区与不带时区的时间无法比较"
+        failed = ~np.equal(errors, None)
+
+        detection_days, detection_estimated = self.count(rep_start.wall, quot_start.wall,
+                                                         rep_start.instant, quot_start.instant)
+        repair_days, repair_estimated = self.count(detec_start.wall, qc_start.wall,
+                                                   detec_start.instant, qc_start.instant)
+        return_repair_days, return_repair_estimated = self.count(rep_start.wall, qc_start.wall,
+                                                                 rep_start.instant, qc_start.instant)
+
+        detection_mask = ~detection_rows | failed
+        repair_mask = ~repair_rows | failed
+        return_repair_mask = ~return_repair_rows | failed
+
+        estimated = ((detection_estimated & ~detection_mask)
+                     | (repair_estimated & ~repair_mask)
+                     | (return_repair_estimated & ~return_repair_mask))
+
+        return {
+            "rep_ins_type": types,
+            "detection_days": np.ma.array(detection_days, mask=detection_mask),
+            "repair_days": np.ma.array(repair_days, mask=repair_mask),
+            "return_repair_days": np.ma.array(return_repair_days, mask=return_repair_mask),
+            "is_detection_overdue": np.ma.array(detection_days > DETECTION_DAYS_LIMIT, mask=detection_mask),
+            "is_repair_overdue": np.ma.array(repair_days > REPAIR_DAYS_LIMIT, mask=repair_mask),
+            "is_return_repair_overdue": np.ma.array(return_repair_days > RETURN_REPAIR_DAYS_LIMIT,
+                                                    mask=return_repair_mask),
+            "estimated": estimated,
+            "error": errors,
+            "period": np.where(np.isnat(rep_start.wall), "",
+                               np.datetime_as_string(rep_start.wall.astype("datetime64[M]"))).astype(object),
+        }
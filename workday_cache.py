@@ -0,0 +1,317 @@
+"""
+工作日查询缓存
+
+容量有上限的 LRU 缓存，每个条目带有过期时间，并统计命中、未命中、淘汰与过期次数。
+可选挂载 SQLite 持久化存储：内存未命中时读穿到磁盘，新结果由后台线程批量写入，
+服务重启后缓存内容不会丢失。读写持久化存储的方法会阻塞，在事件循环中使用 aget，
+其他方法放到线程池中执行。
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class SQLiteWorkdayStore:
+    """基于 SQLite 的工作日缓存持久化存储
+
+    使用 WAL 模式与忙等待超时，多个 uvicorn worker 进程可以同时打开同一个数据库文件。
+    写入通过队列交给后台线程批量提交（write-behind），不阻塞请求处理。
+    过期时间使用墙上时间，以便跨进程、跨重启保持一致。
+    """
+
+    FILE_NAME = "workday_cache.sqlite3"
+    # 打开时与之后每隔该秒数（有写入时）删除一次已过期的条目，避免数据库文件只增不减
+    PURGE_INTERVAL = 3600
+
+    def __init__(self, directory: str, busy_timeout: float = 5.0):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, self.FILE_NAME)
+        self._busy_timeout = busy_timeout
+        self._read_lock = threading.Lock()
+        self._reader = self._connect()
+        with self._reader:
+            self._reader.execute(
+                "CREATE TABLE IF NOT EXISTS workdays ("
+                "key TEXT PRIMARY KEY, value INTEGER NOT NULL, expires_at REAL)"
+            )
+        self.purge_expired()
+
+        self._queue: "queue.Queue[Optional[Tuple[str, int, Optional[float]]]]" = queue.Queue()
+        self._writer = threading.Thread(target=self._write_loop, name="workday-cache-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=self._busy_timeout, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def get(self, key: str) -> Optional[Tuple[int, Optional[float]]]:
+        """读取条目，返回 (工作日数量, 过期时间)，不存在或已过期时返回 None"""
+        with self._read_lock:
+            row = self._reader.execute(
+                "SELECT value, expires_at FROM workdays WHERE key = ?", (key,)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row[0], row[1]
+
+    def put(self, key: str, value: int, expires_at: Optional[float]) -> None:
+        """异步写入条目"""
+        self._queue.put((key, value, expires_at))
+
+    def load(self, limit: int) -> List[Tuple[str, int, Optional[float]]]:
+        """加载最多 limit 个未过期条目，用于启动时预热内存缓存"""
+        with self._read_lock:
+            return self._reader.execute(
+                "SELECT key, value, expires_at FROM workdays "
+                "WHERE expires_at IS NULL OR expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), limit),
+            ).fetchall()
+
+    def purge_expired(self) -> int:
+        """删除已过期的条目，返回删除数量"""
+        with self._read_lock, self._reader:
+            return self._reader.execute(
+                "DELETE FROM workdays WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),)
+            ).rowcount
+
+    def delete(self, keys: List[str]) -> None:
+        """删除指定条目"""
+        self.flush()
+        with self._read_lock, self._reader:
+            self._reader.executemany("DELETE FROM workdays WHERE key = ?", [(key,) for key in keys])
+
+    def keys(self) -> List[str]:
+        """返回所有条目的键"""
+        self.flush()
+        with self._read_lock:
+            return [row[0] for row in self._reader.execute("SELECT key FROM workdays")]
+
+    def clear(self) -> None:
+        """删除所有条目"""
+        self.flush()
+        with self._read_lock, self._reader:
+            self._reader.execute("DELETE FROM workdays")
+
+    def flush(self) -> None:
+        """等待已排队的写入全部提交"""
+        self._queue.join()
+
+    def close(self) -> None:
+        """提交剩余写入并关闭数据库连接"""
+        self._queue.put(None)
+        self._writer.join()
+        with self._read_lock:
+            self._reader.close()
+
+    def _write_loop(self) -> None:
+        conn = self._connect()
+        next_purge = time.monotonic() + self.PURGE_INTERVAL
+        try:
+            while True:
+                item = self._queue.get()
+                batch = [item]
+                # 合并队列中已积压的写入，在同一个事务中提交
+                while item is not None:
+                    try:
+                        item = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    batch.append(item)
+
+                rows = [entry for entry in batch if entry is not None]
+                if rows:
+                    try:
+                        with conn:
+                            conn.executemany(
+                                "INSERT OR REPLACE INTO workdays (key, value, expires_at) VALUES (?, ?, ?)",
+                                rows,
+                            )
+                    except sqlite3.Error as e:
+                        logger.warning(f"工作日缓存持久化写入失败: {e}")
+                    if time.monotonic() >= next_purge:
+                        next_purge = time.monotonic() + self.PURGE_INTERVAL
+                        try:
+                            with conn:
+                                conn.execute("DELETE FROM workdays WHERE expires_at IS NOT NULL AND expires_at <= ?",
+                                             (time.time(),))
+                        except sqlite3.Error as e:
+                            logger.warning(f"工作日缓存过期条目清理失败: {e}")
+
+                for _ in batch:
+                    self._queue.task_done()
+                if len(rows) < len(batch):
+                    return
+        finally:
+            conn.close()
+
+
+class WorkdayCache:
+    """带容量上限与过期时间的 LRU 缓存
+
+    max_size: 最多保存的条目数，超出时淘汰最久未使用的条目
+    ttl: 条目有效期（秒），为 None 时永不过期
+    backend: 可选的持久化存储，内存未命中时读穿，写入时同步排队写入
+    """
+
+    def __init__(self, max_size: int = 10000, ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 backend: Optional[SQLiteWorkdayStore] = None):
+        if max_size <= 0:
+            raise ValueError("max_size 必须大于0")
+        self.max_size = max_size
+        self.ttl = ttl
+        self._clock = clock
+        self.backend = backend
+        self.backend_hits = 0
+        self._entries: "OrderedDict[str, Tuple[int, Optional[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: str) -> Optional[int]:
+        """读取缓存，未命中或已过期时返回 None；持久化存储的读取不持有缓存锁"""
+        with self._lock:
+            value = self._get_memory(key)
+        if value is not None:
+            return value
+        stored = self.backend.get(key) if self.backend is not None else None
+        with self._lock:
+            return self._fill_from_backend(key, stored)
+
+    async def aget(self, key: str) -> Optional[int]:
+        """与 get 相同，内存未命中时在线程池中读取持久化存储，不阻塞事件循环"""
+        with self._lock:
+            value = self._get_memory(key)
+        if value is not None:
+            return value
+        backend = self.backend
+        stored = await asyncio.to_thread(backend.get, key) if backend is not None else None
+        with self._lock:
+            return self._fill_from_backend(key, stored)
+
+    def _get_memory(self, key: str) -> Optional[int]:
+        """读取内存中的条目，命中时计数（调用方需持有锁）"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= self._clock():
+            del self._entries[key]
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _fill_from_backend(self, key: str, stored: Optional[Tuple[int, Optional[float]]]) -> Optional[int]:
+        """用持久化存储中读到的条目回填内存并计数，stored 为 None 时计为未命中（调用方需持有锁）"""
+        if stored is None:
+            self.misses += 1
+            return None
+        value, wall_expires_at = stored
+        self._store(key, value, self._to_local_expiry(wall_expires_at))
+        self.backend_hits += 1
+        self.hits += 1
+        return value
+
+    def _to_local_expiry(self, wall_expires_at: Optional[float]) -> Optional[float]:
+        """将持久化存储中的墙上时间换算为本缓存时钟下的过期时间"""
+        if wall_expires_at is None:
+            return None
+        return self._clock() + (wall_expires_at - time.time())
+
+    def _store(self, key: str, value: int, expires_at: Optional[float]) -> None:
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def set(self, key: str, value: int) -> None:
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        expires_at = self._clock() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._store(key, value, expires_at)
+        if self.backend is not None:
+            self.backend.put(key, value, time.time() + self.ttl if self.ttl is not None else None)
+
+    def warm(self) -> int:
+        """从持久化存储预热内存缓存，返回加载的条目数"""
+        if self.backend is None:
+            return 0
+        rows = self.backend.load(self.max_size)
+        with self._lock:
+            # 按过期时间从近到远写入，使最新的条目处于 LRU 的最近使用端
+            for key, value, wall_expires_at in reversed(rows):
+                self._store(key, value, self._to_local_expiry(wall_expires_at))
+        return len(rows)
+
+    def invalidate(self, key: str) -> bool:
+        """删除指定条目，返回条目是否存在"""
+        with self._lock:
+            existed = self._entries.pop(key, None) is not None
+        if self.backend is not None:
+            self.backend.delete([key])
+        return existed
+
+    def invalidate_where(self, predicate: Callable[[str], bool]) -> int:
+        """删除所有键满足条件的条目，返回删除数量"""
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            for key in keys:
+                del self._entries[key]
+        if self.backend is not None:
+            stored_keys = [key for key in self.backend.keys() if predicate(key)]
+            self.backend.delete(stored_keys)
+            return len(set(keys) | set(stored_keys))
+        return len(keys)
+
+    def clear(self) -> None:
+        """清空缓存（统计计数保留）"""
+        with self._lock:
+            self._entries.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def flush(self) -> None:
+        """等待尚未写入持久化存储的条目提交"""
+        if self.backend is not None:
+            self.backend.flush()
+
+    def close(self) -> None:
+        """提交剩余写入并关闭持久化存储，之后缓存只保存在内存中"""
+        backend, self.backend = self.backend, None
+        if backend is not None:
+            backend.close()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, object]:
+        """返回缓存统计信息"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "backend": self.backend.path if self.backend is not None else None,
+            "backend_hits": self.backend_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
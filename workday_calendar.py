@@ -0,0 +1,452 @@
+"""
+本地工作日历
+
+按自然日保存工作日标记（含调休上班的周末），并维护工作日序号前缀和数组，
+任意日期区间的工作日数量只需两次数组查找即可得到，无需调用外部API。
+
+工作日数量统一按日期闭区间 [起始日, 结束日] 计算（包含起始日与结束日，时间部分不影响结果），
+与工作日API的 startDate/endDate 语义一致。日历（WorkdayCalendar.count）、API客户端（fetch_workday_count）
+与仅排除周末的本地估算（count_weekdays）都遵循这一约定，同一区间无论由哪一方计算结果都相同。
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Set, Union
+
+# 日历文件格式版本
+CALENDAR_FORMAT_VERSION = 1
+
+# 随项目发布的节假日日历
+BUNDLED_CALENDAR_FILE = os.path.join(os.path.dirname(__file__), "data", "workday_calendar.json")
+
+# 从工作日API引导生成的日历快照
+DEFAULT_SNAPSHOT_FILE = os.path.join(os.path.dirname(__file__), "data", "workday_snapshot.json")
+
+# 二进制日历文件：文件头 + 逐日标记(uint8) + 工作日序号前缀和(int32, 小端) + 年份数据(JSON)
+BINARY_MAGIC = b"WDCAL\x00\x00\x00"
+BINARY_HEADER = struct.Struct("<8sIIqII")
+
+DEFAULT_WORKDAY_API_URL = "https://date.appworlds.cn/work/days"
+
+DateLike = Union[date, datetime]
+
+
+def _to_date(value: DateLike) -> date:
+    """将 datetime 截断为日期"""
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+
+class WorkdayCalendar:
+    """基于逐日标记与前缀和的工作日历
+
+    years 的结构与日历文件中的 ``years`` 字段一致::
+
+        {2024: {"holidays": ["2024-01-01", ...], "workdays": ["2024-02-04", ...]}}
+
+    holidays 为放假日期，workdays 为调休上班的周末日期，其余日期按周一至周五为工作日处理。
+    只有 years 中出现的年份才视为已覆盖。
+    """
+
+    def __init__(self, years: Dict[int, Dict[str, List[str]]], version: int = CALENDAR_FORMAT_VERSION):
+        self.version = version
+        self.years = {int(year): spec for year, spec in years.items()}
+        self._covered_years = set(self.years)
+
+        if not self.years:
+            self.first_day = self.last_day = None
+            self._flags = bytearray()
+            self._ordinals = array("l", [0])
+            return
+
+        # 覆盖范围为 [first_day, last_day)，中间缺失的年份按仅排除周末填充但不视为已覆盖
+        self.first_day = date(min(self.years), 1, 1)
+        self.last_day = date(max(self.years) + 1, 1, 1)
+        total_days = (self.last_day - self.first_day).days
+
+        flags = bytearray(total_days)
+        current_date = self.first_day
+        for i in range(total_days):
+            if current_date.weekday() < 5:
+                flags[i] = 1
+            current_date += timedelta(days=1)
+
+        for spec in self.years.values():
+            for day in spec.get("holidays", []):
+                flags[self._index(date.fromisoformat(day))] = 0
+            for day in spec.get("workdays", []):
+                flags[self._index(date.fromisoformat(day))] = 1
+
+        # _ordinals[i] 为 first_day 起前 i 天中的工作日数量
+        ordinals = array("l", [0]) * (total_days + 1)
+        running = 0
+        for i, flag in enumerate(flags):
+            running += flag
+            ordinals[i + 1] = running
+
+        self._flags = flags
+        self._ordinals = ordinals
+
+    def _index(self, day: date) -> int:
+        return (day - self.first_day).days
+
+    @property
+    def covered_years(self) -> Set[int]:
+        """日历覆盖的年份"""
+        return set(self._covered_years)
+
+    @property
+    def flags(self) -> Sequence[int]:
+        """自 first_day 起逐日的工作日标记（1为工作日）"""
+        return self._flags
+
+    @property
+    def ordinals(self) -> Sequence[int]:
+        """工作日序号前缀和，ordinals[i] 为 first_day 起前 i 天中的工作日数量"""
+        return self._ordinals
+
+    def covers(self, start_date: DateLike, end_date: DateLike) -> bool:
+        """判断 [start_date, end_date] 区间内的每一天是否都在日历覆盖范围内"""
+        start_day = _to_date(start_date)
+        end_day = _to_date(end_date)
+        if end_day <= start_day:
+            return start_day.year in self._covered_years
+        return all(year in self._covered_years for year in range(start_day.year, end_day.year + 1))
+
+    def is_workday(self, day: DateLike) -> bool:
+        """判断某一天是否为工作日"""
+        day = _to_date(day)
+        if day.year not in self._covered_years:
+            raise KeyError(f"日历未覆盖 {day.year} 年")
+        return bool(self._flags[self._index(day)])
+
+    def count(self, start_date: DateLike, end_date: DateLike) -> int:
+        """计算 [start_date, end_date] 之间的工作日数量（按日期计，包含起始日与结束日）"""
+        start_day = _to_date(start_date)
+        end_day = _to_date(end_date)
+        if end_day < start_day:
+            return 0
+        if not self.covers(start_day, end_day):
+            raise KeyError(f"日历未覆盖 {start_day} 至 {end_day}")
+        return self._ordinals[self._index(end_day) + 1] - self._ordinals[self._index(start_day)]
+
+    def add_workdays(self, start_date: DateLike, workdays: int) -> date:
+        """返回从 start_date 起的第 workdays 个工作日（起始日为工作日时计为第1个），即从 start_date 起经过 workdays 个工作日后的截止日
+
+        截止日当天完成时 count(start_date, 截止日) 恰好为 workdays，之后的工作日完成即超出；
+        例如周一加5个工作日为当周周五，workdays 为0时返回 start_date。在前缀和数组上二分查找，复杂度 O(log n)。
+        """
+        if workdays < 0:
+            raise ValueError("workdays 不能为负数")
+        start_day = _to_date(start_date)
+        if start_day.year not in self._covered_years:
+            raise KeyError(f"日历未覆盖 {start_day.year} 年")
+        if workdays == 0:
+            return start_day
+        target = self._ordinals[self._index(start_day)] + workdays
+        # 前缀和首次达到 target 的位置 i，第 i-1 天即为第 workdays 个工作日；超出数组时无法确定
+        index = bisect_left(self._ordinals, target)
+        if index > len(self._flags):
+            raise KeyError(f"日历未覆盖 {start_day} 之后第 {workdays} 个工作日")
+        due_day = self.first_day + timedelta(days=index - 1)
+        if not self.covers(start_day, due_day):
+            raise KeyError(f"日历未覆盖 {start_day} 至 {due_day}")
+        return due_day
+
+    def to_dict(self) -> dict:
+        """导出为日历文件格式"""
+        return {
+            "version": self.version,
+            "years": {str(year): self.years[year] for year in sorted(self.years)},
+        }
+
+
+def read_calendar_file(path: str) -> Dict[int, Dict[str, List[str]]]:
+    """读取日历文件，返回按年份组织的节假日与调休数据"""
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    version = data.get("version", CALENDAR_FORMAT_VERSION)
+    if version > CALENDAR_FORMAT_VERSION:
+        raise ValueError(f"不支持的日历文件版本: {version}")
+
+    return {int(year): spec for year, spec in data.get("years", {}).items()}
+
+
+def load_calendar(paths: Iterable[Optional[str]] = (BUNDLED_CALENDAR_FILE,)) -> WorkdayCalendar:
+    """按顺序加载并合并多个日历文件，后面的文件覆盖前面文件中的同一年份；不存在的文件会被跳过"""
+    years: Dict[int, Dict[str, List[str]]] = {}
+    for path in paths:
+        if path and os.path.exists(path):
+            years.update(read_calendar_file(path))
+    return WorkdayCalendar(years)
+
+
+def write_calendar_snapshot(path: str, years: Dict[int, Dict[str, List[str]]], source: str = "") -> dict:
+    """将年份数据合并写入日历快照，每次写入递增 revision；通过临时文件替换保证原子性"""
+    snapshot = {"version": CALENDAR_FORMAT_VERSION, "revision": 0, "years": {}}
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            snapshot = json.load(f)
+
+    snapshot["version"] = CALENDAR_FORMAT_VERSION
+    snapshot["revision"] = snapshot.get("revision", 0) + 1
+    snapshot["generated_at"] = datetime.now().isoformat(timespec="seconds")
+    snapshot["source"] = source
+    snapshot.setdefault("years", {})
+    for year, spec in years.items():
+        snapshot["years"][str(year)] = spec
+    snapshot["years"] = dict(sorted(snapshot["years"].items()))
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(snapshot, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+    return snapshot
+
+
+# ---------------------------------------------------------------------------
+# 二进制日历文件：多个 worker 进程以只读方式内存映射同一份日历
+# ---------------------------------------------------------------------------
+
+def write_binary_calendar(calendar: WorkdayCalendar, path: str, revision: int = 0) -> None:
+    """将日历编译为二进制文件；先写临时文件再原子替换，已映射旧文件的进程不受影响"""
+    total_days = len(calendar._flags)
+    years_blob = json.dumps(calendar.to_dict()["years"], ensure_ascii=False).encode("utf-8")
+    first_ordinal = calendar.first_day.toordinal() if calendar.first_day else 0
+
+    ordinals = array("i", calendar._ordinals)
+    if sys.byteorder != "little":
+        ordinals.byteswap()
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(BINARY_HEADER.pack(BINARY_MAGIC, CALENDAR_FORMAT_VERSION, revision, first_ordinal,
+                                   total_days, len(years_blob)))
+        f.write(calendar._flags)
+        # 前缀和数组按4字节对齐
+        f.write(b"\x00" * (-(BINARY_HEADER.size + total_days) % 4))
+        f.write(ordinals.tobytes())
+        f.write(years_blob)
+    os.replace(tmp_path, path)
+
+
+class MappedWorkdayCalendar(WorkdayCalendar):
+    """以只读内存映射方式打开二进制日历文件
+
+    多个进程映射同一文件时共享操作系统页缓存中的同一份数据。发布新版本时文件被原子替换，
+    通过 is_stale() 检测后重新打开即可切换，旧映射在不再被引用后释放。
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            stat = os.fstat(f.fileno())
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._file_id = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+        magic, version, self.revision, first_ordinal, total_days, years_len = \
+            BINARY_HEADER.unpack_from(self._mmap, 0)
+        if magic != BINARY_MAGIC:
+            raise ValueError(f"不是有效的二进制日历文件: {path}")
+        if version > CALENDAR_FORMAT_VERSION:
+            raise ValueError(f"不支持的日历文件版本: {version}")
+
+        view = memoryview(self._mmap)
+        flags_offset = BINARY_HEADER.size
+        ordinals_offset = flags_offset + total_days + (-(flags_offset + total_days) % 4)
+        years_offset = ordinals_offset + (total_days + 1) * 4
+
+        self._flags = view[flags_offset:flags_offset + total_days]
+        if sys.byteorder == "little":
+            self._ordinals = view[ordinals_offset:years_offset].cast("i")
+        else:
+            self._ordinals = array("i", view[ordinals_offset:years_offset].tobytes())
+            self._ordinals.byteswap()
+
+        self.version = version
+        self.years = {int(year): spec for year, spec in
+                      json.loads(bytes(view[years_offset:years_offset + years_len])).items()}
+        self._covered_years = set(self.years)
+        if self.years:
+            self.first_day = date.fromordinal(first_ordinal)
+            self.last_day = self.first_day + timedelta(days=total_days)
+        else:
+            self.first_day = self.last_day = None
+
+    def is_stale(self) -> bool:
+        """判断磁盘上的文件是否已被新版本替换"""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            return False
+        return (stat.st_ino, stat.st_mtime_ns, stat.st_size) != self._file_id
+
+
+# ---------------------------------------------------------------------------
+# 通过工作日API引导生成日历快照
+# ---------------------------------------------------------------------------
+
+def count_weekdays(first_day: date, last_day: date) -> int:
+    """计算 [first_day, last_day] 闭区间内周一至周五的天数（仅排除周末的本地估算）"""
+    if last_day < first_day:
+        return 0
+    total_days = (last_day - first_day).days + 1
+    full_weeks, remainder = divmod(total_days, 7)
+    weekdays = full_weeks * 5
+    start_weekday = first_day.weekday()
+    for offset in range(remainder):
+        if (start_weekday + offset) % 7 < 5:
+            weekdays += 1
+    return weekdays
+
+
+def fetch_workday_count(first_day: date, last_day: date, api_url: str = DEFAULT_WORKDAY_API_URL,
+                        timeout: float = 10) -> int:
+    """调用工作日API获取 [first_day, last_day] 闭区间内的工作日数量，与 WorkdayCalendar.count 的结果可直接比较"""
+    import requests
+
+    params = {
+        'startDate': first_day.strftime('%Y-%m-%d'),
+        'endDate': last_day.strftime('%Y-%m-%d')
+    }
+    response = requests.get(api_url, params=params, timeout=timeout)
+    response.raise_for_status()
+
+    data = response.json()
+    if data.get('code') != 200:
+        raise Exception(f"API返回错误: {data.get('msg', '未知错误')}")
+    return data.get('data', 0)
+
+
+def _weekend_runs(year: int) -> List[List[date]]:
+    """返回一年中连续的周末日期段（通常为周六、周日两天，年初年末可能只有一天）"""
+    runs: List[List[date]] = []
+    current_date = date(year, 1, 1)
+    while current_date.year == year:
+        if current_date.weekday() >= 5:
+            if runs and runs[-1][-1] == current_date - timedelta(days=1):
+                runs[-1].append(current_date)
+            else:
+                runs.append([current_date])
+        current_date += timedelta(days=1)
+    return runs
+
+
+def _resolve_holidays(first_day: date, last_day: date, actual: int, expected: Callable[[date, date], int],
+                      fetch_count: Callable[[date, date], int], holidays: List[str]) -> None:
+    """在工作日数量低于预期的区间内二分，找出工作日放假的日期"""
+    if actual == expected(first_day, last_day):
+        return
+
+    if first_day == last_day:
+        holidays.append(first_day.isoformat())
+        return
+
+    middle_day = first_day + timedelta(days=(last_day - first_day).days // 2)
+    left = fetch_count(first_day, middle_day)
+    _resolve_holidays(first_day, middle_day, left, expected, fetch_count, holidays)
+    _resolve_holidays(middle_day + timedelta(days=1), last_day, actual - left, expected, fetch_count, holidays)
+
+
+def derive_year(year: int, fetch_count: Callable[[date, date], int]) -> Dict[str, List[str]]:
+    """通过工作日API推导全年的放假日与调休上班日
+
+    放假日与调休上班日可能在同一个月内数量相互抵消（例如2024年9月），仅凭月度计数无法发现，
+    因此分两步进行：
+    1. 逐个周末段查询，周末段的基线为0，只可能因调休上班而增加，不存在抵消；
+    2. 以月为单位查询，在已知调休上班日的基础上，工作日数量只可能因放假而减少，
+       仅对低于预期的月份二分定位放假日。
+    """
+    workdays: List[str] = []
+    for run in _weekend_runs(year):
+        count = fetch_count(run[0], run[-1])
+        if count == len(run):
+            workdays.extend(day.isoformat() for day in run)
+        elif count:
+            # 周六、周日仅有一天调休上班
+            saturday_count = fetch_count(run[0], run[0])
+            workdays.append((run[0] if saturday_count else run[-1]).isoformat())
+
+    weekend_workdays = [date.fromisoformat(day) for day in workdays]
+
+    def expected(first_day: date, last_day: date) -> int:
+        return count_weekdays(first_day, last_day) + sum(
+            1 for day in weekend_workdays if first_day <= day <= last_day
+        )
+
+    holidays: List[str] = []
+    for month in range(1, 13):
+        first_day = date(year, month, 1)
+        next_month = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        last_day = next_month - timedelta(days=1)
+        _resolve_holidays(first_day, last_day, fetch_count(first_day, last_day), expected, fetch_count, holidays)
+
+    return {"holidays": holidays, "workdays": workdays}
+
+
+def bootstrap_calendar(years: Iterable[int], api_url: str = DEFAULT_WORKDAY_API_URL,
+                       snapshot_path: str = DEFAULT_SNAPSHOT_FILE, min_interval: float = 1.0) -> dict:
+    """从工作日API引导生成指定年份的日历并写入快照，返回写入后的快照内容"""
+    calls = 0
+    last_call = 0.0
+
+    def fetch_count(first_day: date, last_day: date) -> int:
+        nonlocal calls, last_call
+        # 遵守API频率限制（免费用户1秒1次）
+        wait = min_interval - (time.monotonic() - last_call)
+        if wait > 0:
+            time.sleep(wait)
+        last_call = time.monotonic()
+        calls += 1
+        return fetch_workday_count(first_day, last_day, api_url=api_url)
+
+    derived = {}
+    for year in years:
+        derived[year] = derive_year(year, fetch_count)
+        print(f"{year}年: 放假 {len(derived[year]['holidays'])} 天, "
+              f"调休上班 {len(derived[year]['workdays'])} 天, 累计API调用 {calls} 次")
+
+    return write_calendar_snapshot(snapshot_path, derived, source=api_url)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="工作日历工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    bootstrap_parser = subparsers.add_parser("bootstrap", help="从工作日API引导生成日历快照")
+    bootstrap_parser.add_argument("years", type=int, nargs="+", help="需要生成的年份")
+    bootstrap_parser.add_argument("--api-url", default=os.getenv("WORKDAY_API_URL", DEFAULT_WORKDAY_API_URL))
+    bootstrap_parser.add_argument("--output", default=os.getenv("WORKDAY_SNAPSHOT_FILE", DEFAULT_SNAPSHOT_FILE))
+    bootstrap_parser.add_argument("--min-interval", type=float, default=1.0, help="两次API调用的最小间隔（秒）")
+
+    publish_parser = subparsers.add_parser("publish", help="将日历与快照编译为供多进程内存映射的二进制文件")
+    publish_parser.add_argument("output", help="二进制日历文件路径")
+    publish_parser.add_argument("--snapshot", default=os.getenv("WORKDAY_SNAPSHOT_FILE", DEFAULT_SNAPSHOT_FILE))
+    publish_parser.add_argument("--calendar", default=os.getenv("WORKDAY_CALENDAR_FILE"), help="额外导入的日历文件")
+
+    args = parser.parse_args(argv)
+    if args.command == "bootstrap":
+        snapshot = bootstrap_calendar(args.years, api_url=args.api_url, snapshot_path=args.output,
+                                      min_interval=args.min_interval)
+        print(f"快照已写入 {args.output} (revision {snapshot['revision']})")
+    elif args.command == "publish":
+        calendar = load_calendar([BUNDLED_CALENDAR_FILE, args.snapshot, args.calendar])
+        revision = MappedWorkdayCalendar(args.output).revision + 1 if os.path.exists(args.output) else 1
+        write_binary_calendar(calendar, args.output, revision=revision)
+        print(f"二进制日历已发布到 {args.output} (revision {revision}, 覆盖年份 {sorted(calendar.years)})")
+
+
+if __name__ == "__main__":
+    main()